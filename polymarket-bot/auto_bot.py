@@ -2,24 +2,44 @@
 """
 Polymarket BTC hourly auto bot (auto-discovery + auto execution)
 
+MAX_MARKETS > 1 runs the same strategy on several concurrent markets (the
+current market of each series: hourly / 15-minute, BTC / ETH / SOL via
+MARKET_FILTER_REGEX) in one process, with per-market books and positions
+and one shared capital pool.
+
 ⚠️ Real money risk. Start with DRY_RUN=true.
 """
 
+import atexit
 import json
 import logging
+import math
 import os
+import queue
+import random
 import re
 import sys
+import threading
 import time
-from dataclasses import asdict, dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
 from datetime import datetime, timezone
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Optional, Tuple
-
-from py_clob_client.client import ClobClient
-from py_clob_client.clob_types import OrderArgs, OrderType
-from py_clob_client.order_builder.constants import BUY, SELL
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from clob_session import LazyClient, creds_fingerprint, drop_creds, load_creds, save_creds
+from journal import Journal, JournalState
+from market_feed import DEFAULT_WS_URL, MarketFeed, UserFeed, user_ws_url
+from market_index import DiscoveryWorker, IndexedMarket, MarketIndex
+from orderbook import OrderBook
+from metrics import MetricsRegistry, SamplingProfiler
+from scheduler import Timer
+from orders import BUY, FAK, FOK, SELL, ManagedOrder, OrderManager, round_size
+from status import RateMeter, StatusServer, StatusWriter, health_route, json_route
+from tick_recorder import TickRecorder
+from transport import DEFAULT_TIMEOUTS, CircuitBreaker, ClobTransport, TokenBucket, install, parse_timeouts, pooled
 
 
 def env(name: str, default: Optional[str] = None) -> str:
@@ -50,9 +70,101 @@ def load_env_file(path: str) -> None:
 
 
 LOG = logging.getLogger("polymarket_auto_bot")
+# 进程级指标（log() 里的 ERR_* 计数）；各 Bot 的指标在 Bot.metrics
+METRICS = MetricsRegistry("polymarket_bot_")
+
+
+def format_event(ts: float, event: str, kw: Dict) -> str:
+    return json.dumps({"ts": datetime.fromtimestamp(ts, timezone.utc).isoformat(), "event": event, **kw}, ensure_ascii=False)
+
+
+def parse_sample_rates(spec: str) -> Dict[str, int]:
+    """'TICK=10,NO_PRICE=5' -> keep 1 of every N of those events."""
+    rates = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        name, n = part.split("=", 1)
+        if name.strip() and int(n) > 1:
+            rates[name.strip()] = int(n)
+    return rates
+
+
+def event_record(item: Tuple[float, str, Dict]) -> logging.LogRecord:
+    ts, event, kw = item
+    return logging.LogRecord(LOG.name, logging.INFO, "", 0, format_event(ts, event, kw), None, None)
+
+
+class EventQueueListener(QueueListener):
+    """Serializes queued (ts, event, fields) tuples off the trading thread and
+    hands them to the stdout / rotating-file handlers."""
+
+    def prepare(self, item):
+        return event_record(item)
+
+    def enqueue_sentinel(self):
+        # 队列满时也要等到能放进停止标记，保证退出前写完
+        self.queue.put(self._sentinel)
+
+
+class EventSink:
+    """log() backend: per-event sampling plus a bounded queue drained by a listener thread.
+
+    The trading thread only appends a tuple; when the queue is full the event is
+    dropped and counted (reported as LOG_DROPPED once there is room again).
+    Field values must not be mutated after log() returns.
+    """
+
+    def __init__(self, handlers, sample: Optional[Dict[str, int]] = None, maxsize: int = 10000):
+        self.sample = sample or {}
+        self._seen: Dict[str, int] = {}
+        self.dropped = 0
+        self.queue: "queue.Queue" = queue.Queue(maxsize)
+        self.listener: Optional[EventQueueListener] = None
+        self._stopped = False
+        if maxsize > 0:
+            self.listener = EventQueueListener(self.queue, *handlers)
+            self.listener.start()
+        self.handlers = handlers
+
+    def emit(self, event: str, kw: Dict) -> None:
+        every = self.sample.get(event)
+        if every:
+            n = self._seen.get(event, 0)
+            self._seen[event] = n + 1
+            if n % every:
+                return
+            kw["sample"] = every
+        item = (time.time(), event, kw)
+        if self.listener is None:
+            # LOG_QUEUE_SIZE=0：同步写
+            record = event_record(item)
+            for h in self.handlers:
+                h.handle(record)
+            return
+        try:
+            if self.dropped:
+                self.queue.put_nowait((item[0], "LOG_DROPPED", {"count": self.dropped}))
+                self.dropped = 0
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        """Flush what is queued and stop the listener (safe to call twice)."""
+        if self.listener is not None and not self._stopped:
+            self._stopped = True
+            if self.dropped:
+                self.queue.put((time.time(), "LOG_DROPPED", {"count": self.dropped}))
+                self.dropped = 0
+            self.listener.stop()
+
+
+_SINK: Optional[EventSink] = None
 
 
-def setup_logger(log_file: Path, max_bytes: int, backups: int) -> None:
+def setup_logger(log_file: Path, max_bytes: int, backups: int, sample: Optional[Dict[str, int]] = None, queue_size: int = 10000) -> None:
+    global _SINK
     log_file.parent.mkdir(parents=True, exist_ok=True)
     LOG.setLevel(logging.INFO)
 
@@ -60,15 +172,28 @@ def setup_logger(log_file: Path, max_bytes: int, backups: int) -> None:
 
     stream = logging.StreamHandler(sys.stdout)
     stream.setFormatter(fmt)
-    LOG.addHandler(stream)
 
     rotating = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
     rotating.setFormatter(fmt)
-    LOG.addHandler(rotating)
+
+    # 序列化和 I/O 都在监听线程里做，stdout 管道阻塞（pm2 merge_logs）不再拖慢 tick
+    _SINK = EventSink([stream, rotating], sample=sample, maxsize=queue_size)
+    atexit.register(_SINK.stop)
 
 
 def log(event: str, **kw):
-    LOG.info(json.dumps({"ts": datetime.now(timezone.utc).isoformat(), "event": event, **kw}, ensure_ascii=False))
+    if event.startswith("ERR_"):
+        METRICS.counter("errors_total", "ERR_* log events", event=event).inc()
+    if _SINK is not None:
+        _SINK.emit(event, kw)
+        return
+    if not LOG.isEnabledFor(logging.INFO):
+        return
+    LOG.info(format_event(time.time(), event, kw))
+
+
+def order_status(o: Optional[ManagedOrder]) -> Optional[Dict]:
+    return {"localId": o.local_id, "note": o.note, "state": o.state} if o else None
 
 
 @dataclass
@@ -81,13 +206,41 @@ class Position:
     opened_at: str
 
 
+@dataclass
+class MarketSlot:
+    """Strategy state of one traded market; capital is shared by all slots."""
+
+    market: IndexedMarket
+    pos: Optional[Position] = None
+    pending: Optional[ManagedOrder] = None
+    books: Dict[str, OrderBook] = field(default_factory=dict)
+    period_s: Optional[float] = None
+    active: bool = True
+    touched: bool = False
+    phase: str = ""
+    timer: Timer = field(default_factory=Timer)
+
+    @property
+    def key(self) -> str:
+        return self.market.condition_id
+
+    @property
+    def tokens(self) -> Tuple[str, str]:
+        return self.market.up_token, self.market.down_token
+
+
 class Bot:
-    def __init__(self):
+    def __init__(self, client=None, clock: Callable[[], float] = time.time, offline: bool = False):
+        """offline=True drives the strategy without side effects (replay / backtest):
+        no logger setup, status file, background threads or streams, and orders
+        go synchronously to `client` (a simulated exchange)."""
         load_env_file(os.path.join(os.path.dirname(__file__), ".env"))
+        self.clock = clock
+        self.offline = offline
 
         self.host = env("CLOB_BASE_URL", "https://clob.polymarket.com")
         self.chain_id = envi("POLY_CHAIN_ID", 137)
-        self.private_key = env("POLY_PRIVATE_KEY")
+        self.private_key = env("POLY_PRIVATE_KEY") if client is None else os.getenv("POLY_PRIVATE_KEY", "")
         self.signature_type = envi("POLY_SIGNATURE_TYPE", 1)
         self.funder = os.getenv("POLY_FUNDER", "")
 
@@ -96,8 +249,17 @@ class Bot:
         self.entry_threshold = envf("ENTRY_PRICE_THRESHOLD", 0.30)
         self.take_profit_pct = envf("TAKE_PROFIT_PCT", 0.20)
         self.entry_window_minutes = envi("ENTRY_WINDOW_MINUTES", 20)
+        self.max_markets = max(1, envi("MAX_MARKETS", 1))
         self.poll_ms = max(1000, envi("POLL_INTERVAL_MS", 5000))
+        # 各阶段的看价节奏：开盘后 BURST_SEC 秒内加快；窗口外且空仓时放慢；持仓时按止盈检查频率
+        self.burst_s = max(0, envi("BURST_SEC", 60))
+        self.burst_poll_s = max(0.25, envi("BURST_POLL_MS", 1000) / 1000)
+        self.idle_poll_s = max(self.poll_ms / 1000, envi("IDLE_POLL_MS", 30000) / 1000)
+        self.exit_poll_s = max(0.25, envi("EXIT_POLL_MS", self.poll_ms) / 1000)
         self.scan_pages = max(1, envi("DISCOVERY_SCAN_PAGES", 8))
+        self.market_refresh_s = max(5, envi("MARKET_REFRESH_SEC", 60))
+        self.market_full_rescan_s = max(60, envi("MARKET_FULL_RESCAN_SEC", 3600))
+        self.market_lookahead_s = max(0, envi("MARKET_LOOKAHEAD_SEC", 300))
 
         # NOTE: 默认必须是正则单反斜杠 \b，原来写成 \\b 会匹配失败。
         self.market_re = re.compile(env("MARKET_FILTER_REGEX", r"(?i)\b(bitcoin|btc)\b"))
@@ -105,74 +267,331 @@ class Bot:
         self.up_re = re.compile(env("UP_OUTCOME_REGEX", r"(?i)^(up|yes)$"))
         self.down_re = re.compile(env("DOWN_OUTCOME_REGEX", r"(?i)^(down|no)$"))
 
-        self.dry_run = env("DRY_RUN", "true").lower() != "false"
+        # 离线回放时由模拟撮合成交，不走 DRY_RUN 的"按限价全成"
+        self.dry_run = env("DRY_RUN", "true").lower() != "false" and not offline
+        self.market_data_mode = env("MARKET_DATA_MODE", "rest").lower()
+        self.ws_url = env("MARKET_WS_URL", DEFAULT_WS_URL)
+        self.ws_stale_s = max(1.0, envi("MARKET_WS_STALE_MS", 15000) / 1000)
+        self.user_ws_url = env("USER_WS_URL", user_ws_url(self.ws_url))
+        self.user_stream = env("USER_STREAM", "true").lower() != "false"
+        self.order_type = env("ORDER_TYPE", "FOK").upper()
+        if self.order_type not in (FOK, FAK):
+            raise RuntimeError(f"ORDER_TYPE must be FOK or FAK, got {self.order_type}")
+        self.order_ack_timeout_s = max(1.0, envf("ORDER_ACK_TIMEOUT_SEC", 10))
+        self.order_settle_s = max(0.0, envf("ORDER_SETTLE_SEC", 2))
 
         log_dir = Path(env("LOG_DIR", os.path.join(os.path.dirname(__file__), "logs")))
         self.log_file = log_dir / env("LOG_FILE", "auto_bot.log")
-        self.status_file = log_dir / env("STATUS_FILE", "status.json")
+        self.status_file: Optional[Path] = None if offline else log_dir / env("STATUS_FILE", "status.json")
+        self.market_index_file = Path(env("MARKET_INDEX_FILE", os.path.join(os.path.dirname(__file__), "data", "market_index.json")))
+        # 重启恢复：持仓 / 资金日志；API creds 缓存（留空关闭）
+        self.journal_file = env("JOURNAL_FILE", os.path.join(os.path.dirname(__file__), "data", "journal.jsonl"))
+        if self.journal_file and self.dry_run:
+            # 模拟盘单独一份日志（journal.dry.jsonl），切到实盘不会恢复模拟的资金 / 持仓
+            jp = Path(self.journal_file)
+            self.journal_file = str(jp.with_name(jp.stem + ".dry" + jp.suffix))
+        self.creds_cache = env("API_CREDS_CACHE", os.path.join(os.path.dirname(__file__), "data", "api_creds.json"))
+        self.status_min_interval_s = max(0.5, envf("STATUS_MIN_INTERVAL_SEC", 10))
+        self.status_http = os.getenv("STATUS_HTTP", "")
+        self.profile_sample_ms = max(0, envi("PROFILE_SAMPLE_MS", 0))
+        # REST 传输：限速 / 超时 / 熔断 / 退避
+        self.backoff_max_s = max(1.0, envf("BACKOFF_MAX_SEC", 60))
+        self.degraded_poll_s = max(self.poll_ms / 1000, envi("DEGRADED_POLL_MS", 15000) / 1000)
+        self.tick_record_dir = os.getenv("TICK_RECORD_DIR", "")
+        self.tick_record_levels = max(1, envi("TICK_RECORD_LEVELS", 10))
         log_max_bytes = envi("LOG_MAX_BYTES", 5 * 1024 * 1024)
         log_backups = envi("LOG_BACKUPS", 5)
-        setup_logger(self.log_file, max_bytes=log_max_bytes, backups=log_backups)
-
-        self.client = ClobClient(
-            self.host,
-            chain_id=self.chain_id,
-            key=self.private_key,
-            signature_type=self.signature_type,
-            funder=(self.funder or None),
-        )
-        creds = self.client.create_or_derive_api_creds()
-        self.client.set_api_creds(creds)
+        self.log_sample = parse_sample_rates(os.getenv("LOG_SAMPLE", ""))
+        if not offline:
+            setup_logger(
+                self.log_file,
+                max_bytes=log_max_bytes,
+                backups=log_backups,
+                sample=self.log_sample,
+                queue_size=max(0, envi("LOG_QUEUE_SIZE", 10000)),
+            )
+
+        self.metrics = MetricsRegistry("polymarket_bot_")
+        self.transport: Optional[ClobTransport] = None
+        self.user_feed: Optional[UserFeed] = None
+        if client is None:
+            self.transport = self.setup_transport()
+            # 导入 py_clob_client、派生 API creds 都在后台线程做，不挡重启
+            client = LazyClient(self.build_client, log=log, wait_s=envf("CLIENT_READY_TIMEOUT_SEC", 30), on_ready=self.client_ready)
+        self.client = client
 
         self.capital = self.starting_capital
-        self.pos: Optional[Position] = None
-        self.last_market_resolve = 0
-        self.cached_market = None
+        self.realized_pnl = 0.0
+        # 每个盘口一份盘口 / 持仓状态（condition id -> slot），资金共用
+        self.slots: Dict[str, MarketSlot] = {}
+        self.token_slots: Dict[str, MarketSlot] = {}
+        self.journal: Optional[Journal] = None
+        if self.journal_file and not offline:
+            t0 = time.perf_counter()
+            self.journal = Journal(
+                Path(self.journal_file),
+                fsync=env("JOURNAL_FSYNC", "true").lower() != "false",
+                snapshot_every=envi("JOURNAL_SNAPSHOT_EVERY", 200),
+                meta={"dryRun": self.dry_run, "funder": self.funder.lower()},
+            )
+            self.restore(self.journal.load(), time.perf_counter() - t0)
+
+        self.book_fetch_ms = self.api_histogram("get_order_book")
+        self.books_fetch_ms = self.api_histogram("get_order_books")
+        self.markets_fetch_ms = self.api_histogram("get_markets")
+        self.tick_ms = self.metrics.histogram("tick_duration_seconds", "Bot.tick() wall time")
+        self.ticks_skipped = self.metrics.counter("ticks_skipped_total", "Scheduled market checks skipped because the loop fell behind")
+        self.price_age_ms = {
+            src: self.metrics.histogram("price_age_seconds", "Age of the older book side when a tick reads prices", src=src)
+            for src in ("ws", "rest")
+        }
+
+        self.market_index = MarketIndex(
+            None if offline else self.market_index_file,
+            self.market_re,
+            self.hourly_re,
+            self.up_re,
+            self.down_re,
+            full_rescan_s=self.market_full_rescan_s,
+        )
+        self.discovery = DiscoveryWorker(
+            self.market_index,
+            self.fetch_markets_page,
+            self.scan_pages,
+            log=log,
+            refresh_s=self.market_refresh_s,
+            lookahead_s=self.market_lookahead_s,
+            series=self.max_markets,
+        )
+        if not offline:
+            self.discovery.start()
         self.err_streak = 0
+        self.rest_books: Dict[str, OrderBook] = {}
+        # 两边盘口一次取回：POST /books；接口不可用时退回并发的单本 GET /book
+        self.batch_books = os.getenv("BATCH_BOOKS", "true").lower() == "true"
+        # 客户端是否支持批量接口只判定一次（后台构建的客户端在 client_ready 里），tick 不再探测
+        self.books_batch: Optional[bool] = None if isinstance(self.client, LazyClient) else self.batch_books and hasattr(self.client, "get_order_books")
+        self.book_pool: Optional[ThreadPoolExecutor] = None
+        # 盘口更新 / 订单完成都会唤醒主循环
+        self.wake = threading.Event()
+
+        self.orders = OrderManager(
+            self.client,
+            self.dry_run,
+            log=log,
+            on_done=self.wake.set,
+            order_type=self.order_type,
+            ack_timeout_s=self.order_ack_timeout_s,
+            settle_s=self.order_settle_s,
+            inline=offline,
+            # 回放的模拟交易所只读字段，不为它加载 py_clob_client
+            order_args=SimpleNamespace if offline else None,
+        )
+        self.last_price_ts = 0.0
+        self.tick_t0 = 0.0
+        self.last_src = ""
+        self.api_histogram("create_order", self.orders.latency["sign"])
+        self.api_histogram("post_order", self.orders.latency["post"])
+        for stage in ("build", "ack"):
+            self.metrics.histogram("order_stage_seconds", "Order pipeline stage latency (queued->built, posted->filled)", hist=self.orders.latency[stage], stage=stage)
+        self.metrics.gauge("capital_usdc", "Available capital", lambda: self.capital)
+        self.metrics.gauge("realized_pnl_usdc", "Realized P&L", lambda: self.realized_pnl)
+        self.metrics.gauge("position_qty", "Open position size in shares (all markets)", lambda: sum(s.pos.qty for s in list(self.slots.values()) if s.pos))
+        self.metrics.gauge("markets_tracked", "Markets with strategy state", lambda: len(self.slots))
+        self.metrics.gauge("orders_in_flight", "Orders submitted but not finished", lambda: len(self.orders.in_flight()))
+        self.metrics.gauge("ws_bad_trades_total", "Malformed user-channel trade entries skipped", lambda: self.orders.bad_trades)
+        self.metrics.gauge("err_streak", "Consecutive failed ticks", lambda: self.err_streak)
+        if self.transport is not None:
+            t = self.transport
+            for route, b in (("read", t.breaker), ("order", t.order_breaker)):
+                self.metrics.gauge("circuit_open", "REST circuit breaker open (1) / half-open (0.5) / closed (0)", lambda b=b: {"open": 1, "half_open": 0.5}.get(b.state, 0), route=route)
+            self.metrics.gauge("rate_limit_wait_seconds", "Total time REST calls waited for the token bucket", lambda: t.throttled_s)
+        self.metrics.gauge("seconds_since_last_price", "Wall time since the last tick that read prices", lambda: (time.time() - self.last_price_ts) if self.last_price_ts else None)
+
+        self.feed: Optional[MarketFeed] = None
+        if self.market_data_mode == "ws" and not offline:
+            if MarketFeed.available():
+                self.feed = MarketFeed(self.ws_url, log=log, stale_s=self.ws_stale_s, updated=self.wake)
+                self.feed.start()
+                feed = self.feed
+                self.metrics.gauge("ws_bad_changes_total", "Malformed price_change entries skipped", lambda: feed.bad_changes)
+            else:
+                log("WS_UNAVAILABLE", reason="pip install websocket-client", fallback="rest")
+
+        self.recorder: Optional[TickRecorder] = None
+        if self.tick_record_dir and not offline:
+            self.recorder = TickRecorder(Path(self.tick_record_dir), levels=self.tick_record_levels)
+
+        # 状态只在内存里更新，按限速 / 健康状态变化落盘，可选本地 HTTP / Unix socket 查询
+        self.health = "started"
+        self.status_extra: Dict = {}
+        self.tick_rate = RateMeter()
+        self.last_error: Optional[str] = None
+        self.status = StatusWriter(self.status_file, self.status_snapshot, min_interval_s=self.status_min_interval_s, log=log)
+        self.status_server: Optional[StatusServer] = None
+        if self.status_http and not offline:
+            self.status_server = StatusServer(
+                self.status_http,
+                {
+                    "/status": json_route(self.status_snapshot),
+                    "/healthz": health_route(lambda: self.health),
+                    "/metrics": self.metrics_route,
+                    "/profile": self.profile_route,
+                },
+            )
+            self.status_server.start()
+
+        self.profiler: Optional[SamplingProfiler] = None
+        if self.profile_sample_ms and not offline:
+            # 只采样交易主线程（构造 Bot 的线程）
+            self.profiler = SamplingProfiler(threading.get_ident(), self.profile_sample_ms / 1000, path=log_dir / "profile.folded")
+            self.profiler.start()
+
+        if isinstance(self.client, LazyClient):
+            self.client.start()
 
-        log("BOT_START", dryRun=self.dry_run, chainId=self.chain_id, maxOrder=self.max_order_size, logFile=str(self.log_file))
+        log(
+            "BOT_START",
+            dryRun=self.dry_run,
+            chainId=self.chain_id,
+            maxOrder=self.max_order_size,
+            maxMarkets=self.max_markets,
+            logFile=str(self.log_file),
+            marketData=("ws" if self.feed else "rest"),
+            orderType=self.order_type,
+            userStream=self.wants_user_feed(),
+            tickRecordDir=(self.tick_record_dir or None),
+            logSample=(self.log_sample or None),
+            statusHttp=(self.status_http or None),
+            profileSampleMs=(self.profile_sample_ms or None),
+            journal=(self.journal_file or None),
+        )
         self.write_status("started")
 
     def run(self):
-        while True:
-            try:
-                self.tick()
-                self.err_streak = 0
-            except KeyboardInterrupt:
-                log("BOT_STOP", reason="keyboard_interrupt")
-                self.write_status("stopped")
-                raise
-            except Exception as e:
-                self.err_streak += 1
-                log("ERR_TICK", err=str(e), errStreak=self.err_streak)
-                self.write_status("degraded", lastError=str(e), errStreak=self.err_streak)
-            time.sleep(self.poll_ms / 1000)
+        try:
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    self.tick()
+                    self.err_streak = 0
+                except Exception as e:
+                    self.err_streak += 1
+                    self.last_error = str(e)
+                    log("ERR_TICK", err=str(e), errStreak=self.err_streak)
+                    self.write_status("degraded", lastError=str(e), errStreak=self.err_streak)
+                self.tick_ms.observe((time.perf_counter() - t0) * 1000)
+                self.tick_rate.mark()
+                self.wait_next()
+        except KeyboardInterrupt:
+            # 大部分时间停在 wait_next 里，中断也要走完收尾
+            self.shutdown()
+            raise
+
+    def shutdown(self):
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.journal is not None:
+            self.journal_snapshot()
+            self.journal.close()
+        log("BOT_STOP", reason="keyboard_interrupt")
+        self.write_status("stopped")
+        self.status.close()
+        if self.profiler is not None:
+            self.profiler.stop()
+        if self.status_server is not None:
+            self.status_server.close()
+        if _SINK is not None:
+            _SINK.stop()
+
+    def wait_next(self):
+        hold = self.next_delay()
+        if hold > 0:
+            # 退避 / 熔断期间不让盘口推送提前唤醒；错过的定时检查直接跳过
+            time.sleep(max(hold, self.timer_delay()))
+            self.wake.clear()
+            return
+        # 睡到最早的一个盘口定时器；有盘口更新（ws 模式）或订单完成时立即触发下一次 tick
+        self.wake.wait(self.timer_delay())
+        self.wake.clear()
+
+    def timer_delay(self) -> float:
+        now = time.monotonic()
+        if not self.slots:
+            return self.poll_ms / 1000
+        return min(s.timer.delay(now) for s in self.slots.values())
+
+    def next_delay(self) -> float:
+        """Extra wait after a tick: jittered exponential backoff on errors and the
+        REST breaker / 429 cooldown while prices come from REST (0 when healthy)."""
+        base = self.poll_ms / 1000
+        streak = self.err_streak
+        rest = self.transport is not None and self.last_src != "ws"
+        if rest:
+            # 熔断打开后由 DEGRADED_POLL_MS 接管，不再继续翻倍
+            b = self.transport.breaker
+            streak = max(streak, min(b.failures, b.fail_threshold))
+        delay = 0.0
+        if streak:
+            delay = max(base, min(self.backoff_max_s, base * 2 ** min(streak, 16)) * random.uniform(0.5, 1.0))
+        if rest:
+            if self.transport.breaker.state != "closed":
+                delay = max(delay, self.degraded_poll_s)
+            delay = max(delay, self.transport.bucket.paused_until - time.monotonic())
+        return delay
 
     def tick(self):
-        now = datetime.now(timezone.utc)
-        minute = now.minute
-        in_entry_window = minute < self.entry_window_minutes
+        self.tick_t0 = time.perf_counter()
+        self.process_fills()
 
-        market = self.get_current_market()
-        if not market:
+        ts = self.clock()
+        self.sync_slots(self.discovery.active(ts, self.max_markets), ts)
+        if not self.slots:
             log("NO_MARKET")
             self.write_status("healthy", note="no_market")
             return
-
-        up_tid, down_tid, question = market
-        up = self.best_prices(up_tid)
-        down = self.best_prices(down_tid)
+        if self.user_feed is not None:
+            self.user_feed.subscribe([m.condition_id for m in self.discovery.selection])
+
+        due = self.due_slots(ts)
+        quotes = self.current_prices(due)
+        unpriced = 0
+        for slot in due:
+            up, down, src = quotes[slot.key]
+            self.last_src = src
+            if not self.evaluate(slot, up, down, src, ts):
+                unpriced += 1
+
+        questions = [s.market.question for s in self.slots.values()]
+        extra = {"market": questions[0] if len(questions) == 1 else questions}
+        if unpriced:
+            extra["note"] = "no_price"
+        self.write_status("healthy", **extra)
+
+    def evaluate(self, slot: MarketSlot, up, down, src: str, ts: float) -> bool:
+        """Entry / take-profit rules for one market. False when it has no price."""
+        question = slot.market.question
+        up_tid, down_tid = slot.tokens
+        slot.touched = False
+        age_ms = None
+        if len(slot.books) == 2:
+            self.last_price_ts = time.time()
+            age_ms = max(0.0, ts - min(b.updated_at for b in slot.books.values())) * 1000
+            self.price_age_ms[src].observe(age_ms)
+        if self.recorder is not None:
+            self.record_tick(slot, src)
 
         if not up or not down:
             log("NO_PRICE", question=question)
-            self.write_status("healthy", note="no_price", market=question)
-            return
+            return False
 
+        in_entry_window = self.in_entry_window(slot, ts)
         up_ask, up_bid = up
         down_ask, down_bid = down
 
         log(
             "TICK",
+            src=src,
             inWindow=in_entry_window,
             question=question,
             upAsk=up_ask,
@@ -180,10 +599,19 @@ class Bot:
             downAsk=down_ask,
             downBid=down_bid,
             cap=round(self.capital, 2),
-            holding=(self.pos.side if self.pos else None),
+            holding=(slot.pos.side if slot.pos else None),
+            pending=(slot.pending.note if slot.pending else None),
+            ms=round((time.perf_counter() - self.tick_t0) * 1000, 2),
+            ageMs=(round(age_ms, 1) if age_ms is not None else None),
         )
 
-        if self.pos is None and in_entry_window:
+        if slot.pending is not None:
+            # 上一笔订单还在路上：不重复下单，等回报入账
+            return True
+
+        # MAX_MARKETS 同时也是持仓数上限；已不在当前盘列表里的盘只平不开
+        held = sum(1 for s in self.slots.values() if s.pos is not None or s.pending is not None)
+        if slot.pos is None and in_entry_window and slot.active and held < self.max_markets:
             cands = []
             if up_ask is not None and up_ask <= self.entry_threshold:
                 cands.append(("UP", up_tid, up_ask))
@@ -192,185 +620,530 @@ class Bot:
             if cands:
                 cands.sort(key=lambda x: x[2])
                 side, tid, px = cands[0]
-                self.open_pos(side, tid, px)
+                self.open_pos(slot, side, tid, px)
 
-        if self.pos:
-            cur_bid = up_bid if self.pos.side == "UP" else down_bid
+        if slot.pos:
+            cur_bid = up_bid if slot.pos.side == "UP" else down_bid
             if cur_bid is None:
-                log("SKIP_CLOSE_NO_BID", side=self.pos.side)
-            elif self.pos.entry_price > 0:
-                pnl_pct = (cur_bid - self.pos.entry_price) / self.pos.entry_price
+                log("SKIP_CLOSE_NO_BID", side=slot.pos.side, question=question)
+            elif slot.pos.entry_price > 0:
+                pnl_pct = (cur_bid - slot.pos.entry_price) / slot.pos.entry_price
                 if pnl_pct >= self.take_profit_pct:
-                    self.close_pos(cur_bid)
-
-        self.write_status("healthy", market=question)
-
-    def get_current_market(self) -> Optional[Tuple[str, str, str]]:
-        now = time.time()
-        if self.cached_market and now - self.last_market_resolve < 60:
-            return self.cached_market
-
-        cursor = "MA=="
-        best = None
-        best_end_ts = None
-
-        for _ in range(self.scan_pages):
-            try:
-                page = self.client.get_markets(next_cursor=cursor)
-            except Exception as e:
-                log("ERR_GET_MARKETS", err=str(e), cursor=cursor)
-                break
-
-            data = page.get("data", [])
-            cursor = page.get("next_cursor")
-            for m in data:
-                if not (m.get("active") and m.get("accepting_orders") and not m.get("closed") and m.get("enable_order_book")):
-                    continue
-                q = m.get("question", "")
-                if not self.market_re.search(q):
-                    continue
-                if not self.hourly_re.search(q):
-                    continue
-
-                tokens = m.get("tokens", [])
-                up_tid = down_tid = None
-                for t in tokens:
-                    out = str(t.get("outcome", "")).strip()
-                    if self.up_re.search(out):
-                        up_tid = t.get("token_id")
-                    elif self.down_re.search(out):
-                        down_tid = t.get("token_id")
-
-                if not up_tid or not down_tid:
-                    continue
-
-                end_iso = m.get("end_date_iso")
-                end_ts = self._parse_ts(end_iso)
-                if end_ts is None:
+                    self.close_pos(slot, cur_bid)
+        return True
+
+    def in_entry_window(self, slot: MarketSlot, ts: float) -> bool:
+        if slot.period_s:
+            # 按盘口自己的周期从开盘起算（小时盘即整点起，15 分钟盘从该刻钟起）
+            elapsed = ts - (slot.market.end_ts - slot.period_s)
+            return 0 <= elapsed < self.entry_window_minutes * 60
+        return datetime.fromtimestamp(ts, timezone.utc).minute < self.entry_window_minutes
+
+    def sync_slots(self, markets: List[IndexedMarket], ts: float) -> None:
+        """Track the markets trading now. A market that drops out is kept while an
+        order is in flight or, until it ends, while a position is open."""
+        live = {m.condition_id for m in markets}
+        for key, slot in list(self.slots.items()):
+            slot.active = key in live
+            if slot.active or slot.pending is not None:
+                continue
+            if slot.pos is not None:
+                if slot.market.end_ts >= ts:
                     continue
-                # 只要未来 2 小时以内，优先最早结束（通常就是当前小时盘）
-                if end_ts < now or end_ts > now + 7200:
+                # 到期没平掉：由链上结算，本地不再跟踪
+                p = slot.pos
+                log("POSITION_EXPIRED", question=slot.market.question, side=p.side, qty=round(p.qty, 6), sizeUsdc=round(p.size_usdc, 2))
+                self.journal_write("expire", slot, None, self.capital, self.realized_pnl)
+            self.drop_slot(key)
+        for m in markets:
+            slot = self.slots.get(m.condition_id)
+            if slot is None:
+                # 新选中的盘下一次 tick 立即评估
+                slot = self.slots[m.condition_id] = MarketSlot(m, touched=True)
+                self.token_slots[m.up_token] = self.token_slots[m.down_token] = slot
+                log("MARKET_SELECTED", question=m.question, upToken=m.up_token[-8:], downToken=m.down_token[-8:])
+            slot.market = m
+            if slot.period_s is None:
+                slot.period_s = self.discovery.period_s(m)
+
+    def drop_slot(self, key: str) -> Optional[MarketSlot]:
+        slot = self.slots.pop(key, None)
+        if slot is not None:
+            for t in slot.tokens:
+                self.token_slots.pop(t, None)
+        return slot
+
+    def due_slots(self, ts: float) -> List[MarketSlot]:
+        """Markets to evaluate this tick: those whose timer fired, that had an order
+        complete or, on a live stream, whose books moved (a flat market outside the
+        entry window waits for its timer). Replay evaluates the markets it marked
+        touched (the one whose row it just replayed)."""
+        slots = list(self.slots.values())
+        if self.offline:
+            return [s for s in slots if s.touched]
+        moved = set()
+        if self.feed is not None and self.feed.live():
+            moved = {self.token_slots[t].key for t in self.feed.drain() if t in self.token_slots}
+        now = time.monotonic()
+        due = []
+        for s in slots:
+            phase, period, boundary = self.slot_phase(s, ts)
+            if phase != s.phase:
+                s.phase = phase
+                s.timer.retime(period)
+            if s.timer.due(now):
+                skipped = s.timer.advance(now, period, now + (boundary - ts))
+                if skipped:
+                    self.ticks_skipped.inc(skipped)
+                due.append(s)
+            elif s.touched or (s.key in moved and phase != "idle"):
+                due.append(s)
+        return due
+
+    def slot_phase(self, slot: MarketSlot, ts: float) -> Tuple[str, float, float]:
+        """(phase, check period in s, next wall-clock boundary) of one market:
+        exit while holding or an order is in flight, burst right after the open,
+        entry for the rest of the entry window, idle otherwise."""
+        m = slot.market
+        start = m.end_ts - slot.period_s if slot.period_s else ts - ts % 3600
+        edges = (start, start + self.burst_s, start + self.entry_window_minutes * 60, min(m.end_ts, start + (slot.period_s or 3600)))
+        boundary = min((e for e in edges if e > ts), default=math.inf)
+        if slot.pos is not None or slot.pending is not None:
+            return "exit", self.exit_poll_s, boundary
+        if not self.in_entry_window(slot, ts):
+            return "idle", self.idle_poll_s, boundary
+        if ts - start < self.burst_s:
+            return "burst", self.burst_poll_s, boundary
+        return "entry", self.poll_ms / 1000, boundary
+
+    def setup_transport(self) -> Optional[ClobTransport]:
+        timeouts = dict(DEFAULT_TIMEOUTS)
+        timeouts.update(parse_timeouts(os.getenv("CLOB_TIMEOUTS", "")))
+        responses = {}
+
+        def on_response(endpoint: str, status: int):
+            key = (endpoint, status)
+            c = responses.get(key)
+            if c is None:
+                c = responses[key] = self.metrics.counter("http_responses_total", "CLOB REST responses (status 0 = transport error / circuit open)", endpoint=endpoint, status=status)
+            c.inc()
+
+        def breaker(route: str) -> CircuitBreaker:
+            return CircuitBreaker(
+                fail_threshold=envi("BREAKER_FAILS", 5),
+                cooldown_s=envf("BREAKER_COOLDOWN_SEC", 30),
+                on_change=lambda old, new: log("CIRCUIT_" + new.upper(), route=route, prev=old),
+            )
+
+        # 看价 / 发现和下单 / 撤单各一个熔断器：盘口接口出错时平仓单照常发出
+        transport = ClobTransport(
+            pooled(pool_size=max(1, envi("CLOB_POOL_SIZE", 10))),
+            TokenBucket(envf("CLOB_RATE_PER_SEC", 8), envf("CLOB_RATE_BURST", 16)),
+            breaker("read"),
+            timeouts,
+            default_timeout=envf("CLOB_TIMEOUT_SEC", 5),
+            on_response=on_response,
+            order_breaker=breaker("order"),
+        )
+        return transport
+
+    def build_client(self):
+        """Runs on the clob-init thread (LazyClient)."""
+        t0 = time.perf_counter()
+        from py_clob_client.client import ClobClient
+        from py_clob_client.clob_types import ApiCreds
+
+        if self.transport is not None and not install(self.transport):
+            log("TRANSPORT_UNSUPPORTED", reason="py_clob_client without a shared httpx client")
+            self.transport = None
+        client = ClobClient(
+            self.host,
+            chain_id=self.chain_id,
+            key=self.private_key,
+            signature_type=self.signature_type,
+            funder=(self.funder or None),
+        )
+        fp = creds_fingerprint(self.host, self.private_key, self.signature_type, self.funder)
+        cached = load_creds(Path(self.creds_cache), fp) if self.creds_cache else None
+        if cached:
+            creds = ApiCreds(**cached)
+        else:
+            creds = client.create_or_derive_api_creds()
+            if self.creds_cache:
+                save_creds(Path(self.creds_cache), fp, asdict(creds))
+        client.set_api_creds(creds)
+        log("CLIENT_READY", creds=("cache" if cached else "derived"), ms=round((time.perf_counter() - t0) * 1000, 1))
+
+        if self.wants_user_feed():
+            self.user_feed = UserFeed(self.user_ws_url, creds, self.orders.on_trade, log=log)
+            self.user_feed.start()
+        return client
+
+    def client_ready(self):
+        """Runs on the clob-init thread once the client is built."""
+        self.books_batch = self.batch_books and hasattr(self.client, "get_order_books")
+        # 就绪前跳过了 REST 取价的盘立即重新评估
+        for s in list(self.slots.values()):
+            s.touched = True
+        self.wake.set()
+
+    def wants_user_feed(self) -> bool:
+        return self.user_stream and not self.dry_run and isinstance(self.client, LazyClient) and UserFeed.available()
+
+    def refresh_creds(self):
+        """Cached creds were rejected (401): drop the cache and re-derive on the clob-refresh thread."""
+        if self.creds_cache:
+            drop_creds(Path(self.creds_cache))
+        if isinstance(self.client, LazyClient):
+            self.client.refresh(self.rederive_creds)
+
+    def rederive_creds(self, client):
+        """Runs on the clob-refresh thread (LazyClient.refresh)."""
+        try:
+            creds = client.create_or_derive_api_creds()
+        except Exception as e:
+            log("ERR_CREDS_REFRESH", err=str(e))
+            return
+        client.set_api_creds(creds)
+        if self.creds_cache:
+            save_creds(Path(self.creds_cache), creds_fingerprint(self.host, self.private_key, self.signature_type, self.funder), asdict(creds))
+        if self.user_feed is not None:
+            self.user_feed.creds = creds
+        log("CREDS_REFRESHED")
+
+    def api_histogram(self, op: str, hist=None):
+        return self.metrics.histogram("api_latency_seconds", "CLOB API call latency", hist=hist, op=op)
+
+    def fetch_markets_page(self, cursor: str) -> dict:
+        with self.markets_fetch_ms.time():
+            return self.client.get_markets(next_cursor=cursor)
+
+    def metrics_route(self):
+        body = METRICS.render() + self.metrics.render()
+        return 200, "text/plain; version=0.0.4; charset=utf-8", body.encode("utf-8")
+
+    def profile_route(self):
+        if self.profiler is None:
+            return 404, "text/plain; charset=utf-8", b"profiler off (set PROFILE_SAMPLE_MS)\n"
+        return 200, "text/plain; charset=utf-8", self.profiler.folded().encode("utf-8")
+
+    def current_prices(self, slots: List[MarketSlot]) -> Dict[str, Tuple]:
+        """(up, down, src) per market: stream tops when live, the rest in one REST batch."""
+        out = {}
+        rest = slots
+        if self.feed is not None:
+            # 连同预解析的下一期盘一起订阅，换盘时盘口已是热的
+            self.feed.subscribe([t for s in self.slots.values() for t in s.tokens] + self.discovery.watch_tokens())
+            rest = []
+            for s in slots:
+                tops = self.feed.tops(list(s.tokens))
+                if tops is None:
+                    rest.append(s)
                     continue
-                if best is None or end_ts < best_end_ts:
-                    best = (up_tid, down_tid, q)
-                    best_end_ts = end_ts
-
-            if not cursor or cursor == "LTE=":
-                break
-
-        self.cached_market = best
-        self.last_market_resolve = now
-        if best:
-            log("MARKET_SELECTED", question=best[2], upToken=best[0][-8:], downToken=best[1][-8:])
-        return best
-
-    def best_prices(self, token_id: str) -> Optional[Tuple[Optional[float], Optional[float]]]:
+                s.books = {t: b for t in s.tokens for b in [self.feed.book(t)] if b is not None}
+                out[s.key] = (tops[s.tokens[0]], tops[s.tokens[1]], "ws")
+        if rest and isinstance(self.client, LazyClient) and not self.client.ready:
+            # 重启后客户端还在后台初始化：不等 REST，就绪（client_ready）或盘口推送到了会再唤醒
+            src = "ws" if self.feed is not None else "rest"
+            out.update((s.key, (None, None, src)) for s in rest)
+            rest = []
+        if rest:
+            books = self.fetch_books([t for s in rest for t in s.tokens])
+            for s in rest:
+                s.books = {t: books[t] for t in s.tokens if t in books}
+                up, down = (s.books[t].top() if t in s.books else None for t in s.tokens)
+                out[s.key] = (up, down, "rest")
+        return out
+
+    def record_tick(self, slot: MarketSlot, src: str):
+        m = slot.market
+        try:
+            self.recorder.record(self.clock(), m.question, m.up_token, m.down_token, slot.books.get(m.up_token), slot.books.get(m.down_token), ws=(src == "ws"))
+        except OSError as e:
+            # 录制失败不影响交易
+            log("ERR_TICK_RECORD", err=str(e))
+
+    def fetch_books(self, token_ids: List[str]) -> Dict[str, OrderBook]:
+        """REST books for all tokens as one snapshot (shared timestamp); tokens
+        that failed or came back empty are left out."""
+        ts = self.clock()
+        raw = self.fetch_raw_books(token_ids)
+        out = {}
+        for tid in token_ids:
+            ob = raw.get(tid)
+            if ob is None:
+                continue
+            book = self.rest_books.get(tid)
+            if book is None:
+                if len(self.rest_books) >= max(8, 2 * len(token_ids)):
+                    self.rest_books.clear()
+                book = self.rest_books[tid] = OrderBook(tid)
+            book.apply_snapshot(getattr(ob, "bids", None), getattr(ob, "asks", None), ts=ts)
+            if not book.empty():
+                out[tid] = book
+        return out
+
+    def fetch_raw_books(self, token_ids: List[str]) -> Dict[str, object]:
+        if self.books_batch:
+            if self.offline:
+                # 回放用的模拟客户端只读 token_id，不为它加载 py_clob_client
+                params = [SimpleNamespace(token_id=t) for t in token_ids]
+            else:
+                from py_clob_client.clob_types import BookParams
+
+                params = [BookParams(token_id=t) for t in token_ids]
+            try:
+                with self.books_fetch_ms.time():
+                    obs = self.client.get_order_books(params)
+                return {str(getattr(ob, "asset_id", "")): ob for ob in obs}
+            except Exception as e:
+                if getattr(e, "status_code", None) not in (404, 405):
+                    log("ERR_GET_BOOKS", tokens=[t[-8:] for t in token_ids], err=str(e))
+                    return {}
+                # 服务端没有批量接口：以后都走单本并发
+                self.books_batch = False
+                log("BOOKS_BATCH_UNSUPPORTED", err=str(e))
+
+        if self.offline or len(token_ids) == 1:
+            return {t: ob for t in token_ids for ob in [self.fetch_book(t)] if ob is not None}
+        if self.book_pool is None:
+            self.book_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="book-fetch")
+        futures = [(t, self.book_pool.submit(self.fetch_book, t)) for t in token_ids]
+        return {t: ob for t, f in futures for ob in [f.result()] if ob is not None}
+
+    def fetch_book(self, token_id: str):
         try:
-            ob = self.client.get_order_book(token_id)
+            with self.book_fetch_ms.time():
+                return self.client.get_order_book(token_id)
         except Exception as e:
             log("ERR_GET_BOOK", token=token_id[-8:], err=str(e))
             return None
 
-        asks = sorted([float(a.price) for a in (getattr(ob, "asks", []) or []) if self._is_valid_price(a.price)])
-        bids = sorted([float(b.price) for b in (getattr(ob, "bids", []) or []) if self._is_valid_price(b.price)], reverse=True)
-
-        ask = asks[0] if asks else None
-        bid = bids[0] if bids else None
-
-        if ask is None and bid is None:
-            return None
-        return ask, bid
-
-    def open_pos(self, side: str, token_id: str, ask_price: float):
+    def open_pos(self, slot: MarketSlot, side: str, token_id: str, ask_price: float):
         if ask_price <= 0:
             log("SKIP_OPEN_BAD_PRICE", side=side, ask=ask_price)
             return
 
-        size_usdc = min(self.max_order_size, self.capital)
+        # 资金只在成交后扣减：其他盘在途的开仓单先占住额度
+        size_usdc = min(self.max_order_size, self.capital - self.reserved_usdc())
         if size_usdc <= 0:
             log("SKIP_OPEN_NO_CAPITAL")
             return
-        qty = size_usdc / ask_price
-
-        self.place_limit(side=BUY, token_id=token_id, price=ask_price, size=qty, note=f"open-{side}")
-
-        self.capital -= size_usdc
-        self.pos = Position(
-            side=side,
-            token_id=token_id,
-            entry_price=ask_price,
-            size_usdc=size_usdc,
-            qty=qty,
-            opened_at=datetime.now(timezone.utc).isoformat(),
-        )
-        log("OPENED", side=side, price=ask_price, sizeUsdc=round(size_usdc, 2), qty=round(qty, 6), capital=round(self.capital, 2))
+        qty = round_size(size_usdc / ask_price)
+        if qty <= 0:
+            log("SKIP_OPEN_TOO_SMALL", side=side, ask=ask_price, sizeUsdc=round(size_usdc, 6))
+            return
 
-    def close_pos(self, bid_price: float):
-        p = self.pos
+        # FOK 限价单只能吃到 <= ask_price 的挂单，按盘口实际深度缩量
+        book = slot.books.get(token_id)
+        if book is not None:
+            _, avail = book.vwap_for_size(BUY, qty, limit=ask_price)
+            if avail <= 0:
+                log("SKIP_OPEN_NO_LIQUIDITY", side=side, ask=ask_price)
+                return
+            if avail < qty:
+                log("OPEN_SIZE_CAPPED", side=side, wantQty=round(qty, 6), availQty=round(avail, 6))
+                qty = round_size(avail)
+
+        slot.pending = self.place_limit(side=BUY, token_id=token_id, price=ask_price, size=qty, note=f"open-{side}", intent="open", label=side, market=slot.key)
+
+    def close_pos(self, slot: MarketSlot, bid_price: float):
+        p = slot.pos
         if not p:
             return
         if bid_price <= 0:
             log("SKIP_CLOSE_BAD_PRICE", side=p.side, bid=bid_price)
             return
 
-        self.place_limit(side=SELL, token_id=p.token_id, price=bid_price, size=p.qty, note="take-profit")
+        if round_size(p.qty) <= 0:
+            # 部分成交后剩下的零头低于最小下单精度，卖不掉，直接放弃
+            log("POSITION_DUST", side=p.side, qty=p.qty)
+            self.journal_write("dust", slot, None, self.capital, self.realized_pnl)
+            slot.pos = None
+            return
+
+        book = slot.books.get(p.token_id)
+        if book is not None:
+            _, avail = book.vwap_for_size(SELL, p.qty, limit=bid_price)
+            if avail < p.qty:
+                log("THIN_BID", side=p.side, bid=bid_price, qty=round(p.qty, 6), availQty=round(avail, 6))
 
-        proceeds = p.qty * bid_price
-        pnl = proceeds - p.size_usdc
+        slot.pending = self.place_limit(side=SELL, token_id=p.token_id, price=bid_price, size=p.qty, note="take-profit", intent="close", market=slot.key)
+
+    def reserved_usdc(self) -> float:
+        """Notional of open orders still in flight."""
+        return sum(s.pending.price * s.pending.size for s in self.slots.values() if s.pending is not None and s.pending.intent == "open")
+
+    def place_limit(self, side: str, token_id: str, price: float, size: float, note: str, intent: str, **meta) -> ManagedOrder:
+        """Queue the order; signing and posting happen on the order thread."""
+        if self.dry_run:
+            log("DRY_ORDER", side=side, token=token_id[-8:], px=price, size=round(size, 6), note=note)
+        o = self.orders.submit(side, token_id, price, size, note, intent, **meta)
+        log("ORDER_SUBMITTED", localId=o.local_id, side=side, token=token_id[-8:], px=price, size=round(size, 6), note=note)
+        return o
+
+    def process_fills(self):
+        """Book completed orders: capital and position move only by what actually filled."""
+        for o in self.orders.poll():
+            slot = self.slots.get(o.meta.get("market", ""))
+            if slot is not None:
+                if o is slot.pending:
+                    slot.pending = None
+                # 订单完成后下一次 tick 立即重新评估该盘
+                slot.touched = True
+            stamps = o.stamps
+            log(
+                f"ORDER_{o.state.upper()}",
+                localId=o.local_id,
+                orderId=(o.order_id[-10:] or None),
+                note=o.note,
+                px=o.price,
+                size=round(o.size, 6),
+                filledQty=round(o.filled_qty, 6),
+                avgPx=round(o.avg_price, 6),
+                err=(o.error or None),
+                ms={k: round((stamps[k] - stamps["queued"]) * 1000, 2) for k in ("build", "sign", "post", "ack") if k in stamps},
+            )
+            if o.http_status == 401 and self.creds_cache:
+                # 缓存的 API creds 可能已失效
+                self.refresh_creds()
+            if o.filled_qty <= 0:
+                continue
+            if slot is None:
+                log("ORDER_FILL_NO_MARKET", localId=o.local_id, token=o.token_id[-8:], filledQty=round(o.filled_qty, 6))
+            elif o.intent == "open":
+                self.on_open_fill(slot, o)
+            else:
+                self.on_close_fill(slot, o)
+        if self.journal is not None and self.journal.due():
+            self.journal_snapshot()
+
+    def on_open_fill(self, slot: MarketSlot, o: ManagedOrder):
+        size_usdc = o.filled_notional
+        pos = Position(
+            side=o.meta.get("label", ""),
+            token_id=o.token_id,
+            entry_price=round(o.avg_price, 6),
+            size_usdc=size_usdc,
+            qty=o.filled_qty,
+            opened_at=datetime.fromtimestamp(self.clock(), timezone.utc).isoformat(),
+        )
+        self.journal_write("open", slot, pos, self.capital - size_usdc, self.realized_pnl)
+        self.capital -= size_usdc
+        slot.pos = pos
+        log(
+            "OPENED",
+            question=slot.market.question,
+            side=slot.pos.side,
+            price=round(o.avg_price, 6),
+            sizeUsdc=round(size_usdc, 2),
+            qty=round(o.filled_qty, 6),
+            partial=(o.state == "partial"),
+            capital=round(self.capital, 2),
+        )
+
+    def on_close_fill(self, slot: MarketSlot, o: ManagedOrder):
+        p = slot.pos
+        if not p or p.token_id != o.token_id:
+            log("ORDER_FILL_NO_POSITION", localId=o.local_id, token=o.token_id[-8:], filledQty=round(o.filled_qty, 6))
+            return
+        frac = min(1.0, o.filled_qty / p.qty) if p.qty > 0 else 1.0
+        basis = p.size_usdc * frac
+        proceeds = o.filled_notional
+        pnl = proceeds - basis
+        # 部分成交：剩余仓位按比例保留成本
+        rest = None if frac >= 1 - 1e-9 else replace(p, qty=p.qty - o.filled_qty, size_usdc=p.size_usdc - basis)
+        self.journal_write("close", slot, rest, self.capital + proceeds, self.realized_pnl + pnl)
         self.capital += proceeds
+        self.realized_pnl += pnl
+        slot.pos = rest
         log(
             "CLOSED",
+            question=slot.market.question,
             side=p.side,
             entry=p.entry_price,
-            exit=bid_price,
+            exit=round(o.avg_price, 6),
+            qty=round(o.filled_qty, 6),
             pnl=round(pnl, 4),
-            pnlPct=round((pnl / p.size_usdc) * 100, 2),
+            pnlPct=round((pnl / basis) * 100, 2) if basis > 0 else None,
+            remainingQty=(round(rest.qty, 6) if rest else 0),
             capital=round(self.capital, 2),
         )
-        self.pos = None
 
-    def place_limit(self, side: str, token_id: str, price: float, size: float, note: str):
-        if self.dry_run:
-            log("DRY_ORDER", side=side, token=token_id[-8:], px=price, size=round(size, 6), note=note)
+    def restore(self, state: Optional[JournalState], elapsed_s: float):
+        """Resume capital and open positions from the journal."""
+        if state is None:
             return
+        self.capital = state.capital
+        self.realized_pnl = state.realized_pnl
+        for key, row in state.positions.items():
+            m = IndexedMarket(**row["market"])
+            slot = self.slots[key] = MarketSlot(m, pos=Position(**row["position"]), active=False)
+            self.token_slots[m.up_token] = self.token_slots[m.down_token] = slot
+        log(
+            "JOURNAL_RESTORED",
+            capital=round(self.capital, 6),
+            realizedPnl=round(self.realized_pnl, 6),
+            positions=[{"question": s.market.question, "side": s.pos.side, "qty": s.pos.qty} for s in self.slots.values()],
+            seq=state.seq,
+            replayed=state.replayed,
+            truncatedBytes=(state.truncated or None),
+            ms=round(elapsed_s * 1000, 2),
+        )
 
-        order_args = OrderArgs(token_id=token_id, price=price, size=size, side=side)
-        signed = self.client.create_order(order_args)
-        resp = self.client.post_order(signed, OrderType.FOK)
-        log("ORDER_OK", side=side, token=token_id[-8:], px=price, size=round(size, 6), note=note, resp=resp)
+    def journal_write(self, op: str, slot: MarketSlot, pos: Optional[Position], capital: float, realized_pnl: float):
+        """Append the market's resulting position and the shared capital before applying them."""
+        if self.journal is None:
+            return
+        try:
+            self.journal.append(op, market=asdict(slot.market), position=(asdict(pos) if pos else None), capital=capital, realizedPnl=realized_pnl)
+        except OSError as e:
+            log("ERR_JOURNAL", op=op, err=str(e))
+
+    def journal_snapshot(self):
+        try:
+            self.journal.snapshot(
+                self.capital,
+                self.realized_pnl,
+                {k: {"market": asdict(s.market), "position": asdict(s.pos)} for k, s in self.slots.items() if s.pos is not None},
+            )
+        except OSError as e:
+            log("ERR_JOURNAL", op="snapshot", err=str(e))
 
     def write_status(self, health: str, **extra):
-        payload = {
+        """Record the current health; the status writer decides when it hits disk."""
+        self.health = health
+        self.status_extra = extra
+        self.status.touch(health)
+
+    def status_snapshot(self) -> Dict:
+        slots = list(self.slots.values())
+        pos = next((s.pos for s in slots if s.pos), None)
+        pending = next((s.pending for s in slots if s.pending), None)
+        return {
             "ts": datetime.now(timezone.utc).isoformat(),
-            "health": health,
+            "health": self.health,
             "dryRun": self.dry_run,
             "capital": round(self.capital, 6),
-            "position": asdict(self.pos) if self.pos else None,
-            **extra,
+            "realizedPnl": round(self.realized_pnl, 6),
+            "position": asdict(pos) if pos else None,
+            "pendingOrder": order_status(pending),
+            "markets": [
+                {"question": s.market.question, "conditionId": s.key, "phase": s.phase, "position": (asdict(s.pos) if s.pos else None), "pendingOrder": order_status(s.pending)}
+                for s in slots
+            ],
+            "errStreak": self.err_streak,
+            "circuit": (self.transport.breaker.state if self.transport else None),
+            "orderCircuit": (self.transport.order_breaker.state if self.transport else None),
+            "lastError": self.last_error,
+            "ticks": self.tick_rate.total,
+            "ticksPerSec": round(self.tick_rate.rate(), 3),
+            "ticksSkipped": int(self.ticks_skipped.value),
+            "tickLatency": self.tick_ms.snapshot(),
+            "bookFetchLatency": (self.books_fetch_ms if self.books_batch else self.book_fetch_ms).snapshot(),
+            "orderLatency": self.orders.stats(),
+            **self.status_extra,
         }
-        self.status_file.parent.mkdir(parents=True, exist_ok=True)
-        tmp = self.status_file.with_suffix(".tmp")
-        tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
-        tmp.replace(self.status_file)
-
-    @staticmethod
-    def _parse_ts(iso_str: Optional[str]) -> Optional[float]:
-        if not iso_str:
-            return None
-        try:
-            if iso_str.endswith("Z"):
-                iso_str = iso_str.replace("Z", "+00:00")
-            return datetime.fromisoformat(iso_str).timestamp()
-        except Exception:
-            return None
-
-    @staticmethod
-    def _is_valid_price(value) -> bool:
-        try:
-            x = float(value)
-            return x > 0
-        except Exception:
-            return False
 
 
 if __name__ == "__main__":
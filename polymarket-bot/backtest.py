@@ -0,0 +1,774 @@
+#!/usr/bin/env python3
+"""
+Replay / backtest for the auto_bot strategy.
+
+Feeds recorded market data through the real Bot.tick / open_pos / close_pos
+path with a simulated clock and a simulated exchange (orders match against the
+replayed book, same OrderManager path as live):
+
+    python3 backtest.py logs/                       # TICK events from auto_bot.log*
+    python3 backtest.py --snapshots books.jsonl     # order-book snapshot JSONL
+    python3 backtest.py --recording data/ticks      # binary segments from TICK_RECORD_DIR
+    python3 backtest.py logs/ --threshold 0.35 --take-profit 0.15 --window 30
+    python3 backtest.py logs/ --engine vector       # NumPy fast path (top of book only)
+
+Inputs:
+- auto_bot.log (and rotated .1 .. .N): TICK events carry top of book only,
+  replayed with `--depth` shares at each best price.
+- tick_recorder segments (TICK_RECORD_DIR): full top-N books, memory-mapped.
+- snapshot JSONL, one line per poll:
+    {"ts": 1760000000.0, "question": "...",
+     "up":   {"bids": [[0.41, 120], ...], "asks": [[0.43, 80], ...]},
+     "down": {"bids": [...], "asks": [...]}}
+
+Markets may interleave (MAX_MARKETS > 1 logs one TICK per market per tick):
+each market keeps its own slot, and a row only re-evaluates its own market.
+A market ends at its last row once a later market has started (the bot moves
+to the next market of a series only after the current one ends); a position
+still open then is settled (`--settle bid`: at the last bid seen;
+`--settle resolve`: at 1/0 by whether the last mid was above 0.5), since the
+live bot has no settlement path of its own. Markets still trading when the
+data stops keep their positions (reported as unrealized).
+
+The vector engine re-implements the same decisions over NumPy arrays for
+parameter sweeps; with top-of-book data both engines produce the same trades.
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import tick_recorder
+from auto_bot import Bot, load_env_file
+from log_analytics import log_files
+from market_index import IndexedMarket
+from orders import round_size
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+Level = namedtuple("Level", "price size")
+BookSide = Tuple[Tuple[Level, ...], Tuple[Level, ...]]  # (bids, asks)
+
+NAN = float("nan")
+DEFAULT_DEPTH = 1e9
+
+
+# --- data ---
+
+
+@dataclass
+class Ticks:
+    """Columnar replay data. NaN marks a missing price; `books` is per-row depth (None: top of book only)."""
+
+    ts: array = field(default_factory=lambda: array("d"))
+    market: array = field(default_factory=lambda: array("i"))
+    up_ask: array = field(default_factory=lambda: array("d"))
+    up_bid: array = field(default_factory=lambda: array("d"))
+    down_ask: array = field(default_factory=lambda: array("d"))
+    down_bid: array = field(default_factory=lambda: array("d"))
+    questions: List[str] = field(default_factory=list)
+    books: Optional[List[Tuple[BookSide, BookSide]]] = None
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def append(self, ts: float, question: str, up: Tuple[float, float], down: Tuple[float, float], _qidx: Dict[str, int]) -> None:
+        idx = _qidx.get(question)
+        if idx is None:
+            idx = _qidx[question] = len(self.questions)
+            self.questions.append(question)
+        self.ts.append(ts)
+        self.market.append(idx)
+        self.up_ask.append(up[0])
+        self.up_bid.append(up[1])
+        self.down_ask.append(down[0])
+        self.down_bid.append(down[1])
+
+    def spans(self) -> Tuple[List[int], List[int]]:
+        """(first row, last row) of each market; -1 for a market without rows."""
+        first = [-1] * len(self.questions)
+        last = [-1] * len(self.questions)
+        for i, m in enumerate(self.market):
+            if first[m] < 0:
+                first[m] = i
+            last[m] = i
+        return first, last
+
+    def arrays(self) -> Dict[str, "np.ndarray"]:
+        """Zero-copy NumPy views of the columns."""
+        if np is None:
+            raise RuntimeError("numpy is required for the vector engine (pip install numpy)")
+        return {
+            "ts": np.frombuffer(self.ts, dtype=np.float64),
+            "market": np.frombuffer(self.market, dtype=np.int32),
+            "up_ask": np.frombuffer(self.up_ask, dtype=np.float64),
+            "up_bid": np.frombuffer(self.up_bid, dtype=np.float64),
+            "down_ask": np.frombuffer(self.down_ask, dtype=np.float64),
+            "down_bid": np.frombuffer(self.down_bid, dtype=np.float64),
+        }
+
+
+def _px(v) -> float:
+    return NAN if v is None else float(v)
+
+
+def _ts(v) -> Optional[float]:
+    if isinstance(v, (int, float)):
+        return float(v)
+    if not v:
+        return None
+    try:
+        return datetime.fromisoformat(str(v).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def load_log_ticks(paths: Iterable[Path]) -> Ticks:
+    ticks = Ticks()
+    qidx: Dict[str, int] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for ln in f:
+                if '"TICK"' not in ln:
+                    continue
+                try:
+                    ev = json.loads(ln)
+                except ValueError:
+                    continue
+                ts = _ts(ev.get("ts"))
+                if ev.get("event") != "TICK" or ts is None:
+                    continue
+                ticks.append(
+                    ts,
+                    str(ev.get("question", "")),
+                    (_px(ev.get("upAsk")), _px(ev.get("upBid"))),
+                    (_px(ev.get("downAsk")), _px(ev.get("downBid"))),
+                    qidx,
+                )
+    return ticks
+
+
+def _levels(rows) -> Tuple[Level, ...]:
+    out = []
+    for r in rows or []:
+        if isinstance(r, dict):
+            p, s = r.get("price"), r.get("size")
+        else:
+            p, s = r[0], r[1]
+        p, s = float(p), float(s)
+        if p > 0 and s > 0:
+            out.append(Level(p, s))
+    return tuple(out)
+
+
+def load_snapshots(path: Path) -> Ticks:
+    ticks = Ticks(books=[])
+    qidx: Dict[str, int] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for ln in f:
+            ln = ln.strip()
+            if not ln:
+                continue
+            try:
+                row = json.loads(ln)
+            except ValueError:
+                continue
+            ts = _ts(row.get("ts"))
+            if ts is None:
+                continue
+            sides = []
+            tops = []
+            for key in ("up", "down"):
+                b = row.get(key) or {}
+                bids, asks = _levels(b.get("bids")), _levels(b.get("asks"))
+                sides.append((bids, asks))
+                tops.append((min((l.price for l in asks), default=NAN), max((l.price for l in bids), default=NAN)))
+            ticks.append(ts, str(row.get("question", "")), tops[0], tops[1], qidx)
+            ticks.books.append((sides[0], sides[1]))
+    return ticks
+
+
+class RecordedBooks:
+    """Lazy per-row books over recorded segments (rows are decoded on access)."""
+
+    def __init__(self):
+        self._starts: List[int] = []
+        self._parts: List[Tuple[tick_recorder.Segment, int]] = []
+        self._n = 0
+
+    def add(self, seg: "tick_recorder.Segment", lo: int, hi: int) -> None:
+        if hi > lo:
+            self._starts.append(self._n)
+            self._parts.append((seg, lo))
+            self._n += hi - lo
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i: int):
+        k = bisect_right(self._starts, i) - 1
+        seg, lo = self._parts[k]
+        up, down = seg.books(seg.raw(lo + i - self._starts[k]))
+        return (
+            (tuple(Level(p, s) for p, s in up[0]), tuple(Level(p, s) for p, s in up[1])),
+            (tuple(Level(p, s) for p, s in down[0]), tuple(Level(p, s) for p, s in down[1])),
+        )
+
+
+def load_recording(directory: Path, start: Optional[float] = None, end: Optional[float] = None) -> Ticks:
+    ticks = Ticks(books=RecordedBooks())
+    qidx: Dict[str, int] = {}
+    for seg in tick_recorder.segments(directory, start, end):
+        lo = seg.index_at(start) if start is not None else 0
+        hi = seg.index_at(end + 1e-9) if end is not None else len(seg)
+        if hi <= lo:
+            continue
+        ticks.books.add(seg, lo, hi)
+        local = []
+        for m in range(len(seg.markets) or 1):
+            q = seg.question(m)
+            if q not in qidx:
+                qidx[q] = len(ticks.questions)
+                ticks.questions.append(q)
+            local.append(qidx[q])
+        if seg.records is not None:
+            # NumPy：直接从 memmap 取最优价列
+            r = seg.records[lo:hi]
+            cols = {"ts": r["ts"].astype(np.float64), "market": np.asarray(local, dtype=np.int32)[np.minimum(r["market"], len(local) - 1)]}
+            for key in ("up_bid", "up_ask", "down_bid", "down_ask"):
+                px = r[key + "_px"][:, 0]
+                cols[key] = np.where(px > 0, px / tick_recorder.PRICE_SCALE, np.nan)
+            for name in ("ts", "market", "up_ask", "up_bid", "down_ask", "down_bid"):
+                getattr(ticks, name).frombytes(np.ascontiguousarray(cols[name]).tobytes())
+            continue
+        for raw in seg.iter_raw(lo, hi):
+            (ub, ua), (db, da) = seg.books(raw)
+            ticks.ts.append(raw[0])
+            ticks.market.append(local[min(raw[1], len(local) - 1)])
+            ticks.up_ask.append(ua[0][0] if ua else NAN)
+            ticks.up_bid.append(ub[0][0] if ub else NAN)
+            ticks.down_ask.append(da[0][0] if da else NAN)
+            ticks.down_bid.append(db[0][0] if db else NAN)
+    return ticks
+
+
+# --- simulated exchange ---
+
+
+class SimBook:
+    __slots__ = ("bids", "asks", "asset_id")
+
+    def __init__(self, bids: Tuple[Level, ...] = (), asks: Tuple[Level, ...] = (), asset_id: str = ""):
+        self.bids = bids
+        self.asks = asks
+        self.asset_id = asset_id
+
+
+class SimExchange:
+    """The subset of ClobClient the Bot uses, answering from the replayed book."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.books: Dict[str, SimBook] = {}
+        self._seq = 0
+
+    def set_book(self, token_id: str, bids: Tuple[Level, ...], asks: Tuple[Level, ...]) -> None:
+        self.books[token_id] = SimBook(bids, asks, token_id)
+
+    def get_order_book(self, token_id: str) -> SimBook:
+        return self.books.get(token_id) or SimBook(asset_id=token_id)
+
+    def get_order_books(self, params) -> List[SimBook]:
+        return [self.get_order_book(p.token_id) for p in params]
+
+    def get_tick_size(self, token_id: str) -> str:
+        return "0.01"
+
+    def get_neg_risk(self, token_id: str) -> bool:
+        return False
+
+    def get_fee_rate_bps(self, token_id: str) -> int:
+        return 0
+
+    def create_order(self, args):
+        return args
+
+    def cancel(self, order_id: str) -> dict:
+        return {}
+
+    def post_order(self, args, order_type) -> dict:
+        book = self.books.get(args.token_id) or SimBook()
+        buying = args.side == "BUY"
+        levels = sorted(book.asks) if buying else sorted(book.bids, reverse=True)
+        got = notional = 0.0
+        for lv in levels:
+            if (lv.price > args.price) if buying else (lv.price < args.price):
+                break
+            take = min(lv.size, args.size - got)
+            got += take
+            notional += take * lv.price
+            if got >= args.size:
+                break
+        if got <= 0 or (order_type == "FOK" and got < args.size - 1e-9):
+            return {"success": False, "errorMsg": "order couldn't be fully filled", "orderID": "", "status": ""}
+        self._seq += 1
+        making, taking = (notional, got) if buying else (got, notional)
+        return {
+            "success": True,
+            "errorMsg": "",
+            "orderID": f"sim-{self._seq}",
+            "status": "matched",
+            "makingAmount": making,
+            "takingAmount": taking,
+        }
+
+
+# --- results ---
+
+
+@dataclass
+class Params:
+    threshold: float
+    take_profit: float
+    window: int
+    order_size: float
+    capital: float = 500.0
+    settle: str = "bid"
+    max_markets: int = 1
+
+
+@dataclass
+class Result:
+    params: Params
+    trades: int
+    wins: int
+    pnl: float
+    realized: float
+    unrealized: float
+    max_drawdown: float
+    final_capital: float
+    open_at_end: bool
+    elapsed_s: float = 0.0
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        return self.wins / self.trades if self.trades else None
+
+    def summary(self) -> Dict:
+        d = asdict(self)
+        d["hit_rate"] = self.hit_rate
+        for k in ("pnl", "realized", "unrealized", "max_drawdown", "final_capital"):
+            d[k] = round(d[k], 6)
+        d["elapsed_s"] = round(self.elapsed_s, 4)
+        return d
+
+
+def settle_price(ask: float, bid: float, mode: str) -> float:
+    """Value per share of a position whose market ended (NaN-safe)."""
+    if mode == "resolve":
+        px = [x for x in (ask, bid) if x == x]
+        return 1.0 if px and sum(px) / len(px) > 0.5 else 0.0
+    return bid if bid == bid else 0.0
+
+
+def _drawdown(pnls: Sequence[float]) -> float:
+    equity = peak = dd = 0.0
+    for x in pnls:
+        equity += x
+        peak = max(peak, equity)
+        dd = max(dd, peak - equity)
+    return dd
+
+
+# --- event engine (the real Bot) ---
+
+
+class ReplayDiscovery:
+    """Stands in for DiscoveryWorker: the selection is the markets live at the replayed row."""
+
+    def __init__(self):
+        self.selection: Tuple[IndexedMarket, ...] = ()
+
+    def active(self, now: Optional[float] = None, n: int = 1) -> List[IndexedMarket]:
+        return list(self.selection)
+
+    def period_s(self, m: IndexedMarket) -> Optional[float]:
+        return None
+
+
+def ended_markets(first: Sequence[int], last: Sequence[int]) -> List[bool]:
+    """Whether each market ended at its last row: a later market has started by then."""
+    latest = max(first, default=-1)
+    return [0 <= k < latest for k in last]
+
+
+def replay(ticks: Ticks, params: Params, depth: float = DEFAULT_DEPTH) -> Result:
+    started = time.perf_counter()
+    sim = SimExchange()
+    bot = Bot(client=sim, clock=lambda: sim.now, offline=True)
+    bot.entry_threshold = params.threshold
+    bot.take_profit_pct = params.take_profit
+    bot.entry_window_minutes = params.window
+    bot.max_order_size = params.order_size
+    bot.max_markets = max(1, params.max_markets)
+    bot.capital = bot.starting_capital = params.capital
+    disc = bot.discovery = ReplayDiscovery()
+
+    ts, mk = ticks.ts, ticks.market
+    ua, ub, da, db = ticks.up_ask, ticks.up_bid, ticks.down_ask, ticks.down_bid
+    books = ticks.books
+    first, last = ticks.spans()
+    ended = ended_markets(first, last)
+    markets = [
+        IndexedMarket(
+            condition_id=f"replay-{i}",
+            question=q,
+            up_token=f"{i}:UP",
+            down_token=f"{i}:DOWN",
+            end_ts=ts[last[i]] if ended[i] else math.inf,
+        )
+        for i, q in enumerate(ticks.questions)
+    ]
+    trade_pnls: List[float] = []
+    live: Dict[int, IndexedMarket] = {}
+
+    for i in range(len(ticks)):
+        sim.now = ts[i]
+        c = mk[i]
+        m = markets[c]
+        if c not in live:
+            live[c] = m
+            disc.selection = tuple(live.values())
+        if books is not None:
+            (ubids, uasks), (dbids, dasks) = books[i]
+        else:
+            ubids = (Level(ub[i], depth),) if ub[i] == ub[i] else ()
+            uasks = (Level(ua[i], depth),) if ua[i] == ua[i] else ()
+            dbids = (Level(db[i], depth),) if db[i] == db[i] else ()
+            dasks = (Level(da[i], depth),) if da[i] == da[i] else ()
+        sim.set_book(m.up_token, ubids, uasks)
+        sim.set_book(m.down_token, dbids, dasks)
+        # 每行只是这一个盘的新盘口：只评估它（新盘在 sync_slots 里自带 touched）
+        for s in bot.slots.values():
+            s.touched = s.key == m.condition_id
+
+        before = bot.realized_pnl
+        bot.tick()
+        # 实盘里订单完成会立即唤醒下一次 tick；回放里直接在同一时刻入账
+        bot.process_fills()
+        if bot.realized_pnl != before:
+            trade_pnls.append(bot.realized_pnl - before)
+
+        if i == last[c] and ended[c]:
+            # 这个盘已结束：还没平掉的仓位按结算价了结
+            del live[c]
+            disc.selection = tuple(live.values())
+            slot = bot.drop_slot(m.condition_id)
+            p = slot.pos if slot is not None else None
+            if p is not None:
+                px = settle_price(ua[i], ub[i], params.settle) if p.side == "UP" else settle_price(da[i], db[i], params.settle)
+                proceeds = p.qty * px
+                bot.capital += proceeds
+                bot.realized_pnl += proceeds - p.size_usdc
+                trade_pnls.append(proceeds - p.size_usdc)
+
+    unrealized = 0.0
+    held = [s for s in bot.slots.values() if s.pos is not None]
+    index = {m.condition_id: c for c, m in enumerate(markets)}
+    for s in held:
+        k = last[index[s.key]]
+        bid = (ub if s.pos.side == "UP" else db)[k]
+        unrealized += (s.pos.qty * bid if bid == bid else 0.0) - s.pos.size_usdc
+    return Result(
+        params=params,
+        trades=len(trade_pnls),
+        wins=sum(1 for x in trade_pnls if x > 0),
+        pnl=bot.realized_pnl + unrealized,
+        realized=bot.realized_pnl,
+        unrealized=unrealized,
+        max_drawdown=_drawdown(trade_pnls),
+        final_capital=bot.capital,
+        open_at_end=bool(held),
+        elapsed_s=time.perf_counter() - started,
+    )
+
+
+# --- vector engine (NumPy) ---
+
+BLOCK = 256
+
+
+class VectorData:
+    """Precomputed arrays shared by every configuration of a sweep.
+
+    Rows are stably sorted by (market, ts) so each market is one contiguous
+    segment ending at `run_ends`; `row` keeps each sorted position's original
+    row, which orders events across markets. All state lives in the named
+    columns (see COLUMNS), so a sweep can place them in shared memory once and
+    re-attach in each worker via from_columns().
+    """
+
+    COLUMNS = (
+        "ts",
+        "up_ask",
+        "up_bid",
+        "down_ask",
+        "down_bid",
+        "row",
+        "minute",
+        "valid",
+        "run_ends",
+        "run_open",
+        "bid_up",
+        "bid_down",
+        "bm_up",
+        "bm_down",
+    )
+
+    def __init__(self, cols: Dict[str, "np.ndarray"]):
+        for name in self.COLUMNS:
+            setattr(self, name, cols[name])
+        self.n = len(self.ts)
+        self.run_starts = np.append(0, self.run_ends[:-1] + 1) if len(self.run_ends) else self.run_ends
+        self.bid = {"UP": self.bid_up, "DOWN": self.bid_down}
+        self.block_max = {"UP": self.bm_up, "DOWN": self.bm_down}
+
+    @classmethod
+    def build(cls, cols: Dict[str, "np.ndarray"]) -> "VectorData":
+        n = len(cols["ts"])
+        order = np.lexsort((cols["ts"], cols["market"]))
+        out = {k: cols[k][order] for k in ("ts", "up_ask", "up_bid", "down_ask", "down_bid")}
+        out["row"] = order.astype(np.int64)
+        ts = out["ts"]
+        out["minute"] = ((ts // 60) % 60).astype(np.int16)
+        # 每个盘（排序后同一 market 的一段）最后一行的下标
+        out["run_ends"] = np.append(np.flatnonzero(np.diff(cols["market"][order]) != 0), n - 1) if n else np.zeros(0, dtype=np.int64)
+        # 有更晚开始的盘时，这个盘在最后一行结束并结算；数据结束时还在交易的盘保留持仓
+        if n:
+            starts = np.append(0, out["run_ends"][:-1] + 1)
+            first = np.minimum.reduceat(out["row"], starts)
+            out["run_open"] = np.maximum.reduceat(out["row"], starts) >= first.max()
+        else:
+            out["run_open"] = np.zeros(0, dtype=bool)
+        # 两边盘口都为空的 tick，Bot 直接 NO_PRICE 返回
+        valid = ~(np.isnan(out["up_ask"]) & np.isnan(out["up_bid"])) & ~(np.isnan(out["down_ask"]) & np.isnan(out["down_bid"]))
+        out["valid"] = valid
+        starts = np.arange(0, n, BLOCK)
+        for side, col in (("up", out["up_bid"]), ("down", out["down_bid"])):
+            b = np.where(valid, col, np.nan)
+            out[f"bid_{side}"] = b
+            out[f"bm_{side}"] = np.fmax.reduceat(b, starts) if n else b
+        return cls(out)
+
+    @classmethod
+    def from_ticks(cls, ticks: Ticks) -> "VectorData":
+        return cls.build(ticks.arrays())
+
+    def columns(self) -> Dict[str, "np.ndarray"]:
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    def run_of(self, i: int) -> int:
+        return int(np.searchsorted(self.run_ends, i))
+
+    def after_row(self, run: int, row: int) -> int:
+        """First position of the run whose original row is after `row`."""
+        lo, hi = int(self.run_starts[run]), int(self.run_ends[run]) + 1
+        return lo + int(np.searchsorted(self.row[lo:hi], row, side="right"))
+
+    def first_take_profit(self, side: str, start: int, stop: int, entry: float, tp: float) -> int:
+        """First index in [start, stop] where (bid - entry) / entry >= tp, or -1."""
+        bid, bm = self.bid[side], self.block_max[side]
+        if start > stop:
+            return -1
+        b = start // BLOCK
+        seg = bid[start : min((b + 1) * BLOCK, stop + 1)]
+        hit = np.flatnonzero((seg - entry) / entry >= tp)
+        if hit.size:
+            return start + int(hit[0])
+        # 按块最大值跳跃，窗口倍增，均摊成本与距离成正比
+        lo, width, last = b + 1, 8, stop // BLOCK + 1
+        while lo < last:
+            hi = min(last, lo + width)
+            hb = np.flatnonzero((bm[lo:hi] - entry) / entry >= tp)
+            if hb.size:
+                blk = lo + int(hb[0])
+                seg = bid[blk * BLOCK : (blk + 1) * BLOCK]
+                j = blk * BLOCK + int(np.flatnonzero((seg - entry) / entry >= tp)[0])
+                return j if j <= stop else -1
+            lo, width = hi, width * 2
+        return -1
+
+
+def simulate_vector(data: VectorData, params: Params) -> Result:
+    """Same decisions as Bot.tick with top-of-book fills at the limit price (infinite depth).
+
+    Markets are independent apart from the shared capital and the MAX_MARKETS
+    position cap, so each flat market's next entry and each position's exit
+    are found per segment and the events are merged in original row order.
+    """
+    started = time.perf_counter()
+    thr, tp = params.threshold, params.take_profit
+    cap = max(1, params.max_markets)
+    ua, da = data.up_ask, data.down_ask
+    with np.errstate(invalid="ignore"):
+        up_ok = ua <= thr
+        down_ok = da <= thr
+    entries = np.flatnonzero(data.valid & (data.minute < params.window) & (up_ok | down_ok))
+
+    events: List[Tuple[int, int, int, float]] = []  # (row, run, position, proceeds)；proceeds 为 NaN 表示开仓候选
+
+    def next_entry(run: int, start: int) -> None:
+        k = int(np.searchsorted(entries, start))
+        if k < len(entries) and entries[k] <= data.run_ends[run]:
+            i = int(entries[k])
+            heapq.heappush(events, (int(data.row[i]), run, i, NAN))
+
+    for run in range(len(data.run_ends)):
+        next_entry(run, int(data.run_starts[run]))
+
+    capital = params.capital
+    pnls: List[float] = []
+    held: Dict[int, Tuple[str, float, float]] = {}  # run -> (side, qty, cost)
+    blocked: List[int] = []  # 因持仓数 / 资金不足跳过的盘，等有仓位了结后再找下一次开仓
+    while events:
+        row, run, i, proceeds = heapq.heappop(events)
+        if proceeds == proceeds:
+            _, _, cost = held.pop(run)
+            capital += proceeds
+            pnls.append(proceeds - cost)
+            next_entry(run, i + 1)
+            for r in blocked:
+                next_entry(r, data.after_row(r, row))
+            blocked.clear()
+            continue
+        # 与 Bot 一致：按价格升序，平价时 UP 在前
+        if up_ok[i] and not (down_ok[i] and da[i] < ua[i]):
+            side, ask = "UP", float(ua[i])
+        else:
+            side, ask = "DOWN", float(da[i])
+        size_usdc = min(params.order_size, capital)
+        if ask > 0 and (len(held) >= cap or size_usdc <= 0):
+            blocked.append(run)
+            continue
+        qty = round_size(size_usdc / ask) if ask > 0 else 0.0
+        if qty <= 0:
+            next_entry(run, i + 1)
+            continue
+        cost = qty * ask
+        capital -= cost
+        entry = round(cost / qty, 6)
+        held[run] = (side, qty, cost)
+        end = int(data.run_ends[run])
+        j = data.first_take_profit(side, i + 1, end, entry, tp)
+        if j >= 0:
+            heapq.heappush(events, (int(data.row[j]), run, j, qty * float(data.bid[side][j])))
+        elif not data.run_open[run]:
+            ask_col, bid_col = (data.up_ask, data.up_bid) if side == "UP" else (data.down_ask, data.down_bid)
+            heapq.heappush(events, (int(data.row[end]), run, end, qty * settle_price(float(ask_col[end]), float(bid_col[end]), params.settle)))
+
+    realized = sum(pnls)
+    unrealized = 0.0
+    for run, (side, qty, cost) in held.items():
+        last = float((data.up_bid if side == "UP" else data.down_bid)[data.run_ends[run]])
+        unrealized += (qty * last if last == last else 0.0) - cost
+    return Result(
+        params=params,
+        trades=len(pnls),
+        wins=sum(1 for x in pnls if x > 0),
+        pnl=realized + unrealized,
+        realized=realized,
+        unrealized=unrealized,
+        max_drawdown=_drawdown(pnls),
+        final_capital=capital,
+        open_at_end=bool(held),
+        elapsed_s=time.perf_counter() - started,
+    )
+
+
+# --- CLI ---
+
+
+def load_ticks(args) -> Ticks:
+    if getattr(args, "recording", None):
+        return load_recording(Path(args.recording))
+    if args.snapshots:
+        return load_snapshots(Path(args.snapshots))
+    if not args.logs:
+        raise SystemExit("give a log file/directory or --snapshots")
+    files = log_files(Path(args.logs), args.log_name)
+    if not files:
+        raise SystemExit(f"no {args.log_name}* under {args.logs}")
+    return load_log_ticks(files)
+
+
+def default_params(args) -> Params:
+    """CLI flags, falling back to the bot's env / .env strategy settings."""
+    load_env_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+
+    def pick(cli, name, default):
+        return cli if cli is not None else type(default)(os.getenv(name, str(default)))
+
+    return Params(
+        threshold=pick(args.threshold, "ENTRY_PRICE_THRESHOLD", 0.30),
+        take_profit=pick(args.take_profit, "TAKE_PROFIT_PCT", 0.20),
+        window=pick(args.window, "ENTRY_WINDOW_MINUTES", 20),
+        order_size=pick(args.order_size, "MAX_ORDER_SIZE_USDC", 50.0),
+        capital=pick(args.capital, "STARTING_CAPITAL_USDC", 500.0),
+        settle=args.settle,
+        max_markets=pick(args.max_markets, "MAX_MARKETS", 1),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Replay recorded market data through the auto_bot strategy")
+    ap.add_argument("logs", nargs="?", help="auto_bot.log file or log directory (rotations included)")
+    ap.add_argument("--log-name", default="auto_bot.log")
+    ap.add_argument("--snapshots", help="order-book snapshot JSONL instead of TICK logs")
+    ap.add_argument("--recording", help="tick_recorder segment directory (TICK_RECORD_DIR) instead of TICK logs")
+    ap.add_argument("--engine", choices=["event", "vector"], default="event")
+    ap.add_argument("--threshold", type=float)
+    ap.add_argument("--take-profit", type=float)
+    ap.add_argument("--window", type=int)
+    ap.add_argument("--order-size", type=float)
+    ap.add_argument("--capital", type=float)
+    ap.add_argument("--max-markets", type=int, help="positions held at once across markets (MAX_MARKETS)")
+    ap.add_argument("--settle", choices=["bid", "resolve"], default="bid", help="value of a position whose market ended")
+    ap.add_argument("--depth", type=float, default=DEFAULT_DEPTH, help="shares at each best price for top-of-book data")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    ticks = load_ticks(args)
+    load_s = time.perf_counter() - t0
+    params = default_params(args)
+
+    if args.engine == "vector":
+        if args.snapshots:
+            ap.error("--engine vector replays top of book only; use the event engine for depth snapshots")
+        # 录制数据用向量引擎时只取最优价（等同 TICK 日志），深度被忽略
+        if np is None:
+            ap.error("--engine vector needs numpy (pip install numpy)")
+        res = simulate_vector(VectorData.from_ticks(ticks), params)
+    else:
+        res = replay(ticks, params, depth=args.depth)
+
+    out = {"ok": True, "engine": args.engine, "ticks": len(ticks), "markets": len(ticks.questions), "loadS": round(load_s, 3), **res.summary()}
+    print(json.dumps(out, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: dedupe + apply_confidence on a synthetic news batch.
+
+Compares the current single-normalization pipeline in
+news_whitelist_fetcher against the previous implementation (normalize_title
+called three times per item, group stats recomputed per member). The
+near-duplicate (MinHash/LSH) path is timed separately since it changes the
+grouping and therefore the output.
+
+    python3 bench_news_confidence.py --items 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import time
+from typing import Callable, Dict, List, Set, Tuple
+
+from news_whitelist_fetcher import RawItem, apply_confidence, dedupe, domain_of
+
+WORDS = (
+    "fed rates bitcoin etf inflation treasury yields sec approves rally slump market crypto "
+    "powell cuts hikes jobs report payrolls dollar oil gold stocks futures tariffs china"
+).split()
+SOURCES = [("Reuters", "reuters.com"), ("Bloomberg", "bloomberg.com"), ("FT", "ft.com"), ("CoinDesk", "coindesk.com")]
+SUFFIXES = ["", " - update", ": live", " (video)"]
+SUFFIX_RE = re.compile(r"( - update|: live| \(video\))$")
+# 近似匹配默认关闭，基准按建议阈值单独计时
+NEAR_DUP_SIMILARITY = 0.7
+
+
+def synth(n: int, seed: int = 7) -> List[RawItem]:
+    rnd = random.Random(seed)
+    topics = [" ".join(rnd.choice(WORDS) for _ in range(rnd.randint(6, 12))) for _ in range(max(1, n // 4))]
+    items = []
+    for i in range(n):
+        name, dom = rnd.choice(SOURCES)
+        title = rnd.choice(topics).title() + rnd.choice(SUFFIXES)
+        items.append(
+            RawItem(
+                title=title,
+                url=f"https://www.{dom}/a/{i % (n // 2 or 1)}",
+                source=name,
+                category=rnd.choice(["media", "data"]),
+                published_at=f"2026-02-{1 + i % 28:02d}T00:00:00+00:00",
+                weight=rnd.choice([0.62, 0.78, 0.82, 0.9]),
+            )
+        )
+    return items
+
+
+# --- previous implementation, kept here only as the benchmark baseline ---
+
+
+def legacy_normalize_title(title: str) -> str:
+    t = title.lower()
+    t = re.sub(r"https?://\S+", " ", t)
+    t = re.sub(r"[^\w\s]", " ", t)
+    t = re.sub(r"\s+", " ", t).strip()
+    stop = {"the", "a", "an", "to", "of", "for", "and", "on", "in", "is", "at", "with", "by", "from", "after", "as"}
+    toks = [x for x in t.split() if len(x) > 2 and x not in stop]
+    return " ".join(toks[:8])
+
+
+def legacy_pipeline(items: List[RawItem]) -> List[Dict]:
+    seen: Set[Tuple[str, str]] = set()
+    uniq: List[RawItem] = []
+    for it in items:
+        key = (legacy_normalize_title(it.title), it.url)
+        if key in seen:
+            continue
+        seen.add(key)
+        uniq.append(it)
+
+    by_topic: Dict[str, List[RawItem]] = {}
+    for it in uniq:
+        by_topic.setdefault(f"{it.category}:{legacy_normalize_title(it.title)}", []).append(it)
+
+    out = []
+    for it in uniq:
+        group = by_topic.get(f"{it.category}:{legacy_normalize_title(it.title)}", [])
+        unique_sources = {g.source for g in group}
+        unique_domains = {domain_of(g.url) for g in group if g.url}
+        cross = len(unique_sources) >= 2 and len(unique_domains) >= 2
+        out.append(
+            {
+                "title": it.title,
+                "url": it.url,
+                "source": it.source,
+                "publishedAt": it.published_at,
+                "confidence": 0.9 if cross else round(max(0.45, min(0.95, it.weight)), 2),
+                "meta": {
+                    "category": it.category,
+                    "crossVerified": cross,
+                    "topicPeerCount": len(group),
+                    "distinctSources": len(unique_sources),
+                },
+            }
+        )
+    out.sort(key=lambda x: x.get("publishedAt", ""), reverse=True)
+    return out
+
+
+def current_pipeline(items: List[RawItem]) -> List[Dict]:
+    return apply_confidence(dedupe(items), similarity=0)
+
+
+def lsh_pipeline(items: List[RawItem]) -> List[Dict]:
+    return apply_confidence(dedupe(items), similarity=NEAR_DUP_SIMILARITY)
+
+
+def false_cross_verified(out: List[Dict]) -> Tuple[int, int]:
+    """(truly cross-verified rows, rows marked crossVerified whose synthetic topic is not).
+
+    Ground truth: the generated topic (title without its suffix) seen from at
+    least two sources in the same category. The vocabulary is tiny, so distinct
+    topics can still be genuine near-duplicates by token Jaccard.
+    """
+    sources: Dict[Tuple[str, str], Set[str]] = {}
+    for x in out:
+        sources.setdefault((x["meta"]["category"], SUFFIX_RE.sub("", x["title"])), set()).add(x["source"])
+    truth = [len(sources[(x["meta"]["category"], SUFFIX_RE.sub("", x["title"]))]) >= 2 for x in out]
+    return sum(truth), sum(1 for x, t in zip(out, truth) if x["meta"]["crossVerified"] and not t)
+
+
+def best_of(fn: Callable[[List[RawItem]], List[Dict]], items: List[RawItem], repeat: int) -> Tuple[float, List[Dict]]:
+    best = float("inf")
+    out: List[Dict] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(items)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark news dedupe + confidence scoring")
+    ap.add_argument("--items", type=int, default=50000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    items = synth(args.items)
+    legacy_s, legacy_out = best_of(legacy_pipeline, items, args.repeat)
+    current_s, current_out = best_of(current_pipeline, items, args.repeat)
+    lsh_s, lsh_out = best_of(lsh_pipeline, items, args.repeat)
+    true_cross, false_cross = false_cross_verified(lsh_out)
+
+    print(
+        json.dumps(
+            {
+                "items": len(items),
+                "unique": len(current_out),
+                "sameOutput": legacy_out == current_out,
+                "legacyMs": round(legacy_s * 1000, 1),
+                "currentMs": round(current_s * 1000, 1),
+                "speedup": round(legacy_s / current_s, 2) if current_s else None,
+                "nearDupMs": round(lsh_s * 1000, 1),
+                "nearDupCrossVerified": sum(1 for x in lsh_out if x["meta"]["crossVerified"]),
+                "trueCrossVerified": true_cross,
+                "nearDupFalseCrossVerified": false_cross,
+            },
+            ensure_ascii=False,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+ClobClient start-up off the restart path.
+
+Importing py_clob_client (eth_account) takes over a second and deriving the
+L2 API creds is a signed network round trip. LazyClient builds the client on
+a background thread while the bot restores its journal, loads the market
+index and connects its streams; attribute access waits until it is ready.
+Derived creds are cached on disk (mode 0600) under a hash of host, signing
+key, signature type and funder, so a restart reuses them without a request.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+CREDS_FIELDS = ("api_key", "api_secret", "api_passphrase")
+
+
+def creds_fingerprint(host: str, key: str, signature_type: int, funder: str) -> str:
+    return hashlib.sha256(f"{host}|{key.lower()}|{signature_type}|{funder.lower()}".encode()).hexdigest()
+
+
+def load_creds(path: Path, fingerprint: str) -> Optional[Dict[str, str]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("fingerprint") != fingerprint:
+        return None
+    creds = {k: data.get(k) for k in CREDS_FIELDS}
+    return creds if all(isinstance(v, str) and v for v in creds.values()) else None
+
+
+def save_creds(path: Path, fingerprint: str, creds: Dict[str, str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, **{k: creds[k] for k in CREDS_FIELDS}}, f)
+    tmp.replace(path)
+
+
+def drop_creds(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class LazyClient:
+    """Proxy for a client built on a background thread by `build`.
+
+    Attribute access waits up to `wait_s` for the build and then raises
+    RuntimeError, so a hung creds derivation fails the caller's request
+    instead of freezing it; failed builds are logged and retried with
+    exponential backoff (capped at `retry_max_s`); `on_ready` is called on the
+    build thread once the client is usable. `refresh` runs follow-up
+    work on the built client (re-deriving rejected creds) off the caller's
+    thread.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[], object],
+        log: Callable[..., None] = lambda event, **kw: None,
+        retry_max_s: float = 60.0,
+        wait_s: float = 30.0,
+        on_ready: Optional[Callable[[], None]] = None,
+    ):
+        self._build = build
+        self._log = log
+        self._retry_max_s = retry_max_s
+        self._wait_s = wait_s
+        self._on_ready = on_ready
+        self._client: Optional[object] = None
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._refreshing = threading.Lock()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="clob-init", daemon=True)
+            self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def _run(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                self._client = self._build()
+                self._ready.set()
+                break
+            except Exception as e:
+                self._log("ERR_CLIENT_INIT", err=str(e), retryInS=delay)
+                time.sleep(delay)
+                delay = min(self._retry_max_s, delay * 2)
+        if self._on_ready is not None:
+            self._on_ready()
+
+    def refresh(self, job: Callable[[object], None]) -> bool:
+        """Run `job(client)` on a background thread; False if one is already running."""
+        if not self._refreshing.acquire(blocking=False):
+            return False
+
+        def run() -> None:
+            try:
+                if not self._ready.wait(self._wait_s):
+                    raise RuntimeError("clob client not ready")
+                job(self._client)
+            except Exception as e:
+                self._log("ERR_CLIENT_REFRESH", err=str(e))
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=run, name="clob-refresh", daemon=True).start()
+        return True
+
+    def __getattr__(self, name: str):
+        if not self._ready.wait(self._wait_s):
+            raise RuntimeError(f"clob client not ready after {self._wait_s:g}s")
+        return getattr(self._client, name)
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Polymarket CLOB (stdlib only, for dry runs and tests).
+
+Serves one synthetic BTC hourly Up/Down market (--markets N adds 15-minute
+and ETH / SOL markets, each with its own price walk):
+- REST: /markets, /book, POST /books, /tick-size, /neg-risk, /fee-rate, /auth/derive-api-key,
+        /auth/api-key, POST /order (FOK/FAK matched against the book)
+- WS:   /ws/market (book snapshot on subscribe, then price_change deltas)
+        /ws/user   (trade events for our orders)
+
+    python3 fake_clob.py --port 8080
+    CLOB_BASE_URL=http://127.0.0.1:8080 \
+    MARKET_DATA_MODE=ws MARKET_WS_URL=ws://127.0.0.1:8080/ws/market \
+    POLY_PRIVATE_KEY=0x1111111111111111111111111111111111111111111111111111111111111111 \
+    python3 auto_bot.py
+"""
+
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import queue
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+LEVELS = 5
+UNITS = 1_000_000
+# 第 2 个起的盘：(资产, 周期分钟)
+EXTRA_MARKETS = (("Bitcoin", 15), ("Ethereum", 60), ("Solana", 60), ("Ethereum", 15), ("Solana", 15))
+
+
+def px(x: float) -> str:
+    return f"{x:.2f}"
+
+
+class FakeExchange:
+    def __init__(self, seed: int = 7, mid: float = 0.5, vol: float = 0.01, fill_delay_ms: int = 0, max_fill: float = 0.0, markets: int = 1):
+        self.rnd = random.Random(seed)
+        self.vol = vol
+        self.fill_delay_ms = fill_delay_ms
+        self.max_fill = max_fill
+        self.ids = itertools.count(1)
+        # (condition id, up token, down token, asset, period minutes)
+        self.listing: List[Tuple[str, str, str, str, int]] = []
+        for i in range(max(1, markets)):
+            asset, period = ("Bitcoin", 60) if i == 0 else EXTRA_MARKETS[(i - 1) % len(EXTRA_MARKETS)]
+            cid = "0xfeedbeef" if i == 0 else f"0xfeed{i:04x}"
+            self.listing.append((cid, "1" * 20 + f"{2 * i + 1:04d}", "1" * 20 + f"{2 * i + 2:04d}", asset, period))
+        self.condition_id, self.up, self.down = self.listing[0][:3]
+        self.mids = {m[0]: mid for m in self.listing}
+        self.market_of = {t: m[0] for m in self.listing for t in m[1:3]}
+        self.lock = threading.Lock()
+        self.books: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self.subscribers: List[Tuple[Set[str], "queue.Queue[str]"]] = []
+        self.user_subscribers: List["queue.Queue[str]"] = []
+        self._rebuild()
+
+    # --- market state ---
+
+    def _levels(self, mid: float) -> Dict[str, Dict[str, str]]:
+        tick = 0.01
+        best_ask = min(0.99, max(0.02, round(mid + tick, 2)))
+        best_bid = max(0.01, round(best_ask - 2 * tick, 2))
+        asks = {px(best_ask + i * tick): str(self.rnd.randint(20, 400)) for i in range(LEVELS) if best_ask + i * tick < 1}
+        bids = {px(best_bid - i * tick): str(self.rnd.randint(20, 400)) for i in range(LEVELS) if best_bid - i * tick > 0}
+        return {"bids": bids, "asks": asks}
+
+    def _rebuild(self) -> Dict[str, Dict[str, Dict[str, str]]]:
+        old = self.books
+        self.books = {}
+        for cid, up, down, _, _ in self.listing:
+            self.books[up] = self._levels(self.mids[cid])
+            self.books[down] = self._levels(1 - self.mids[cid])
+        return old
+
+    def step(self) -> None:
+        with self.lock:
+            for cid in self.mids:
+                self.mids[cid] = min(0.97, max(0.03, self.mids[cid] + self.rnd.gauss(0, self.vol)))
+            old = self._rebuild()
+            changes: Dict[str, List[dict]] = {}
+            for tid, book in self.books.items():
+                for side, key in (("BUY", "bids"), ("SELL", "asks")):
+                    prev = old.get(tid, {}).get(key, {})
+                    cur = book[key]
+                    for price in set(prev) | set(cur):
+                        if prev.get(price) != cur.get(price):
+                            changes.setdefault(self.market_of[tid], []).append({"asset_id": tid, "price": price, "size": cur.get(price, "0"), "side": side})
+        for cid, rows in changes.items():
+            self.publish({"event_type": "price_change", "market": cid, "price_changes": rows, "timestamp": str(int(time.time() * 1000))})
+
+    def book(self, token_id: str) -> Optional[dict]:
+        with self.lock:
+            b = self.books.get(token_id)
+            if b is None:
+                return None
+            return {
+                "market": self.market_of[token_id],
+                "asset_id": token_id,
+                "timestamp": str(int(time.time() * 1000)),
+                "hash": "",
+                # 与线上一致：bids 升序、asks 降序（最优价在末尾）
+                "bids": [{"price": p, "size": s} for p, s in sorted(b["bids"].items(), key=lambda kv: float(kv[0]))],
+                "asks": [{"price": p, "size": s} for p, s in sorted(b["asks"].items(), key=lambda kv: -float(kv[0]))],
+                "min_order_size": "5",
+                "tick_size": "0.01",
+                "neg_risk": False,
+                "last_trade_price": px(self.mids[self.market_of[token_id]]),
+            }
+
+    def markets(self) -> List[dict]:
+        now = datetime.now(timezone.utc)
+        out = []
+        for cid, up, down, asset, period in self.listing:
+            start = now.replace(minute=now.minute - now.minute % period, second=0, microsecond=0)
+            end = start + timedelta(minutes=period)
+            if period == 60:
+                question = f"{asset} Up/Down 1h - {end:%B %d, %-I%p} ET"
+            else:
+                question = f"{asset} Up/Down {period}m - {start:%B %d, %-I:%M%p}-{end:%-I:%M%p} ET"
+            out.append(
+                {
+                    "condition_id": cid,
+                    "question": question,
+                    "active": True,
+                    "closed": False,
+                    "accepting_orders": True,
+                    "enable_order_book": True,
+                    "end_date_iso": end.isoformat().replace("+00:00", "Z"),
+                    "tokens": [{"token_id": up, "outcome": "Up"}, {"token_id": down, "outcome": "Down"}],
+                }
+            )
+        return out
+
+    # --- orders ---
+
+    def match(self, order: dict, order_type: str) -> Tuple[int, dict]:
+        """Take liquidity for a signed order dict (amounts in 1e6 units). FOK: all or nothing."""
+        tid = str(order.get("tokenId", ""))
+        side = str(order.get("side", "")).upper()
+        maker, taker = int(order.get("makerAmount", 0)), int(order.get("takerAmount", 0))
+        if tid not in self.books or side not in ("BUY", "SELL") or maker <= 0 or taker <= 0:
+            return 400, {"error": "invalid order"}
+        buying = side == "BUY"
+        qty = (taker if buying else maker) / UNITS
+        limit = round((maker / taker) if buying else (taker / maker), 4)
+
+        with self.lock:
+            levels = self.books[tid]["asks" if buying else "bids"]
+            prices = sorted(levels, key=float, reverse=not buying)
+            want = min(qty, self.max_fill) if self.max_fill else qty
+            fills: List[Tuple[str, float]] = []
+            got = 0.0
+            for p in prices:
+                if (float(p) > limit) if buying else (float(p) < limit):
+                    break
+                take = min(float(levels[p]), want - got)
+                fills.append((p, take))
+                got += take
+                if got >= want - 1e-9:
+                    break
+            if got <= 0 or (order_type == "FOK" and got < qty - 1e-9):
+                return 200, {
+                    "success": False,
+                    "errorMsg": "order couldn't be fully filled. FOK orders are fully filled or killed.",
+                    "orderID": "",
+                    "status": "",
+                }
+            changes = []
+            for p, take in fills:
+                left = float(levels[p]) - take
+                if left > 1e-9:
+                    levels[p] = f"{left:.6f}".rstrip("0").rstrip(".")
+                else:
+                    del levels[p]
+                changes.append({"asset_id": tid, "price": p, "size": levels.get(p, "0"), "side": "SELL" if buying else "BUY"})
+            oid = "0x" + hashlib.sha256(f"order-{next(self.ids)}".encode()).hexdigest()
+        self.publish({"event_type": "price_change", "market": self.market_of[tid], "price_changes": changes, "timestamp": str(int(time.time() * 1000))})
+
+        usdc = sum(float(p) * take for p, take in fills)
+        making, taking = (usdc, got) if buying else (got, usdc)
+        trade = {
+            "event_type": "trade",
+            "id": "trade-" + oid[2:14],
+            "taker_order_id": oid,
+            "market": self.market_of[tid],
+            "asset_id": tid,
+            "side": side,
+            "size": f"{got:.6f}",
+            "price": f"{usdc / got:.6f}",
+            "status": "MATCHED",
+            "maker_orders": [],
+            "timestamp": str(int(time.time() * 1000)),
+        }
+        if self.fill_delay_ms:
+            # 模拟撮合延迟：先回 delayed，成交通过用户频道推送
+            threading.Timer(self.fill_delay_ms / 1000, self.publish_user, args=(trade,)).start()
+            return 200, {"success": True, "errorMsg": "", "orderID": oid, "status": "delayed", "makingAmount": "", "takingAmount": ""}
+        self.publish_user(trade)
+        return 200, {
+            "success": True,
+            "errorMsg": "",
+            "orderID": oid,
+            "status": "matched",
+            "makingAmount": f"{making:.6f}",
+            "takingAmount": f"{taking:.6f}",
+        }
+
+    # --- ws fan-out ---
+
+    def add_subscriber(self, assets: Set[str]) -> "queue.Queue[str]":
+        q: "queue.Queue[str]" = queue.Queue()
+        with self.lock:
+            self.subscribers.append((assets, q))
+        for tid in assets:
+            b = self.book(tid)
+            if b:
+                q.put(json.dumps([{"event_type": "book", **b}]))
+        return q
+
+    def remove_subscriber(self, q: "queue.Queue[str]") -> None:
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s[1] is not q]
+            self.user_subscribers = [s for s in self.user_subscribers if s is not q]
+
+    def add_user_subscriber(self) -> "queue.Queue[str]":
+        q: "queue.Queue[str]" = queue.Queue()
+        with self.lock:
+            self.user_subscribers.append(q)
+        return q
+
+    def publish_user(self, event: dict) -> None:
+        with self.lock:
+            subs = list(self.user_subscribers)
+        for q in subs:
+            q.put(json.dumps([event]))
+
+    def publish(self, event: dict) -> None:
+        with self.lock:
+            subs = list(self.subscribers)
+        for assets, q in subs:
+            rows = [c for c in event.get("price_changes", []) if c["asset_id"] in assets]
+            if rows:
+                q.put(json.dumps({**event, "price_changes": rows}))
+
+
+def ws_recv(sock: socket.socket) -> Tuple[int, bytes]:
+    def read(n: int) -> bytes:
+        buf = b""
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("closed")
+            buf += chunk
+        return buf
+
+    b1, b2 = read(2)
+    opcode = b1 & 0x0F
+    n = b2 & 0x7F
+    if n == 126:
+        n = struct.unpack(">H", read(2))[0]
+    elif n == 127:
+        n = struct.unpack(">Q", read(8))[0]
+    mask = read(4) if b2 & 0x80 else b"\x00\x00\x00\x00"
+    data = bytes(c ^ mask[i % 4] for i, c in enumerate(read(n)))
+    return opcode, data
+
+
+def ws_send(sock: socket.socket, payload: bytes, opcode: int = 0x1) -> None:
+    n = len(payload)
+    if n < 126:
+        head = struct.pack(">BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        head = struct.pack(">BBH", 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack(">BBQ", 0x80 | opcode, 127, n)
+    sock.sendall(head + payload)
+
+
+class RestGate:
+    """Simulated REST limits: 429 above `rate_limit` requests/s, random 503s, fixed latency."""
+
+    def __init__(self, rate_limit: float = 0.0, error_rate: float = 0.0, seed: int = 7, latency_ms: float = 0.0):
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.latency_ms = latency_ms
+        self.rng = random.Random(seed)
+        self.window = int(time.time())
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def check(self) -> int:
+        with self.lock:
+            now = int(time.time())
+            if now != self.window:
+                self.window, self.count = now, 0
+            self.count += 1
+            if self.rate_limit and self.count > self.rate_limit:
+                return 429
+            if self.error_rate and self.rng.random() < self.error_rate:
+                return 503
+        return 200
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    exchange: FakeExchange
+    ws_drop_s: float = 0.0
+    gate: RestGate = RestGate()
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _json(self, payload, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _gated(self) -> bool:
+        if self.path.startswith("/auth/"):
+            return False  # 启动时的 API key 派生不受限，联调时启动结果稳定
+        if self.gate.latency_ms:
+            time.sleep(self.gate.latency_ms / 1000)
+        status = self.gate.check()
+        if status == 200:
+            return False
+        body = json.dumps({"error": "Too Many Requests" if status == 429 else "Service Unavailable"}).encode("utf-8")
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(n) if n else b""
+        return json.loads(raw) if raw else None
+
+    def do_GET(self) -> None:
+        u = urlparse(self.path)
+        qs = parse_qs(u.query)
+        if u.path in ("/ws/market", "/ws/user") and self.headers.get("Upgrade", "").lower() == "websocket":
+            return self._websocket(u.path)
+        if self._gated():
+            return
+        if u.path == "/markets":
+            rows = self.exchange.markets()
+            return self._json({"data": rows, "next_cursor": "LTE=", "limit": len(rows), "count": len(rows)})
+        if u.path == "/book":
+            b = self.exchange.book((qs.get("token_id") or [""])[0])
+            return self._json(b) if b else self._json({"error": "No orderbook exists for the requested token id"}, 404)
+        if u.path == "/tick-size":
+            return self._json({"minimum_tick_size": 0.01})
+        if u.path == "/neg-risk":
+            return self._json({"neg_risk": False})
+        if u.path == "/fee-rate":
+            return self._json({"base_fee": 0})
+        if u.path == "/auth/derive-api-key":
+            return self._json({"apiKey": "fake-key", "secret": "ZmFrZS1zZWNyZXQ=", "passphrase": "fake"})
+        if u.path == "/time":
+            return self._json(int(time.time()))
+        return self._json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        u = urlparse(self.path)
+        body = self._body()
+        if self._gated():
+            return
+        if u.path == "/books" and isinstance(body, list):
+            books = [self.exchange.book(str(p.get("token_id", ""))) for p in body if isinstance(p, dict)]
+            return self._json([b for b in books if b])
+        if u.path == "/order" and isinstance(body, dict):
+            status, resp = self.exchange.match(body.get("order") or {}, str(body.get("orderType", "GTC")))
+            return self._json(resp, status)
+        if u.path == "/auth/api-key":
+            return self._json({"apiKey": "fake-key", "secret": "ZmFrZS1zZWNyZXQ=", "passphrase": "fake"})
+        return self._json({"error": "not found"}, 404)
+
+    def _websocket(self, path: str) -> None:
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+
+        sock = self.connection
+        q: Optional["queue.Queue[str]"] = None
+        opened = time.time()
+        try:
+            while True:
+                if self.ws_drop_s and time.time() - opened > self.ws_drop_s:
+                    ws_send(sock, b"", opcode=0x8)
+                    return
+                ready, _, _ = select.select([sock], [], [], 0.05)
+                if ready:
+                    opcode, data = ws_recv(sock)
+                    if opcode == 0x8:
+                        ws_send(sock, b"", opcode=0x8)
+                        return
+                    if opcode == 0x9:
+                        ws_send(sock, data, opcode=0xA)
+                    elif opcode == 0x1:
+                        text = data.decode("utf-8", errors="ignore")
+                        if text == "PING":
+                            ws_send(sock, b"PONG")
+                        else:
+                            try:
+                                msg = json.loads(text)
+                            except ValueError:
+                                continue
+                            if not isinstance(msg, dict) or q is not None:
+                                continue
+                            if path == "/ws/user" and msg.get("type") == "user":
+                                q = self.exchange.add_user_subscriber()
+                            elif msg.get("assets_ids"):
+                                q = self.exchange.add_subscriber(set(map(str, msg["assets_ids"])))
+                while q is not None and not q.empty():
+                    ws_send(sock, q.get_nowait().encode("utf-8"))
+        except (ConnectionError, OSError):
+            return
+        finally:
+            if q is not None:
+                self.exchange.remove_subscriber(q)
+            self.close_connection = True
+
+
+def serve(port: int, exchange: FakeExchange, step_ms: int, ws_drop_s: float = 0.0, gate: Optional[RestGate] = None) -> ThreadingHTTPServer:
+    handler = type("BoundHandler", (Handler,), {"exchange": exchange, "ws_drop_s": ws_drop_s, "gate": gate or RestGate()})
+    srv = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="fake-clob-http", daemon=True).start()
+
+    def stepper() -> None:
+        while True:
+            time.sleep(step_ms / 1000)
+            exchange.step()
+
+    threading.Thread(target=stepper, name="fake-clob-step", daemon=True).start()
+    return srv
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Local stand-in for the Polymarket CLOB")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--mid", type=float, default=0.5, help="starting UP mid price")
+    ap.add_argument("--vol", type=float, default=0.01, help="per-step mid price std-dev")
+    ap.add_argument("--step-ms", type=int, default=500)
+    ap.add_argument("--ws-drop-s", type=float, default=0.0, help="close each ws session after N seconds (0=never)")
+    ap.add_argument("--fill-delay-ms", type=int, default=0, help="answer orders 'delayed' and report the fill on /ws/user after N ms")
+    ap.add_argument("--max-fill", type=float, default=0.0, help="cap shares filled per order (0=no cap; forces FAK partials)")
+    ap.add_argument("--rate-limit", type=float, default=0.0, help="answer 429 (Retry-After: 1) above N REST requests/s (0=off)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of REST requests answered 503")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="delay every REST response by N ms")
+    ap.add_argument("--markets", type=int, default=1, help="number of listed markets (BTC hourly, then 15m / ETH / SOL)")
+    args = ap.parse_args()
+
+    ex = FakeExchange(seed=args.seed, mid=args.mid, vol=args.vol, fill_delay_ms=args.fill_delay_ms, max_fill=args.max_fill, markets=args.markets)
+    serve(args.port, ex, args.step_ms, args.ws_drop_s, RestGate(args.rate_limit, args.error_rate, seed=args.seed, latency_ms=args.latency_ms))
+    print(json.dumps({"ok": True, "http": f"http://127.0.0.1:{args.port}", "ws": f"ws://127.0.0.1:{args.port}/ws/market", "up": ex.up, "down": ex.down}))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Append-only position journal (write-ahead log) so a restarted bot resumes
+with its real capital and open positions instead of STARTING_CAPITAL_USDC.
+
+Every change to capital / positions (fills, dust, expiry) is appended as one
+JSON line before the bot applies it, and fsync'ed:
+
+    {"seq": 7, "ts": ..., "op": "open",  "market": {...}, "position": {...}, "capital": 450.0, "realizedPnl": 0.0}
+    {"seq": 8, "ts": ..., "op": "close", "market": {...}, "position": null, "capital": 505.0, "realizedPnl": 5.0}
+
+Each record carries the resulting state of its market's position and of the
+shared capital, so replay is a plain overwrite. Records and snapshots also
+carry the writer's `meta` (dry-run flag, funder address); load() refuses a
+journal written under different meta, so a live bot never resumes simulated
+capital and positions. Every `snapshot_every`
+records (and on shutdown) the full state is written to the snapshot file
+(tmp + rename) and the log is truncated. A crash between the two only means
+replaying records the snapshot already covers (seq <= snapshot seq is
+skipped); a torn last line from a crash mid-write is cut off on load.
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, IO, Optional
+
+
+@dataclass
+class JournalState:
+    capital: float
+    realized_pnl: float
+    # condition id -> {"market": IndexedMarket fields, "position": Position fields}
+    positions: Dict[str, Dict] = field(default_factory=dict)
+    seq: int = 0
+    replayed: int = 0  # 快照之后重放的记录数
+    truncated: int = 0  # 截掉的残缺尾部字节数
+
+
+def apply(state: JournalState, rec: Dict) -> None:
+    key = rec["market"]["condition_id"]
+    if rec.get("position"):
+        state.positions[key] = {"market": rec["market"], "position": rec["position"]}
+    else:
+        state.positions.pop(key, None)
+    state.capital = float(rec["capital"])
+    state.realized_pnl = float(rec["realizedPnl"])
+    state.seq = int(rec["seq"])
+    state.replayed += 1
+
+
+class Journal:
+    def __init__(self, path: Path, fsync: bool = True, snapshot_every: int = 200, meta: Optional[Dict] = None):
+        self.path = path
+        self.meta = dict(meta or {})
+        self.snapshot_path = path.with_name(path.stem + ".snapshot.json")
+        self.fsync = fsync
+        self.snapshot_every = max(1, snapshot_every)
+        self.seq = 0
+        self.pending = 0  # 上次快照之后追加的记录数
+        self._f: Optional[IO[bytes]] = None
+
+    def load(self) -> Optional[JournalState]:
+        """Snapshot + replayed log, or None when there is no journal yet."""
+        state = None
+        try:
+            snap = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+            self._check(snap, self.snapshot_path)
+            state = JournalState(float(snap["capital"]), float(snap["realizedPnl"]), dict(snap.get("positions") or {}), int(snap["seq"]))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise RuntimeError(f"unreadable journal snapshot {self.snapshot_path}: {e}") from e
+
+        good = 0
+        size = 0
+        try:
+            with self.path.open("rb") as f:
+                for line in f:
+                    size += len(line)
+                    try:
+                        rec = json.loads(line)
+                        if not line.endswith(b"\n"):
+                            raise ValueError("torn line")
+                    except ValueError as e:
+                        # 写到一半崩溃留下的残行只可能是最后一行且没有换行；
+                        # 中间坏一行不能截断，否则后面的有效记录全丢
+                        if line.endswith(b"\n") or f.read(1):
+                            raise RuntimeError(f"unreadable journal {self.path} at byte {good}: {e}") from e
+                        break
+                    good = size
+                    self._check(rec, self.path)
+                    if state is None:
+                        state = JournalState(float(rec["capital"]), float(rec["realizedPnl"]))
+                    if int(rec["seq"]) > state.seq:
+                        apply(state, rec)
+                size = f.seek(0, os.SEEK_END)
+        except FileNotFoundError:
+            pass
+
+        if size > good:
+            with self.path.open("r+b") as f:
+                f.truncate(good)
+            if state is not None:
+                state.truncated = size - good
+        if state is not None:
+            self.seq = state.seq
+            self.pending = state.replayed
+        return state
+
+    def _check(self, rec: Dict, path: Path) -> None:
+        got = {k: rec.get(k) for k in self.meta}
+        if got != self.meta:
+            # 模拟盘的资金 / 持仓不能带进实盘，换钱包也一样
+            raise RuntimeError(f"journal {path} was written with {got}, running with {self.meta}: move it away or set JOURNAL_FILE")
+
+    def append(self, op: str, **fields) -> None:
+        self.seq += 1
+        line = json.dumps({"seq": self.seq, "ts": time.time(), "op": op, **self.meta, **fields}, ensure_ascii=False) + "\n"
+        f = self._file()
+        f.write(line.encode("utf-8"))
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self.pending += 1
+
+    def due(self) -> bool:
+        return self.pending >= self.snapshot_every
+
+    def snapshot(self, capital: float, realized_pnl: float, positions: Dict[str, Dict]) -> None:
+        """Write the full state and truncate the log."""
+        payload = {"seq": self.seq, "ts": time.time(), **self.meta, "capital": capital, "realizedPnl": realized_pnl, "positions": positions}
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.snapshot_path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp.replace(self.snapshot_path)
+        # 快照已覆盖全部记录，日志从头再写
+        self.close()
+        self._f = self.path.open("wb")
+        self.pending = 0
+
+    def _file(self) -> IO[bytes]:
+        if self._f is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._f = self.path.open("ab")
+        return self._f
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
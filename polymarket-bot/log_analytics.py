@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Columnar analytics over auto_bot's JSON logs.
+
+    python3 log_analytics.py logs/                              # P&L, spreads, latency, errors
+    python3 log_analytics.py logs/ --report pnl,errors --bucket day
+    python3 log_analytics.py logs/ --touch 0.30 --window 20     # how often an ask hit 0.30 in the first 20 minutes
+    python3 log_analytics.py logs/ --since 2026-07-01 --until 2026-07-08
+
+Every auto_bot.log* file (rotations .1 .. .N included) is parsed once into
+NumPy columns (orjson when installed, else json) and cached under --cache
+(default <log dir>/.analytics), one .npz per file keyed by inode, size and
+mtime. Rotation renames keep inode and mtime, so rotated files are never
+re-read; the live file is parsed from where its cached prefix ended.
+Queries only load the cached columns and run vectorized.
+
+Counts are of logged events: with LOG_SAMPLE=TICK=N only every Nth TICK is
+in the log. Tick latency (`ms`: tick start to decision, `ageMs`: age of the
+quote) is only present in logs written since those TICK fields were added.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:  # pragma: no cover - optional dependency
+    loads = json.loads
+
+CACHE_VERSION = 1
+NAN = float("nan")
+QUANTILES = (0.5, 0.9, 0.99)
+REPORTS = ("pnl", "spreads", "latency", "errors", "touch")
+
+# 列名 -> dtype；每种事件一组，前缀区分
+COLUMNS = {
+    "ev_ts": "f8", "ev_code": "i4",
+    "tick_ts": "f8", "tick_market": "i4", "up_ask": "f8", "up_bid": "f8", "down_ask": "f8", "down_bid": "f8",
+    "tick_ws": "?", "tick_ms": "f8", "tick_age_ms": "f8",
+    "open_ts": "f8", "open_market": "i4", "open_usdc": "f8",
+    "close_ts": "f8", "close_market": "i4", "close_pnl": "f8", "close_down": "?",
+    "expire_ts": "f8", "expire_market": "i4", "expire_usdc": "f8",
+}
+MARKET_COLUMNS = ("tick_market", "open_market", "close_market", "expire_market")
+
+_HOURS: Dict[str, float] = {}
+
+
+def log_files(path: Path, name: str = "auto_bot.log") -> List[Path]:
+    """A log file, or a directory's `name` plus rotations, oldest first."""
+    if path.is_file():
+        return [path]
+    rot = re.compile(re.escape(name) + r"(?:\.(\d+))?$")
+    found = []
+    for p in path.iterdir():
+        m = rot.match(p.name)
+        if m:
+            found.append((-int(m.group(1) or 0), p))
+    return [p for _, p in sorted(found)]
+
+
+def iso_ts(s: str) -> float:
+    """Epoch seconds of the logger's UTC isoformat timestamps (hour prefix memoized)."""
+    if len(s) >= 25 and s.endswith("+00:00") and s[13] == ":":
+        hour = _HOURS.get(s[:13])
+        if hour is None:
+            hour = _HOURS[s[:13]] = datetime.fromisoformat(s[:13] + ":00:00+00:00").timestamp()
+        return hour + int(s[14:16]) * 60 + float(s[17:-6])
+    return datetime.fromisoformat(s.replace("Z", "+00:00")).timestamp()
+
+
+def _f(v) -> float:
+    return NAN if v is None else float(v)
+
+
+# --- parsing ---
+
+
+def parse(path: str, offset: int = 0) -> Dict:
+    """Columns for the complete lines of `path` from byte `offset` on."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    cols: Dict[str, list] = {k: [] for k in COLUMNS}
+    questions: Dict[str, int] = {}
+    events: Dict[str, int] = {}
+
+    def market(q) -> int:
+        q = str(q or "")
+        i = questions.get(q)
+        if i is None:
+            i = questions[q] = len(questions)
+        return i
+
+    for line in data[:end].split(b"\n"):
+        if not line:
+            continue
+        try:
+            ev = loads(line)
+            ts = iso_ts(ev["ts"])
+            name = ev["event"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        code = events.get(name)
+        if code is None:
+            code = events[name] = len(events)
+        cols["ev_ts"].append(ts)
+        cols["ev_code"].append(code)
+        if name == "TICK":
+            cols["tick_ts"].append(ts)
+            cols["tick_market"].append(market(ev.get("question")))
+            cols["up_ask"].append(_f(ev.get("upAsk")))
+            cols["up_bid"].append(_f(ev.get("upBid")))
+            cols["down_ask"].append(_f(ev.get("downAsk")))
+            cols["down_bid"].append(_f(ev.get("downBid")))
+            cols["tick_ws"].append(ev.get("src") == "ws")
+            cols["tick_ms"].append(_f(ev.get("ms")))
+            cols["tick_age_ms"].append(_f(ev.get("ageMs")))
+        elif name == "CLOSED":
+            cols["close_ts"].append(ts)
+            cols["close_market"].append(market(ev.get("question")))
+            cols["close_pnl"].append(_f(ev.get("pnl")))
+            cols["close_down"].append(ev.get("side") == "DOWN")
+        elif name == "OPENED":
+            cols["open_ts"].append(ts)
+            cols["open_market"].append(market(ev.get("question")))
+            cols["open_usdc"].append(_f(ev.get("sizeUsdc")))
+        elif name == "POSITION_EXPIRED":
+            cols["expire_ts"].append(ts)
+            cols["expire_market"].append(market(ev.get("question")))
+            cols["expire_usdc"].append(_f(ev.get("sizeUsdc")))
+
+    out = {k: np.array(v, dtype=COLUMNS[k]) for k, v in cols.items()}
+    out["questions"] = np.array(list(questions), dtype=str)
+    out["events"] = np.array(list(events), dtype=str)
+    out["offset"] = offset + end
+    out["tail"] = data[max(0, end - 64):end]
+    return out
+
+
+def merge(parts: Sequence[Dict]) -> Dict:
+    """Concatenate parsed parts, remapping their local question / event indexes."""
+    questions: Dict[str, int] = {}
+    events: Dict[str, int] = {}
+    out: Dict[str, list] = {k: [] for k in COLUMNS}
+    for p in parts:
+        qmap = np.array([questions.setdefault(q, len(questions)) for q in p["questions"].tolist()], dtype=np.int32)
+        emap = np.array([events.setdefault(e, len(events)) for e in p["events"].tolist()], dtype=np.int32)
+        for k in COLUMNS:
+            col = p[k]
+            if k in MARKET_COLUMNS and len(col):
+                col = qmap[col]
+            elif k == "ev_code" and len(col):
+                col = emap[col]
+            out[k].append(col)
+    merged = {k: (np.concatenate(v) if v else np.zeros(0, dtype=COLUMNS[k])) for k, v in out.items()}
+    merged["questions"] = np.array(list(questions), dtype=str)
+    merged["events"] = np.array(list(events), dtype=str)
+    return merged
+
+
+# --- cache ---
+
+
+def _load_entry(path: Path) -> Optional[Dict]:
+    try:
+        with np.load(path) as z:
+            entry = {k: z[k] for k in z.files}
+        entry["meta"] = json.loads(str(entry["meta"]))
+    except (OSError, ValueError, KeyError):
+        return None
+    return entry if entry["meta"].get("version") == CACHE_VERSION else None
+
+
+def _save_entry(path: Path, cols: Dict, meta: Dict) -> None:
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(meta)), **{k: cols[k] for k in (*COLUMNS, "questions", "events")})
+    os.replace(tmp, path)
+
+
+def _tail_matches(path: Path, meta: Dict) -> bool:
+    tail = bytes.fromhex(meta["tail"])
+    start = meta["offset"] - len(tail)
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(len(tail)) == tail
+
+
+def load(files: Sequence[Path], cache_dir: Optional[Path], jobs: int = 1) -> Tuple[Dict, Dict]:
+    """Merged columns of `files` (oldest first) and load stats."""
+    stats = {"files": len(files), "cached": 0, "appended": 0, "parsed": 0}
+    entries: List[Optional[Dict]] = [None] * len(files)
+    todo: List[Tuple[int, int]] = []  # (file index, parse offset)
+    stat = [p.stat() for p in files]
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    for i, (p, st) in enumerate(zip(files, stat)):
+        entry = _load_entry(cache_dir / f"{st.st_ino}.npz") if cache_dir is not None else None
+        meta = entry["meta"] if entry else None
+        if meta and meta["size"] == st.st_size and meta["mtime_ns"] == st.st_mtime_ns:
+            entries[i] = entry
+            stats["cached"] += 1
+        elif meta and meta["offset"] <= st.st_size and _tail_matches(p, meta):
+            # 同一个文件只是追加了内容：从上次解析到的位置接着读
+            entries[i] = entry
+            todo.append((i, meta["offset"]))
+            stats["appended"] += 1
+        else:
+            todo.append((i, 0))
+            stats["parsed"] += 1
+
+    if len(todo) > 1 and jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+            results = list(pool.map(parse, [str(files[i]) for i, _ in todo], [off for _, off in todo]))
+    else:
+        results = [parse(str(files[i]), off) for i, off in todo]
+
+    for (i, off), part in zip(todo, results):
+        cols = merge([entries[i], part]) if off else part
+        cols["offset"], cols["tail"] = part["offset"], part["tail"]
+        entries[i] = cols
+        if cache_dir is not None:
+            st = stat[i]
+            meta = {"version": CACHE_VERSION, "name": files[i].name, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "offset": part["offset"], "tail": part["tail"].hex()}
+            _save_entry(cache_dir / f"{st.st_ino}.npz", cols, meta)
+
+    if cache_dir is not None:
+        # 轮转出保留范围的文件：缓存一起删掉
+        live = {f"{st.st_ino}.npz" for st in stat}
+        for c in cache_dir.glob("*.npz"):
+            if c.name not in live and c.stem.isdigit():
+                c.unlink()
+    return merge(entries), stats
+
+
+# --- reports ---
+
+
+def _round(v: float, nd: int = 4) -> Optional[float]:
+    return None if v is None or not np.isfinite(v) else round(float(v), nd)
+
+
+def quantiles(values: "np.ndarray", qs: Sequence[float] = QUANTILES, nd: int = 4) -> Dict:
+    v = values[np.isfinite(values)]
+    out = {"count": int(v.size)}
+    if v.size:
+        out.update({f"p{round(q * 100)}": _round(x, nd) for q, x in zip(qs, np.quantile(v, qs))})
+        out["mean"] = _round(v.mean(), nd)
+        out["max"] = _round(v.max(), nd)
+    return out
+
+
+def group_quantiles(inv: "np.ndarray", n: int, values: "np.ndarray", qs: Sequence[float]) -> "np.ndarray":
+    """Per-group quantiles (lower nearest rank) of finite `values` grouped by `inv`; NaN for empty groups. Shape (len(qs), n)."""
+    ok = np.isfinite(values)
+    inv, values = inv[ok], values[ok]
+    order = np.lexsort((values, inv))
+    sv = values[order]
+    counts = np.bincount(inv, minlength=n)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    out = np.full((len(qs), n), np.nan)
+    has = counts > 0
+    for j, q in enumerate(qs):
+        out[j, has] = sv[starts[has] + np.floor(q * (counts[has] - 1)).astype(np.int64)]
+    return out
+
+
+class Buckets:
+    """Time buckets (hour / day) shared by the per-period tables."""
+
+    def __init__(self, size_s: int, *ts_cols: "np.ndarray"):
+        self.size_s = size_s
+        keys = [np.floor_divide(t, size_s).astype(np.int64) for t in ts_cols if len(t)]
+        self.keys = np.unique(np.concatenate(keys)) if keys else np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def index(self, ts: "np.ndarray") -> "np.ndarray":
+        return np.searchsorted(self.keys, np.floor_divide(ts, self.size_s).astype(np.int64))
+
+    def count(self, ts: "np.ndarray", weights: Optional["np.ndarray"] = None) -> "np.ndarray":
+        return np.bincount(self.index(ts), weights=weights, minlength=len(self))
+
+    def labels(self) -> List[str]:
+        fmt = "%Y-%m-%dT%H:00Z" if self.size_s < 86400 else "%Y-%m-%d"
+        return [datetime.fromtimestamp(int(k) * self.size_s, timezone.utc).strftime(fmt) for k in self.keys]
+
+
+def report_pnl(d: Dict, b: Buckets) -> Dict:
+    order = np.argsort(d["close_ts"], kind="stable")
+    ts, pnl = d["close_ts"][order], d["close_pnl"][order]
+    cum = np.cumsum(pnl)
+    peak = np.maximum.accumulate(np.concatenate(([0.0], cum)))[1:]
+    per = b.count(ts, pnl)
+    trades = b.count(ts)
+    wins = b.count(ts[pnl > 0])
+    labels = b.labels()
+    curve = [[labels[i], int(trades[i]), int(wins[i]), _round(per[i]), _round(c)] for i, c in enumerate(np.cumsum(per)) if trades[i]]
+    return {
+        "opened": int(len(d["open_ts"])),
+        "trades": int(len(pnl)),
+        "wins": int((pnl > 0).sum()),
+        "hitRate": _round((pnl > 0).mean()) if len(pnl) else None,
+        "total": _round(cum[-1] if len(cum) else 0.0),
+        "maxDrawdown": _round((peak - cum).max() if len(cum) else 0.0),
+        "expired": int(len(d["expire_ts"])),
+        "expiredUsdc": _round(d["expire_usdc"].sum()),
+        "curveFields": ["period", "trades", "wins", "pnl", "cumPnl"],
+        "curve": curve,
+    }
+
+
+def report_spreads(d: Dict, b: Buckets) -> Dict:
+    out = {}
+    for side in ("up", "down"):
+        spread = d[f"{side}_ask"] - d[f"{side}_bid"]
+        ok = np.isfinite(spread)
+        cents = np.clip(np.rint(spread[ok] * 100), 0, 10).astype(np.int64)
+        hist = np.bincount(cents, minlength=11)
+        out[side] = {
+            **quantiles(spread, (0.05, 0.5, 0.95)),
+            # 按 1 分一档；最后一档为 >= 10 分
+            "histCents": {(str(c) if c < 10 else "10+"): int(n) for c, n in enumerate(hist) if n},
+        }
+    both = np.concatenate([d["up_ask"] - d["up_bid"], d["down_ask"] - d["down_bid"]])
+    ts = np.concatenate([d["tick_ts"], d["tick_ts"]])
+    med = group_quantiles(b.index(ts), len(b), both, (0.5,))[0]
+    out["medianByPeriod"] = [[lbl, _round(m)] for lbl, m in zip(b.labels(), med) if np.isfinite(m)]
+    return out
+
+
+def report_latency(d: Dict, b: Buckets) -> Dict:
+    # 同一盘相邻两次 TICK 的间隔（多盘时先按盘稳定排序）
+    order = np.lexsort((d["tick_ts"], d["tick_market"]))
+    ts, mk = d["tick_ts"][order], d["tick_market"][order]
+    gap = np.diff(ts)[np.diff(mk) == 0]
+    inv = b.index(d["tick_ts"])
+    ms = group_quantiles(inv, len(b), d["tick_ms"], (0.5, 0.99))
+    ticks = np.bincount(inv, minlength=len(b))
+    return {
+        "tickMs": quantiles(d["tick_ms"], nd=2),
+        "quoteAgeMs": quantiles(d["tick_age_ms"], nd=1),
+        "tickGapS": quantiles(gap, nd=3),
+        "wsShare": _round(d["tick_ws"].mean()) if len(d["tick_ws"]) else None,
+        "byPeriodFields": ["period", "ticks", "p50Ms", "p99Ms"],
+        "byPeriod": [[lbl, int(ticks[i]), _round(ms[0, i], 2), _round(ms[1, i], 2)] for i, lbl in enumerate(b.labels()) if ticks[i]],
+    }
+
+
+def report_errors(d: Dict, b: Buckets) -> Dict:
+    names = d["events"].tolist()
+    err_codes = np.array([i for i, n in enumerate(names) if n.startswith("ERR_")], dtype=np.int32)
+    is_err = np.isin(d["ev_code"], err_codes)
+    inv = b.index(d["ev_ts"])
+    ticks = b.count(d["tick_ts"])
+    errors = np.bincount(inv[is_err], minlength=len(b))
+    # (时段, 错误类型) 计数表
+    table = np.zeros((len(b), len(names)), dtype=np.int64)
+    np.add.at(table, (inv[is_err], d["ev_code"][is_err]), 1)
+    rows = []
+    for i, lbl in enumerate(b.labels()):
+        if not errors[i]:
+            continue
+        by_type = {names[c]: int(table[i, c]) for c in np.flatnonzero(table[i])}
+        rows.append([lbl, int(ticks[i]), int(errors[i]), _round(errors[i] * 1000 / ticks[i], 2) if ticks[i] else None, by_type])
+    totals = table.sum(axis=0)
+    return {
+        "errors": int(is_err.sum()),
+        "perKTicks": _round(is_err.sum() * 1000 / len(d["tick_ts"]), 2) if len(d["tick_ts"]) else None,
+        "byType": {names[c]: int(totals[c]) for c in np.argsort(-totals) if totals[c]},
+        "periodsWithErrors": len(rows),
+        "byPeriodFields": ["period", "ticks", "errors", "perKTicks", "byType"],
+        "byPeriod": rows,
+    }
+
+
+def report_touch(d: Dict, threshold: float, window_min: int) -> Dict:
+    """Markets whose UP or DOWN ask reached `threshold` within the first `window_min` minutes of the hour."""
+    ts = d["tick_ts"]
+    in_window = ((ts // 60) % 60) < window_min
+    with np.errstate(invalid="ignore"):
+        up_hit = d["up_ask"] <= threshold
+        down_hit = d["down_ask"] <= threshold
+    hit = in_window & (up_hit | down_hit)
+    markets = np.unique(d["tick_market"][in_window])
+    # TICK 按时间写入：每个盘第一次出现即首次触及
+    touched, first = np.unique(d["tick_market"][hit], return_index=True)
+    first_ts = ts[hit][first]
+    first_min = (first_ts % 3600) / 60
+    first_down = ~up_hit[hit][first]
+    return {
+        "threshold": threshold,
+        "windowMin": window_min,
+        "markets": int(len(markets)),
+        "touched": int(len(touched)),
+        "rate": _round(len(touched) / len(markets)) if len(markets) else None,
+        "firstTouchMin": quantiles(first_min, (0.1, 0.5, 0.9), nd=2),
+        "firstSide": {"UP": int((~first_down).sum()), "DOWN": int(first_down.sum())},
+        "ticksInWindow": int(in_window.sum()),
+        "ticksTouching": int(hit.sum()),
+    }
+
+
+def select(d: Dict, since: Optional[float], until: Optional[float]) -> Dict:
+    if since is None and until is None:
+        return d
+    lo = -np.inf if since is None else since
+    hi = np.inf if until is None else until
+    out = dict(d)
+    for prefix in ("ev", "tick", "open", "close", "expire"):
+        keep = (d[f"{prefix}_ts"] >= lo) & (d[f"{prefix}_ts"] < hi)
+        for k in COLUMNS:
+            if k.startswith(prefix + "_") or (prefix == "tick" and k in ("up_ask", "up_bid", "down_ask", "down_bid")):
+                out[k] = d[k][keep]
+    return out
+
+
+def _day(s: Optional[str]) -> Optional[float]:
+    if not s:
+        return None
+    dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Vectorized summaries of auto_bot JSON logs")
+    ap.add_argument("logs", help="auto_bot.log file or log directory (rotations included)")
+    ap.add_argument("--log-name", default="auto_bot.log")
+    ap.add_argument("--cache", help="parsed-column cache directory (default <log dir>/.analytics)")
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="processes for parsing uncached files")
+    ap.add_argument("--report", default="pnl,spreads,latency,errors", help="comma list of " + ",".join(REPORTS))
+    ap.add_argument("--bucket", choices=["hour", "day"], default="hour")
+    ap.add_argument("--since", help="ISO date/time (UTC unless an offset is given)")
+    ap.add_argument("--until", help="ISO date/time, exclusive")
+    ap.add_argument("--touch", type=float, help="ask threshold for the touch report (adds it to --report)")
+    ap.add_argument("--window", type=int, default=int(os.getenv("ENTRY_WINDOW_MINUTES", "20")), help="minutes after the hour for the touch report")
+    ap.add_argument("--indent", type=int)
+    args = ap.parse_args(argv)
+
+    if np is None:
+        ap.error("log_analytics needs numpy (pip install numpy)")
+    reports = [r for r in args.report.split(",") if r]
+    if args.touch is not None and "touch" not in reports:
+        reports.append("touch")
+    bad = set(reports) - set(REPORTS)
+    if bad:
+        ap.error(f"unknown report(s): {','.join(sorted(bad))}")
+    if "touch" in reports and args.touch is None:
+        ap.error("--report touch needs --touch PRICE")
+
+    path = Path(args.logs)
+    files = log_files(path, args.log_name)
+    if not files:
+        raise SystemExit(f"no {args.log_name}* under {args.logs}")
+    cache = None if args.no_cache else Path(args.cache) if args.cache else (path.parent if path.is_file() else path) / ".analytics"
+
+    t0 = time.perf_counter()
+    data, stats = load(files, cache, jobs=max(1, args.jobs))
+    load_s = time.perf_counter() - t0
+    data = select(data, _day(args.since), _day(args.until))
+    buckets = Buckets(86400 if args.bucket == "day" else 3600, data["ev_ts"], data["tick_ts"], data["close_ts"])
+
+    t1 = time.perf_counter()
+    out = {"ok": True, **stats, "events": int(len(data["ev_ts"])), "ticks": int(len(data["tick_ts"])), "markets": int(len(np.unique(data["tick_market"])))}
+    if len(data["ev_ts"]):
+        out["range"] = [datetime.fromtimestamp(float(t), timezone.utc).isoformat() for t in (data["ev_ts"].min(), data["ev_ts"].max())]
+    if "pnl" in reports:
+        out["pnl"] = report_pnl(data, buckets)
+    if "spreads" in reports:
+        out["spreads"] = report_spreads(data, buckets)
+    if "latency" in reports:
+        out["latency"] = report_latency(data, buckets)
+    if "errors" in reports:
+        out["errors"] = report_errors(data, buckets)
+    if "touch" in reports:
+        out["touch"] = report_touch(data, args.touch, args.window)
+    out["loadS"] = round(load_s, 3)
+    out["queryS"] = round(time.perf_counter() - t1, 3)
+    print(json.dumps(out, ensure_ascii=False, indent=args.indent))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+CLOB websocket feeds.
+
+MarketFeed (market channel) keeps an in-memory book per subscribed token,
+signals the trading loop on every update and remembers which tokens changed,
+so the loop only re-evaluates the markets that moved. UserFeed (user channel) forwards
+our own trade events for fill reconciliation. Requires the optional
+`websocket-client` package; without it the bot stays on REST polling.
+"""
+
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import websocket  # websocket-client
+except ImportError:  # pragma: no cover - optional dependency
+    websocket = None
+
+from orderbook import OrderBook
+
+DEFAULT_WS_URL = "wss://ws-subscriptions-clob.polymarket.com/ws/market"
+
+
+def user_ws_url(market_url: str) -> str:
+    """The user-channel URL next to a market-channel URL."""
+    base = market_url.rstrip("/")
+    if base.endswith("/market"):
+        base = base[: -len("/market")]
+    return base + "/user"
+
+
+class _Stream:
+    """Reconnecting websocket session with subscribe-on-connect and keepalive PINGs."""
+
+    channel = ""
+
+    def __init__(
+        self,
+        url: str,
+        log: Callable[..., None] = lambda event, **kw: None,
+        stale_s: float = 15.0,
+        ping_s: float = 10.0,
+        updated: Optional[threading.Event] = None,
+    ):
+        self.url = url
+        self.log = log
+        self.stale_s = stale_s
+        self.ping_s = ping_s
+
+        self.updated = updated or threading.Event()
+        self.connected = False
+        self.last_msg_at = 0.0
+
+        self._lock = threading.Lock()
+        self._want: Tuple[str, ...] = ()
+        self._resubscribe = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def available() -> bool:
+        return websocket is not None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"{self.channel}-feed", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._resubscribe.set()
+
+    def subscribe(self, ids: List[str]) -> None:
+        want = tuple(sorted(t for t in ids if t))
+        with self._lock:
+            if want == self._want:
+                return
+            self._want = want
+            self._on_subscribe(want)
+        self._resubscribe.set()
+
+    def live(self) -> bool:
+        return self.connected and time.time() - self.last_msg_at < self.stale_s
+
+    def _on_subscribe(self, want: Tuple[str, ...]) -> None:
+        """Called under self._lock when the subscription set changes."""
+
+    def _subscription(self, want: Tuple[str, ...]) -> dict:
+        raise NotImplementedError
+
+    def _handle(self, msg: str) -> None:
+        raise NotImplementedError
+
+    # --- stream thread ---
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            with self._lock:
+                want = self._want
+            if not want:
+                self._resubscribe.wait(1.0)
+                self._resubscribe.clear()
+                continue
+
+            self._resubscribe.clear()
+            started = time.time()
+            try:
+                self._session(want)
+                backoff = 1.0
+            except Exception as e:
+                if time.time() - started > 30:
+                    backoff = 1.0
+                self.log("WS_ERROR", channel=self.channel, err=str(e), retryIn=backoff)
+            finally:
+                if self.connected:
+                    self.log("WS_DOWN", channel=self.channel)
+                self.connected = False
+                self.updated.set()
+            if not self._resubscribe.is_set():
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def _session(self, want: Tuple[str, ...]) -> None:
+        ws = websocket.create_connection(self.url, timeout=10)
+        try:
+            ws.send(json.dumps(self._subscription(want)))
+            self.connected = True
+            self.last_msg_at = time.time()
+            self.log("WS_UP", channel=self.channel, url=self.url, subscribed=len(want))
+            ws.settimeout(1.0)
+            last_ping = time.time()
+            while not self._stop.is_set() and not self._resubscribe.is_set():
+                if time.time() - last_ping >= self.ping_s:
+                    ws.send("PING")
+                    last_ping = time.time()
+                try:
+                    msg = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    continue
+                if not msg:
+                    raise ConnectionError("stream closed")
+                self.last_msg_at = time.time()
+                if msg == "PONG":
+                    continue
+                self._handle(msg)
+        finally:
+            ws.close()
+
+
+
+class MarketFeed(_Stream):
+    channel = "market"
+
+    def __init__(self, url: str = DEFAULT_WS_URL, **kw):
+        super().__init__(url, **kw)
+        self._books: Dict[str, OrderBook] = {}
+        self._dirty: Set[str] = set()
+        self.bad_changes = 0  # 跳过的畸形 price_change 条目
+
+    def _on_subscribe(self, want: Tuple[str, ...]) -> None:
+        self._books = {t: self._books.get(t) or OrderBook(t) for t in want}
+
+    def _subscription(self, want: Tuple[str, ...]) -> dict:
+        return {"assets_ids": list(want), "type": "market"}
+
+    def book(self, token_id: str) -> Optional[OrderBook]:
+        """The streamed book, or None when the stream can't be trusted."""
+        if not self.live():
+            return None
+        with self._lock:
+            book = self._books.get(token_id)
+        if book is None or not book.updated_at or book.empty():
+            return None
+        return book
+
+    def tops(self, token_ids: List[str]) -> Optional[Dict[str, Tuple[Optional[float], Optional[float]]]]:
+        """(ask, bid) for all tokens read under the feed lock, so every side
+        reflects the same set of applied messages. None unless all are usable."""
+        if not self.live():
+            return None
+        out = {}
+        with self._lock:
+            for t in token_ids:
+                book = self._books.get(t)
+                if book is None or not book.updated_at or book.empty():
+                    return None
+                out[t] = book.top()
+        return out
+
+    def drain(self) -> Set[str]:
+        """Tokens whose book changed since the last drain()."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def _handle(self, msg: str) -> None:
+        try:
+            data = json.loads(msg)
+        except ValueError:
+            return
+        events = data if isinstance(data, list) else [data]
+        now = time.time()
+        touched = False
+        with self._lock:
+            for ev in events:
+                if not isinstance(ev, dict):
+                    continue
+                kind = ev.get("event_type")
+                if kind == "book":
+                    book = self._books.get(str(ev.get("asset_id")))
+                    if book is not None:
+                        book.apply_snapshot(ev.get("bids") or ev.get("buys") or [], ev.get("asks") or ev.get("sells") or [], ts=now)
+                        self._dirty.add(book.token_id)
+                        touched = True
+                elif kind == "price_change":
+                    # 新格式: price_changes[] 每条自带 asset_id；旧格式: 顶层 asset_id + changes[]
+                    rows = ev.get("price_changes")
+                    if rows is None:
+                        rows = [{**c, "asset_id": ev.get("asset_id")} if isinstance(c, dict) else c for c in ev.get("changes") or []]
+                    for c in rows if isinstance(rows, list) else [rows]:
+                        # 单条坏数据只跳过这一条，不能把整个会话拆掉重连
+                        try:
+                            book = self._books.get(str(c.get("asset_id")))
+                            if book is None or not book.updated_at:
+                                continue
+                            price, size = float(c["price"]), float(c["size"])
+                        except (AttributeError, KeyError, TypeError, ValueError) as e:
+                            self.bad_changes += 1
+                            if self.bad_changes & (self.bad_changes - 1) == 0:
+                                # 第 1、2、4、8... 条记日志，避免刷屏
+                                self.log("WS_BAD_CHANGE", channel=self.channel, err=repr(e), change=str(c)[:200], count=self.bad_changes)
+                            continue
+                        book.apply_delta(str(c.get("side", "")), price, size, ts=now)
+                        self._dirty.add(book.token_id)
+                        touched = True
+        if touched:
+            self.updated.set()
+
+
+class UserFeed(_Stream):
+    """User channel: our own order/trade events for the subscribed markets (condition ids)."""
+
+    channel = "user"
+
+    def __init__(self, url: str, creds, on_trade: Callable[[dict], None], **kw):
+        # 用户频道长时间没有成交是常态，不按消息间隔判定失效
+        kw.setdefault("stale_s", float("inf"))
+        super().__init__(url, **kw)
+        self.creds = creds
+        self.on_trade = on_trade
+
+    def _subscription(self, want: Tuple[str, ...]) -> dict:
+        return {
+            "auth": {"apiKey": self.creds.api_key, "secret": self.creds.api_secret, "passphrase": self.creds.api_passphrase},
+            "markets": list(want),
+            "type": "user",
+        }
+
+    def _handle(self, msg: str) -> None:
+        try:
+            data = json.loads(msg)
+        except ValueError:
+            return
+        for ev in data if isinstance(data, list) else [data]:
+            if isinstance(ev, dict) and ev.get("event_type") == "trade":
+                self.on_trade(ev)
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Persistent local index of tradable Up/Down markets.
+
+Markets are stored by condition id (plus a token -> condition map) with a
+min-heap on end time, so "earliest-ending active market" is a heap peek.
+refresh() pages the CLOB /markets listing from a saved cursor, so steady-state
+refreshes only re-read the tail page(s) instead of rescanning from "MA==".
+
+Markets are grouped into series (same question with the date / time taken
+out, e.g. "Bitcoin Up or Down - #" vs "Bitcoin Up or Down - # #" for the
+hourly and 15-minute BTC markets); within a series markets run back to back,
+so the earliest-ending one is the market trading now.
+"""
+
+import heapq
+import json
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Pattern, Tuple
+
+HOUR_S = 3600
+
+START_CURSOR = "MA=="
+END_CURSOR = "LTE="
+
+
+@dataclass
+class IndexedMarket:
+    condition_id: str
+    question: str
+    up_token: str
+    down_token: str
+    end_ts: float
+
+
+_TIME_RE = re.compile(r"(?i)\b\d{1,2}(:\d{2})?\s*(am|pm)\b|\b\d{1,2}:\d{2}\b")
+_DATE_RE = re.compile(
+    r"(?i)\b(jan(uary)?|feb(ruary)?|mar(ch)?|apr(il)?|may|june?|july?|aug(ust)?|sept?(ember)?|oct(ober)?|nov(ember)?|dec(ember)?)\b|\d+"
+)
+
+
+@lru_cache(maxsize=4096)
+def series_key(question: str) -> str:
+    """Question with the date taken out and each time replaced by '#'."""
+    s = _DATE_RE.sub(" ", _TIME_RE.sub(" # ", question))
+    return " ".join(re.findall(r"[a-z]+|#", s.lower()))
+
+
+def parse_ts(iso_str: Optional[str]) -> Optional[float]:
+    if not iso_str:
+        return None
+    try:
+        if iso_str.endswith("Z"):
+            iso_str = iso_str.replace("Z", "+00:00")
+        return datetime.fromisoformat(iso_str).timestamp()
+    except Exception:
+        return None
+
+
+class MarketIndex:
+    def __init__(
+        self,
+        path: Optional[Path],
+        market_re: Pattern,
+        hourly_re: Pattern,
+        up_re: Pattern,
+        down_re: Pattern,
+        full_rescan_s: float = 3600,
+    ):
+        self.path = path
+        self.market_re = market_re
+        self.hourly_re = hourly_re
+        self.up_re = up_re
+        self.down_re = down_re
+        self.full_rescan_s = full_rescan_s
+        # 过滤规则变了，旧索引作废
+        self.signature = "|".join(r.pattern for r in (market_re, hourly_re, up_re, down_re))
+
+        self.markets: Dict[str, IndexedMarket] = {}
+        self.by_token: Dict[str, str] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self.cursor = START_CURSOR
+        self.last_full_scan = 0.0
+        self.load()
+
+    # --- persistence ---
+
+    def load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("signature") != self.signature:
+            return
+        now = time.time()
+        for row in data.get("markets", []):
+            try:
+                m = IndexedMarket(**row)
+            except TypeError:
+                continue
+            if m.end_ts >= now:
+                self._put(m)
+        self.cursor = data.get("cursor") or START_CURSOR
+        self.last_full_scan = float(data.get("lastFullScan", 0))
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        payload = {
+            "signature": self.signature,
+            "cursor": self.cursor,
+            "lastFullScan": self.last_full_scan,
+            "markets": [asdict(m) for m in self.markets.values()],
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+    # --- index maintenance ---
+
+    def _put(self, m: IndexedMarket) -> None:
+        old = self.markets.get(m.condition_id)
+        self.markets[m.condition_id] = m
+        self.by_token[m.up_token] = m.condition_id
+        self.by_token[m.down_token] = m.condition_id
+        if old is None or old.end_ts != m.end_ts:
+            heapq.heappush(self._heap, (m.end_ts, m.condition_id))
+            self._compact()
+
+    def _drop(self, condition_id: str) -> None:
+        m = self.markets.pop(condition_id, None)
+        if m is not None:
+            self.by_token.pop(m.up_token, None)
+            self.by_token.pop(m.down_token, None)
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rebuild the heap once stale entries (dropped / re-timed markets) outnumber live ones."""
+        if len(self._heap) > 2 * len(self.markets) + 64:
+            self._heap = [(m.end_ts, cid) for cid, m in self.markets.items()]
+            heapq.heapify(self._heap)
+
+    def ingest(self, m: dict) -> bool:
+        """Add/refresh/drop one raw /markets row. Returns True if the index changed."""
+        cid = m.get("condition_id") or ""
+        if not cid:
+            return False
+        tradable = m.get("active") and m.get("accepting_orders") and not m.get("closed") and m.get("enable_order_book")
+        if not tradable:
+            if cid in self.markets:
+                self._drop(cid)
+                return True
+            return False
+
+        q = m.get("question", "")
+        if not self.market_re.search(q) or not self.hourly_re.search(q):
+            return False
+
+        up_tid = down_tid = None
+        for t in m.get("tokens", []):
+            out = str(t.get("outcome", "")).strip()
+            if self.up_re.search(out):
+                up_tid = t.get("token_id")
+            elif self.down_re.search(out):
+                down_tid = t.get("token_id")
+        end_ts = parse_ts(m.get("end_date_iso"))
+        if not up_tid or not down_tid or end_ts is None:
+            return False
+
+        new = IndexedMarket(condition_id=cid, question=q, up_token=up_tid, down_token=down_tid, end_ts=end_ts)
+        if self.markets.get(cid) == new:
+            return False
+        self._put(new)
+        return True
+
+    def refresh(self, fetch_page: Callable[[str], dict], max_pages: int, now: Optional[float] = None) -> int:
+        """Page /markets from the saved cursor (or from the start when a full rescan is due).
+
+        Returns the number of pages fetched. Raises whatever fetch_page raises
+        on the first page; later page errors just end this refresh.
+        """
+        now = time.time() if now is None else now
+        changed = False
+        if now - self.last_full_scan >= self.full_rescan_s:
+            self.cursor = START_CURSOR
+            self.last_full_scan = now
+            changed = True
+
+        pages = 0
+        cursor = self.cursor
+        while pages < max_pages:
+            try:
+                page = fetch_page(cursor)
+            except Exception:
+                if pages == 0:
+                    raise
+                break
+            pages += 1
+            for m in page.get("data", []):
+                changed = self.ingest(m) or changed
+            nxt = page.get("next_cursor")
+            if not nxt or nxt == END_CURSOR:
+                # 停在最后一页：下次从这里重读，新上的盘会追加在尾部
+                break
+            cursor = nxt
+        changed = changed or cursor != self.cursor
+        self.cursor = cursor
+
+        self.expire(now)
+        if changed:
+            self.save()
+        return pages
+
+    def expire(self, now: float) -> None:
+        while self._heap and self._heap[0][0] < now:
+            end_ts, cid = heapq.heappop(self._heap)
+            m = self.markets.get(cid)
+            if m is not None and m.end_ts == end_ts:
+                self._drop(cid)
+
+    # --- queries ---
+
+    def earliest_ending(self, now: Optional[float] = None, horizon_s: float = 7200) -> Optional[IndexedMarket]:
+        """Earliest-ending indexed market with end time in [now, now + horizon_s]."""
+        now = time.time() if now is None else now
+        self.expire(now)
+        while self._heap:
+            end_ts, cid = self._heap[0]
+            m = self.markets.get(cid)
+            if m is None or m.end_ts != end_ts:
+                heapq.heappop(self._heap)  # 过期的堆项（已删除或 end_ts 已更新）
+                continue
+            return m if end_ts <= now + horizon_s else None
+        return None
+
+    def _ordered(self, until: float) -> Iterator[IndexedMarket]:
+        """Live markets ending by `until`, in end-time order. Walks the heap
+        without popping it, so the first k cost O(k log k) whatever its size."""
+        heap = self._heap
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            (end_ts, cid), i = heapq.heappop(frontier)
+            if end_ts > until:
+                return
+            m = self.markets.get(cid)
+            if m is not None and m.end_ts == end_ts:
+                yield m
+            for j in (2 * i + 1, 2 * i + 2):
+                if j < len(heap):
+                    heapq.heappush(frontier, (heap[j], j))
+
+    def ending_within(self, now: float, horizon_s: float, k: int = 2) -> List[IndexedMarket]:
+        """Up to k earliest-ending markets with end time in [now, now + horizon_s]."""
+        self.expire(now)
+        return list(islice(self._ordered(now + horizon_s), k))
+
+    def by_series(self, now: float, horizon_s: float, series: int = 1, per_series: int = 2) -> List[IndexedMarket]:
+        """Earliest-ending markets of the first `series` series (by end time),
+        up to `per_series` of each (current, next...), ordered by end time."""
+        self.expire(now)
+        taken: Dict[str, int] = {}
+        out = []
+        for m in self._ordered(now + horizon_s):
+            if len(out) >= series * per_series:
+                break
+            key = series_key(m.question)
+            if key not in taken:
+                if len(taken) >= series:
+                    continue
+                taken[key] = 0
+            if taken[key] < per_series:
+                taken[key] += 1
+                out.append(m)
+        return out
+
+    def market_for_token(self, token_id: str) -> Optional[IndexedMarket]:
+        cid = self.by_token.get(token_id)
+        return self.markets.get(cid) if cid else None
+
+
+class DiscoveryWorker:
+    """Refreshes a MarketIndex off the trading thread and publishes the selection.
+
+    The published selection is an immutable tuple (current, next) of each of
+    the first `series` series, swapped in with a single assignment, so readers
+    never lock and never wait on get_markets. Near the top of the hour the worker polls faster so the next
+    hour's market is resolved before the current one ends.
+    """
+
+    def __init__(
+        self,
+        index: MarketIndex,
+        fetch_page: Callable[[str], dict],
+        max_pages: int,
+        log: Callable[..., None] = lambda event, **kw: None,
+        refresh_s: float = 60,
+        fast_refresh_s: float = 10,
+        lookahead_s: float = 300,
+        horizon_s: float = 7200,
+        series: int = 1,
+    ):
+        self.index = index
+        self.fetch_page = fetch_page
+        self.max_pages = max_pages
+        self.log = log
+        self.refresh_s = refresh_s
+        self.fast_refresh_s = fast_refresh_s
+        self.lookahead_s = lookahead_s
+        self.horizon_s = horizon_s
+        self.series = max(1, series)
+
+        self.selection: Tuple[IndexedMarket, ...] = ()
+        self.ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self.publish(time.time())
+            self._thread = threading.Thread(target=self._run, name="market-discovery", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def current(self, now: Optional[float] = None) -> Optional[IndexedMarket]:
+        now = time.time() if now is None else now
+        for m in self.selection:
+            if m.end_ts >= now:
+                return m
+        return None
+
+    def active(self, now: Optional[float] = None, n: int = 1) -> List[IndexedMarket]:
+        """The market trading now in each of up to n series, earliest-ending first."""
+        now = time.time() if now is None else now
+        seen = set()
+        out = []
+        for m in self.selection:
+            key = series_key(m.question)
+            if m.end_ts < now or key in seen:
+                continue
+            seen.add(key)
+            out.append(m)
+            if len(out) >= n:
+                break
+        return out
+
+    def period_s(self, m: IndexedMarket) -> Optional[float]:
+        """Spacing between m and the next preselected market of its series (None if not resolved yet)."""
+        key = series_key(m.question)
+        later = [x.end_ts for x in self.selection if x.end_ts > m.end_ts and series_key(x.question) == key]
+        return min(later) - m.end_ts if later else None
+
+    def watch_tokens(self) -> List[str]:
+        """Tokens of the current and pre-resolved next markets (for warm stream subscriptions)."""
+        return [t for m in self.selection for t in (m.up_token, m.down_token)]
+
+    def publish(self, now: float) -> None:
+        sel = tuple(self.index.by_series(now, self.horizon_s, series=self.series))
+        if sel != self.selection:
+            self.selection = sel
+            if sel:
+                cur = self.active(now, self.series)
+                self.log(
+                    "MARKET_PRESELECTED",
+                    current=(cur[0].question if cur else sel[0].question),
+                    next=next((m.question for m in sel if m not in cur), None),
+                    **({"markets": [m.question for m in cur]} if self.series > 1 else {}),
+                )
+        self.ready.set()
+
+    def next_wait(self, now: float) -> float:
+        wait = self.refresh_s
+        cur = self.current(now)
+        # 整点前后 / 还没解析到下一个盘：加快刷新
+        unresolved = len(self.selection) < 2 or any(self.period_s(m) is None for m in self.active(now, self.series))
+        if (HOUR_S - now % HOUR_S) <= self.lookahead_s or now % HOUR_S <= self.lookahead_s or unresolved:
+            wait = min(wait, self.fast_refresh_s)
+        if cur is not None:
+            wait = min(wait, max(0.5, cur.end_ts - now))
+        return wait
+
+    def _run(self) -> None:
+        last_refresh = 0.0
+        while not self._stop.is_set():
+            now = time.time()
+            if now - last_refresh >= self.next_wait(now):
+                try:
+                    pages = self.index.refresh(self.fetch_page, self.max_pages, now)
+                    self.log("MARKET_INDEX_REFRESH", pages=pages, indexed=len(self.index.markets), cursor=self.index.cursor)
+                except Exception as e:
+                    self.log("ERR_GET_MARKETS", err=str(e), cursor=self.index.cursor)
+                last_refresh = time.time()
+            self.publish(time.time())
+            self._stop.wait(min(1.0, self.next_wait(time.time())))
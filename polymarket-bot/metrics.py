@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+In-process metrics: latency histograms, counters, gauges, text exposition.
+
+Everything registered in a MetricsRegistry is rendered in the Prometheus
+text format (histograms in seconds, cumulative `le` buckets) by render(),
+which the bot serves as GET /metrics on its status endpoint.
+
+SamplingProfiler periodically samples one thread's Python stack and keeps
+collapsed-stack counts ("a;b;c N" lines, flamegraph.pl / speedscope input).
+"""
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Counts
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _round(ms: Optional[float]) -> Optional[float]:
+    return round(ms, 3) if ms is not None else None
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+
+    def __init__(self, buckets_ms=BUCKETS_MS):
+        self.buckets = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.buckets, ms)] += 1
+            self.total += 1
+            self.sum_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bucket bound containing the q-quantile (None when empty)."""
+        with self._lock:
+            if not self.total:
+                return None
+            rank = q * self.total
+            seen = 0
+            for i, c in enumerate(self.counts):
+                seen += c
+                if seen >= rank:
+                    return min(float(self.buckets[i]), self.max_ms) if i < len(self.buckets) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.total,
+            "avgMs": round(self.sum_ms / self.total, 3) if self.total else None,
+            "p50Ms": _round(self.percentile(0.5)),
+            "p99Ms": _round(self.percentile(0.99)),
+            "maxMs": round(self.max_ms, 3),
+        }
+
+    def time(self) -> "_Timer":
+        """`with hist.time(): ...` observes the block's wall time."""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist: LatencyHistogram):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe((time.perf_counter() - self.t0) * 1000)
+        return False
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1.0) -> None:
+        with self._lock:
+            self.value += n
+
+
+def _labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(v: float) -> str:
+    if v != v:
+        return "NaN"
+    if v in (float("inf"), float("-inf")):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class MetricsRegistry:
+    """Named metric families; each family holds one series per label set."""
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # name -> (type, help, {labels: metric})
+        self._families: Dict[str, Tuple[str, str, Dict[LabelKey, object]]] = {}
+
+    def _get(self, kind: str, name: str, help: str, labels: Dict[str, str], make: Callable[[], object]):
+        name = self.prefix + name
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            fam = self._families.get(name)
+            if fam is None:
+                fam = self._families[name] = (kind, help, {})
+            elif fam[0] != kind:
+                raise ValueError(f"metric {name} already registered as {fam[0]}")
+            series = fam[2]
+            if key not in series:
+                series[key] = make()
+            return series[key]
+
+    def histogram(self, name: str, help: str, hist: Optional[LatencyHistogram] = None, **labels) -> LatencyHistogram:
+        """Register (or fetch) a latency histogram; pass `hist` to export an existing one."""
+        return self._get("histogram", name, help, labels, lambda: hist or LatencyHistogram())
+
+    def counter(self, name: str, help: str, **labels) -> Counter:
+        return self._get("counter", name, help, labels, Counter)
+
+    def gauge(self, name: str, help: str, fn: Callable[[], Optional[float]], **labels) -> None:
+        """Gauge evaluated at scrape time."""
+        self._get("gauge", name, help, labels, lambda: fn)
+
+    def render(self) -> str:
+        with self._lock:
+            families = [(n, f[0], f[1], list(f[2].items())) for n, f in sorted(self._families.items())]
+        out: List[str] = []
+        for name, kind, help, series in families:
+            out.append(f"# HELP {name} {help}")
+            out.append(f"# TYPE {name} {kind}")
+            for key, m in series:
+                if kind == "counter":
+                    out.append(f"{name}{_labels(key)} {_num(m.value)}")
+                elif kind == "gauge":
+                    try:
+                        v = m()
+                    except Exception:
+                        v = None
+                    if v is not None:
+                        out.append(f"{name}{_labels(key)} {_num(v)}")
+                else:
+                    with m._lock:
+                        counts, total, sum_ms = list(m.counts), m.total, m.sum_ms
+                    seen = 0
+                    for bound, c in zip(m.buckets, counts):
+                        seen += c
+                        le = 'le="%s"' % _num(bound / 1000)
+                        out.append(f"{name}_bucket{_labels(key, le)} {seen}")
+                    le = 'le="+Inf"'
+                    out.append(f"{name}_bucket{_labels(key, le)} {total}")
+                    out.append(f"{name}_sum{_labels(key)} {_num(sum_ms / 1000)}")
+                    out.append(f"{name}_count{_labels(key)} {total}")
+        return "\n".join(out) + "\n"
+
+
+class SamplingProfiler:
+    """Samples one thread's stack every `interval_s` into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval_s: float = 0.01, path: Optional[Path] = None, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.path = path
+        self.max_depth = max_depth
+        self.samples = 0
+        self._counts: "_Counts[str]" = _Counts()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            with self._lock:
+                self._counts[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        with self._lock:
+            rows = self._counts.most_common()
+        return "".join(f"{stack} {n}\n" for stack, n in rows)
+
+    def stop(self) -> None:
+        """Stop sampling and write the collapsed stacks to `path` (if set)."""
+        self._stop.set()
+        self._thread.join(timeout=1)
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(self.folded(), encoding="utf-8")
+            tmp.replace(self.path)
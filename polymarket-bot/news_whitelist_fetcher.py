@@ -12,20 +12,33 @@ Output schema per item:
 from __future__ import annotations
 
 import argparse
+import gzip
+import io
 import json
+import random
 import re
+import sqlite3
+import threading
 import time
-from dataclasses import dataclass
-from datetime import datetime, timezone
+import zlib
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
 from email.utils import parsedate_to_datetime
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import IO, AbstractSet, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
 from urllib.error import URLError, HTTPError
 from urllib.parse import urlparse
 from urllib.request import Request, urlopen
 import xml.etree.ElementTree as ET
 
 UA = "Mozilla/5.0 (compatible; no-key-whitelist-bot/1.0)"
+SCHEMA = ["title", "url", "source", "publishedAt", "confidence"]
+MAX_ITEMS_PER_SOURCE = 100
+PARSE_CHUNK = 64 * 1024
 
 
 @dataclass
@@ -38,25 +51,156 @@ class RawItem:
     weight: float
 
 
+@dataclass
+class FetchResult:
+    status: int
+    body: bytes
+    etag: str = ""
+    last_modified: str = ""
+
+
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def http_get(url: str, timeout: int, retries: int, retry_sleep: float) -> bytes:
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def http_fetch(
+    url: str,
+    timeout: int,
+    retries: int,
+    retry_sleep: float,
+    deadline: Optional[float] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> FetchResult:
     last_err: Optional[Exception] = None
     for i in range(retries + 1):
+        left = remaining(deadline)
+        if left is not None and left <= 0:
+            last_err = last_err or TimeoutError("deadline exceeded")
+            break
         try:
-            req = Request(url, headers={"User-Agent": UA, "Accept": "*/*"})
-            with urlopen(req, timeout=timeout) as resp:
-                return resp.read()
-        except (HTTPError, URLError, TimeoutError, OSError) as e:
+            req = Request(url, headers={"User-Agent": UA, "Accept": "*/*", **(headers or {})})
+            # 单次请求超时不超过全局截止时间，避免慢源拖住整轮
+            with urlopen(req, timeout=timeout if left is None else max(0.1, min(timeout, left))) as resp:
+                return FetchResult(
+                    status=resp.status,
+                    body=resp.read(),
+                    etag=resp.headers.get("ETag", "") or "",
+                    last_modified=resp.headers.get("Last-Modified", "") or "",
+                )
+        except HTTPError as e:
+            if e.code == 304:
+                return FetchResult(
+                    status=304,
+                    body=b"",
+                    etag=e.headers.get("ETag", "") or "",
+                    last_modified=e.headers.get("Last-Modified", "") or "",
+                )
             last_err = e
-            if i < retries:
-                time.sleep(retry_sleep * (i + 1))
-            continue
+        except (URLError, TimeoutError, OSError) as e:
+            last_err = e
+        if i < retries:
+            pause = retry_sleep * (i + 1)
+            left = remaining(deadline)
+            if left is not None and pause >= left:
+                break
+            time.sleep(pause)
     raise RuntimeError(f"fetch failed: {url}; err={last_err}")
 
 
+def http_get(url: str, timeout: int, retries: int, retry_sleep: float, deadline: Optional[float] = None) -> bytes:
+    return http_fetch(url, timeout, retries, retry_sleep, deadline=deadline).body
+
+
+class FeedCache:
+    """On-disk conditional-GET cache: url -> validators + last parsed items.
+
+    Entries are evicted least-recently-used once ``max_entries`` is exceeded,
+    and dropped when unused for longer than ``max_age_s``.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 256, max_age_s: float = 7 * 86400):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.max_age_s = max_age_s
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and isinstance(data.get("entries"), dict):
+            self.entries = data["entries"]
+
+    def validators(self, url: str) -> Dict[str, str]:
+        with self._lock:
+            e = self.entries.get(url)
+        if not e:
+            return {}
+        headers = {}
+        if e.get("etag"):
+            headers["If-None-Match"] = e["etag"]
+        if e.get("lastModified"):
+            headers["If-Modified-Since"] = e["lastModified"]
+        return headers
+
+    def reuse(self, url: str, job: Dict) -> Optional[List[RawItem]]:
+        with self._lock:
+            e = self.entries.get(url)
+            if e is None:
+                return None
+            e["usedAt"] = time.time()
+            self.hits += 1
+        return self.peek(url, job)
+
+    def peek(self, url: str, job: Dict) -> Optional[List[RawItem]]:
+        """Last parsed items of url without counting a hit (None if not cached)."""
+        with self._lock:
+            e = self.entries.get(url)
+        if e is None:
+            return None
+        # 来源名 / 分类 / 权重以当前配置为准
+        return [
+            RawItem(**{**r, "source": job["name"], "category": job["category"], "weight": job["weight"]})
+            for r in e.get("items", [])
+        ]
+
+    def store(self, url: str, res: FetchResult, items: List[RawItem]) -> None:
+        if not res.etag and not res.last_modified:
+            return
+        with self._lock:
+            self.entries[url] = {
+                "etag": res.etag,
+                "lastModified": res.last_modified,
+                "usedAt": time.time(),
+                "items": [asdict(x) for x in items],
+            }
+
+    def evict(self) -> None:
+        cutoff = time.time() - self.max_age_s
+        with self._lock:
+            live = [(k, v) for k, v in self.entries.items() if v.get("usedAt", 0) >= cutoff]
+            live.sort(key=lambda kv: kv[1].get("usedAt", 0), reverse=True)
+            self.entries = dict(live[: self.max_entries])
+
+    def save(self) -> None:
+        self.evict()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with self._lock:
+            tmp.write_text(json.dumps({"version": 1, "entries": self.entries}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+
 def parse_dt(value: Optional[str]) -> str:
     if not value:
         return now_iso()
@@ -80,51 +224,73 @@ def text_of(el: Optional[ET.Element]) -> str:
     return (el.text or "").strip() if el is not None else ""
 
 
-def parse_rss(xml_bytes: bytes, source_name: str, category: str, weight: float) -> List[RawItem]:
-    items: List[RawItem] = []
-    root = ET.fromstring(xml_bytes)
-    for node in root.iter():
-        tag = strip_ns(node.tag)
-        if tag not in ("item", "entry"):
-            continue
+def item_from_node(node: ET.Element, source_name: str, category: str, weight: float) -> Optional[RawItem]:
+    title = ""
+    link = ""
+    pub = ""
 
-        title = ""
-        link = ""
-        pub = ""
-
-        for c in list(node):
-            ctag = strip_ns(c.tag)
-            if ctag == "title" and not title:
-                title = text_of(c)
-            elif ctag == "link" and not link:
-                href = c.attrib.get("href", "").strip()
-                link = href or text_of(c)
-            elif ctag in ("pubDate", "published", "updated") and not pub:
-                pub = text_of(c)
-
-        if not title or not link:
-            continue
+    for c in list(node):
+        ctag = strip_ns(c.tag)
+        if ctag == "title" and not title:
+            title = text_of(c)
+        elif ctag == "link" and not link:
+            href = c.attrib.get("href", "").strip()
+            link = href or text_of(c)
+        elif ctag in ("pubDate", "published", "updated") and not pub:
+            pub = text_of(c)
+
+    if not title or not link:
+        return None
+
+    return RawItem(
+        title=title,
+        url=link,
+        source=source_name,
+        category=category,
+        published_at=parse_dt(pub),
+        weight=weight,
+    )
+
+
+def iter_rss(xml_bytes: bytes, source_name: str, category: str, weight: float) -> Iterator[RawItem]:
+    """Yield items as each <item>/<entry> closes, discarding parsed elements."""
+    parser = ET.XMLPullParser(events=("start", "end"))
+    stack: List[ET.Element] = []
+    view = memoryview(xml_bytes)
+    for off in range(0, len(view), PARSE_CHUNK):
+        parser.feed(view[off : off + PARSE_CHUNK])
+        for event, el in parser.read_events():
+            if event == "start":
+                stack.append(el)
+                continue
+            stack.pop()
+            if strip_ns(el.tag) not in ("item", "entry"):
+                continue
+            it = item_from_node(el, source_name, category, weight)
+            # 已处理的节点从父节点摘掉，树不会随条目数增长
+            el.clear()
+            if stack:
+                stack[-1].remove(el)
+            if it is not None:
+                yield it
+    parser.close()
 
-        items.append(
-            RawItem(
-                title=title,
-                url=link,
-                source=source_name,
-                category=category,
-                published_at=parse_dt(pub),
-                weight=weight,
-            )
-        )
-    return items
 
+def parse_rss(
+    xml_bytes: bytes, source_name: str, category: str, weight: float, max_items: int = MAX_ITEMS_PER_SOURCE
+) -> List[RawItem]:
+    return list(islice(iter_rss(xml_bytes, source_name, category, weight), max(0, max_items)))
 
-def parse_json_feed(body: bytes, source_name: str, category: str, weight: float) -> List[RawItem]:
+
+def parse_json_feed(
+    body: bytes, source_name: str, category: str, weight: float, max_items: int = MAX_ITEMS_PER_SOURCE
+) -> List[RawItem]:
     data = json.loads(body.decode("utf-8", errors="ignore"))
     items: List[RawItem] = []
     rows = []
     if isinstance(data, dict):
         rows = data.get("Data") or data.get("data") or data.get("items") or []
-    for r in rows[:100]:
+    for r in rows[: max(0, max_items)]:
         title = str(r.get("title") or r.get("Title") or "").strip()
         url = str(r.get("url") or r.get("link") or r.get("guid") or "").strip()
         pub = str(r.get("published_on") or r.get("publishedAt") or r.get("created_at") or "")
@@ -144,14 +310,21 @@ def parse_json_feed(body: bytes, source_name: str, category: str, weight: float)
     return items
 
 
+URL_RE = re.compile(r"https?://\S+")
+PUNCT_RE = re.compile(r"[^\w\s]")
+STOP_WORDS = frozenset(
+    {"the", "a", "an", "to", "of", "for", "and", "on", "in", "is", "at", "with", "by", "from", "after", "as"}
+)
+
+
+def title_tokens(title: str) -> List[str]:
+    t = PUNCT_RE.sub(" ", URL_RE.sub(" ", title.lower()))
+    # 含数字的词再短也保留："... move 1" 和 "... move 8" 不是同一条
+    return [x for x in t.split() if (len(x) > 2 or not x.isalpha()) and x not in STOP_WORDS]
+
+
 def normalize_title(title: str) -> str:
-    t = title.lower()
-    t = re.sub(r"https?://\S+", " ", t)
-    t = re.sub(r"[^\w\s]", " ", t)
-    t = re.sub(r"\s+", " ", t).strip()
-    stop = {"the", "a", "an", "to", "of", "for", "and", "on", "in", "is", "at", "with", "by", "from", "after", "as"}
-    toks = [x for x in t.split() if len(x) > 2 and x not in stop]
-    return " ".join(toks[:8])
+    return " ".join(title_tokens(title)[:8])
 
 
 def same_topic_key(category: str, title: str) -> str:
@@ -166,20 +339,173 @@ def domain_of(u: str) -> str:
         return ""
 
 
-def apply_confidence(items: List[RawItem]) -> List[Dict]:
-    by_topic: Dict[str, List[RawItem]] = {}
-    for it in items:
-        k = same_topic_key(it.category, it.title)
-        by_topic.setdefault(k, []).append(it)
+class TopicItem:
+    """RawItem plus its normalized title / topic key / domain, computed once."""
+
+    __slots__ = ("raw", "tokens", "words", "nums", "norm", "key", "domain")
+
+    def __init__(self, raw: RawItem):
+        self.raw = raw
+        self.tokens = title_tokens(raw.title)
+        self.words = frozenset(self.tokens)
+        self.nums = frozenset(x for x in self.words if not x.isalpha())
+        self.norm = " ".join(self.tokens[:8])
+        self.key = f"{raw.category}:{self.norm}"
+        self.domain = domain_of(raw.url) if raw.url else ""
+
+
+def keyed(items: Sequence[Union[RawItem, TopicItem]]) -> List[TopicItem]:
+    return [x if isinstance(x, TopicItem) else TopicItem(x) for x in items]
+
+
+MINHASH_PERMS = 32
+MINHASH_PRIME = (1 << 61) - 1
+_perm_rng = random.Random(20260219)
+MINHASH_COEFFS = [
+    (_perm_rng.randrange(1, MINHASH_PRIME) | 1, _perm_rng.randrange(0, MINHASH_PRIME)) for _ in range(MINHASH_PERMS)
+]
+# 近似匹配默认关闭（0 = 只按精确键）；开启时建议 0.7
+DEFAULT_SIMILARITY = 0.0
+# 近似匹配至少要这么多个有效词：短标题差一个词就可能意思相反（raises / cuts）
+MIN_NEAR_DUP_TOKENS = 5
+NEAR_DUP_CANDIDATES = 8
 
-    out = []
-    for it in items:
-        k = same_topic_key(it.category, it.title)
-        group = by_topic.get(k, [])
-        unique_sources = {g.source for g in group}
-        unique_domains = {domain_of(g.url) for g in group if g.url}
 
-        high_cross_verified = len(unique_sources) >= 2 and len(unique_domains) >= 2
+def lsh_shape(threshold: float) -> Tuple[int, int]:
+    """Pick (bands, rows) so the LSH S-curve knee (1/b)^(1/r) sits at or below threshold."""
+    best = (MINHASH_PERMS, 1)
+    for rows in (1, 2, 4, 8, 16):
+        bands = MINHASH_PERMS // rows
+        if (1.0 / bands) ** (1.0 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+def token_hashes(token: str) -> Tuple[int, ...]:
+    h = zlib.crc32(token.encode("utf-8"))
+    return tuple((a * h + b) % MINHASH_PRIME for a, b in MINHASH_COEFFS)
+
+
+def minhash(tokens: Sequence[str], memo: Optional[Dict[str, Tuple[int, ...]]] = None) -> List[int]:
+    """MinHash signature; per-token hash vectors are memoized since titles share vocabulary."""
+    memo = {} if memo is None else memo
+    vecs = []
+    for x in set(tokens):
+        v = memo.get(x)
+        if v is None:
+            v = memo[x] = token_hashes(x)
+        vecs.append(v)
+    return list(map(min, zip(*vecs)))
+
+
+def jaccard(a: AbstractSet[str], b: AbstractSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def near_dup(a: TopicItem, b: TopicItem) -> float:
+    """Token Jaccard of two titles, or 0 when their numbers differ (25bp vs 50bp)."""
+    return jaccard(a.words, b.words) if a.nums == b.nums else 0.0
+
+
+def cluster_topics(topic_items: List[TopicItem], threshold: float = DEFAULT_SIMILARITY) -> List[int]:
+    """Cluster items into topics: exact topic key, plus MinHash/LSH near-duplicates.
+
+    Returns a cluster id per item. Each near-duplicate cluster has an anchor
+    (its first title); a title joins the most similar anchor it shares an LSH
+    bucket with (same category) if their exact token Jaccard >= threshold,
+    otherwise it becomes an anchor itself. Similarity is always checked
+    against the anchor, never chained through neighbours, so A~B and B~C does
+    not pull A and C together. Titles whose numbers differ never match, and
+    titles with fewer than MIN_NEAR_DUP_TOKENS tokens only match on the exact
+    key.
+    """
+    cluster = list(range(len(topic_items)))
+    first_by_key: Dict[str, int] = {}
+    heads: List[int] = []
+    for i, t in enumerate(topic_items):
+        cluster[i] = first_by_key.setdefault(t.key, i)
+        if cluster[i] == i:
+            heads.append(i)
+
+    if 0 < threshold < 1:
+        bands, rows = lsh_shape(threshold)
+        memo: Dict[str, Tuple[int, ...]] = {}
+        buckets: Dict[Tuple[str, int, Tuple[int, ...]], List[int]] = {}
+        anchor_of: Dict[int, int] = {}
+        for i in heads:
+            t = topic_items[i]
+            if len(t.words) < MIN_NEAR_DUP_TOKENS:
+                continue
+            sig = minhash(t.tokens, memo)
+            keys = [(t.raw.category, b, tuple(sig[b * rows : (b + 1) * rows])) for b in range(bands)]
+            # 同桶次数越多越可能相似：只精确比对前 NEAR_DUP_CANDIDATES 个锚点
+            hits: Counter = Counter()
+            for k in keys:
+                hits.update(buckets.get(k, ()))
+            best, best_sim = i, 0.0
+            for a, _ in hits.most_common(NEAR_DUP_CANDIDATES):
+                sim = near_dup(t, topic_items[a])
+                if sim >= threshold and sim > best_sim:
+                    best, best_sim = a, sim
+            anchor_of[i] = best
+            if best == i:
+                # 只有锚点进桶：后来的标题只和锚点比
+                for k in keys:
+                    buckets.setdefault(k, []).append(i)
+        cluster = [anchor_of.get(c, c) for c in cluster]
+
+    return cluster
+
+
+def apply_confidence(
+    items: Sequence[Union[RawItem, TopicItem]], similarity: float = DEFAULT_SIMILARITY
+) -> List[Dict]:
+    """Confidence per item. An item is cross-verified when the titles that match
+    it (its exact topic key, or near-duplicates of the item itself with the same
+    numbers) come from >= 2 sources and >= 2 domains; sharing a cluster with a
+    match of some other member is not enough."""
+    topic_items = keyed(items)
+    cluster_of = cluster_topics(topic_items, similarity)
+    # 近似簇由若干精确键分组组成；同一精确键的标题视为同一条
+    groups: Dict[str, List[TopicItem]] = {}
+    keys_of: Dict[int, List[str]] = {}
+    for t, c in zip(topic_items, cluster_of):
+        g = groups.get(t.key)
+        if g is None:
+            g = groups[t.key] = []
+            keys_of.setdefault(c, []).append(t.key)
+        g.append(t)
+
+    def verdict(members: Iterable[TopicItem]) -> Tuple[int, int, bool]:
+        """(成员数, 不同来源数, 是否交叉验证)"""
+        n = 0
+        sources: Set[str] = set()
+        domains: Set[str] = set()
+        for g in members:
+            n += 1
+            sources.add(g.raw.source)
+            if g.raw.url:
+                domains.add(g.domain)
+        return n, len(sources), len(sources) >= 2 and len(domains) >= 2
+
+    # 只有一个精确分组的簇每组只统计一次
+    by_key: Dict[str, Tuple[int, int, bool]] = {}
+    out = []
+    for t, c in zip(topic_items, cluster_of):
+        it = t.raw
+        keys = keys_of[c]
+        if len(keys) == 1:
+            summary = by_key.get(t.key)
+            if summary is None:
+                summary = by_key[t.key] = verdict(groups[t.key])
+        else:
+            # 其他分组要和这一条本身足够相似才算印证，和锚点相似不够
+            summary = verdict(
+                g for k in keys if k == t.key or near_dup(t, groups[k][0]) >= similarity for g in groups[k]
+            )
+        peer_count, distinct_sources, high_cross_verified = summary
         base = max(0.45, min(0.95, it.weight))
         confidence = 0.9 if high_cross_verified else round(base, 2)
 
@@ -193,8 +519,8 @@ def apply_confidence(items: List[RawItem]) -> List[Dict]:
                 "meta": {
                     "category": it.category,
                     "crossVerified": high_cross_verified,
-                    "topicPeerCount": len(group),
-                    "distinctSources": len(unique_sources),
+                    "topicPeerCount": peer_count,
+                    "distinctSources": distinct_sources,
                 },
             }
         )
@@ -203,51 +529,601 @@ def apply_confidence(items: List[RawItem]) -> List[Dict]:
     return out
 
 
-def dedupe(items: List[RawItem]) -> List[RawItem]:
+def dedupe(items: Sequence[Union[RawItem, TopicItem]]) -> List[TopicItem]:
     seen: set[Tuple[str, str]] = set()
-    res: List[RawItem] = []
-    for it in items:
-        key = (normalize_title(it.title), it.url)
+    res: List[TopicItem] = []
+    for t in keyed(items):
+        key = (t.norm, t.raw.url)
         if key in seen:
             continue
         seen.add(key)
-        res.append(it)
+        res.append(t)
     return res
 
 
-def collect(config_path: Path, timeout: int, retries: int, retry_sleep: float) -> Tuple[List[Dict], List[Dict]]:
-    cfg = json.loads(config_path.read_text(encoding="utf-8"))
-    categories: Dict[str, List[Dict]] = cfg.get("categories", {})
-
-    raw: List[RawItem] = []
-    errors: List[Dict] = []
-
+def iter_sources(categories: Dict[str, List[Dict]]) -> List[Dict]:
+    """Flatten config into fetch jobs, keeping config order."""
+    jobs: List[Dict] = []
     for cat, sources in categories.items():
         for src in sources:
-            name = src.get("name", "unknown")
             url = src.get("url", "")
-            typ = src.get("type", "rss")
-            fmt = src.get("format", "rss")
-            weight = float(src.get("weight", 0.7))
             if not url:
                 continue
+            jobs.append(
+                {
+                    "name": src.get("name", "unknown"),
+                    "category": cat,
+                    "url": url,
+                    "type": src.get("type", "rss"),
+                    "format": src.get("format", "rss"),
+                    "weight": float(src.get("weight", 0.7)),
+                    "max_items": int(src.get("maxItems", MAX_ITEMS_PER_SOURCE)),
+                }
+            )
+    return jobs
 
-            try:
-                body = http_get(url, timeout=timeout, retries=retries, retry_sleep=retry_sleep)
-                if typ == "rss" and fmt != "json":
-                    rows = parse_rss(body, name, cat, weight)
-                elif fmt == "json":
-                    rows = parse_json_feed(body, name, cat, weight)
-                else:
-                    rows = parse_rss(body, name, cat, weight)
-                raw.extend(rows)
-            except Exception as e:
-                errors.append({"source": name, "category": cat, "url": url, "error": str(e)})
-
-    unified = apply_confidence(dedupe(raw))
+
+def load_jobs(config_path: Path) -> List[Dict]:
+    cfg = json.loads(config_path.read_text(encoding="utf-8"))
+    return iter_sources(cfg.get("categories", {}))
+
+
+def parse_body(body: bytes, job: Dict) -> List[RawItem]:
+    name, cat, weight, cap = job["name"], job["category"], job["weight"], job["max_items"]
+    if job["type"] == "rss" and job["format"] != "json":
+        return parse_rss(body, name, cat, weight, cap)
+    if job["format"] == "json":
+        return parse_json_feed(body, name, cat, weight, cap)
+    return parse_rss(body, name, cat, weight, cap)
+
+
+def fetch_source(
+    job: Dict,
+    timeout: int,
+    retries: int,
+    retry_sleep: float,
+    deadline: Optional[float],
+    cache: Optional[FeedCache] = None,
+) -> List[RawItem]:
+    return fetch_rows(job, timeout, retries, retry_sleep, deadline, cache)[1]
+
+
+def fetch_rows(
+    job: Dict,
+    timeout: int,
+    retries: int,
+    retry_sleep: float,
+    deadline: Optional[float],
+    cache: Optional[FeedCache] = None,
+) -> Tuple[int, List[RawItem]]:
+    """HTTP status (304: items reused from the conditional-GET cache) and parsed rows of one source."""
+    url = job["url"]
+    res = http_fetch(
+        url,
+        timeout=timeout,
+        retries=retries,
+        retry_sleep=retry_sleep,
+        deadline=deadline,
+        headers=cache.validators(url) if cache else None,
+    )
+
+    if res.status == 304:
+        cached = cache.reuse(url, job) if cache else None
+        if cached is None:
+            raise RuntimeError(f"fetch failed: {url}; err=304 without cached items")
+        return 304, cached
+
+    rows = parse_body(res.body, job)
+    if cache:
+        cache.store(url, res, rows)
+    return res.status, rows
+
+
+class HostDispatcher:
+    """Hands jobs to the pool only while their host has a free slot (at most
+    `per_host` running per domain). Jobs waiting for a busy host stay in a
+    per-host queue instead of holding a worker, so they never block jobs for
+    other hosts."""
+
+    def __init__(self, pool: ThreadPoolExecutor, per_host: int):
+        self.pool = pool
+        self.per_host = max(1, per_host)
+        self.queued: Dict[str, Deque[Tuple[object, Dict, Callable, tuple]]] = {}
+        self.running: Dict[str, int] = {}
+        self.futures: Dict[Future, Tuple[object, str]] = {}
+
+    def submit(self, key: object, job: Dict, fn: Callable, *args) -> None:
+        host = domain_of(job["url"])
+        self.queued.setdefault(host, deque()).append((key, job, fn, args))
+        self._start(host)
+
+    def _start(self, host: str) -> None:
+        q = self.queued.get(host)
+        while q and self.running.get(host, 0) < self.per_host:
+            key, job, fn, args = q.popleft()
+            self.running[host] = self.running.get(host, 0) + 1
+            self.futures[self.pool.submit(fn, job, *args)] = (key, host)
+
+    def active(self) -> bool:
+        return bool(self.futures)
+
+    def wait(self, timeout: Optional[float]) -> List[Tuple[object, Future]]:
+        """(key, future) of jobs finished within timeout; frees their host slots."""
+        done, _ = wait(self.futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        out = []
+        for fut in done:
+            key, host = self.futures.pop(fut)
+            self.running[host] -= 1
+            self._start(host)
+            out.append((key, fut))
+        return out
+
+    def unfinished(self) -> List[object]:
+        """Keys of jobs still running or queued."""
+        return [k for k, _ in self.futures.values()] + [item[0] for q in self.queued.values() for item in q]
+
+    def busy(self) -> Set[object]:
+        return set(self.unfinished())
+
+
+def collect(
+    config_path: Path,
+    timeout: int,
+    retries: int,
+    retry_sleep: float,
+    workers: int = 8,
+    per_host: int = 2,
+    deadline_s: Optional[float] = None,
+    cache: Optional[FeedCache] = None,
+    similarity: float = DEFAULT_SIMILARITY,
+) -> Tuple[List[Dict], List[Dict]]:
+    jobs = load_jobs(config_path)
+
+    deadline = time.monotonic() + deadline_s if deadline_s and deadline_s > 0 else None
+
+    results: List[Optional[List[RawItem]]] = [None] * len(jobs)
+    failures: List[Optional[str]] = [None] * len(jobs)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="fetch")
+    try:
+        dispatcher = HostDispatcher(pool, per_host)
+        for idx, job in enumerate(jobs):
+            dispatcher.submit(idx, job, fetch_source, timeout, retries, retry_sleep, deadline, cache)
+        while dispatcher.active():
+            left = remaining(deadline)
+            if left is not None and left <= 0:
+                break
+            for idx, fut in dispatcher.wait(left):
+                try:
+                    results[idx] = fut.result()
+                except Exception as e:
+                    failures[idx] = str(e)
+        for idx in dispatcher.unfinished():
+            failures[idx] = f"fetch failed: {jobs[idx]['url']}; err=deadline exceeded"
+    finally:
+        # 超时的请求自身也受 deadline 约束，不在这里阻塞等待
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    raw: List[RawItem] = []
+    errors: List[Dict] = []
+    for job, rows, err in zip(jobs, results, failures):
+        if err is not None:
+            errors.append({"source": job["name"], "category": job["category"], "url": job["url"], "error": err})
+        elif rows:
+            raw.extend(rows)
+
+    unified = apply_confidence(dedupe(raw), similarity=similarity)
     return unified, errors
 
 
+class SeenIndex:
+    """Persistent (normalize_title, url) index with first-seen timestamps (SQLite)."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " title_key TEXT NOT NULL,"
+            " url TEXT NOT NULL,"
+            " first_seen TEXT NOT NULL,"
+            " PRIMARY KEY (title_key, url))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS seen_first_seen ON seen (first_seen)")
+
+    def take_new(self, items: List[Dict]) -> List[Dict]:
+        """Record items and return only those never seen before, in input order."""
+        ts = now_iso()
+        fresh: List[Dict] = []
+        with self.db:
+            for x in items:
+                cur = self.db.execute(
+                    "INSERT OR IGNORE INTO seen (title_key, url, first_seen) VALUES (?, ?, ?)",
+                    (normalize_title(x["title"]), x["url"], ts),
+                )
+                if cur.rowcount:
+                    fresh.append(x)
+        return fresh
+
+    def prune(self, retention_days: float) -> None:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).isoformat()
+        with self.db:
+            self.db.execute("DELETE FROM seen WHERE first_seen < ?", (cutoff,))
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def output_row(x: Dict) -> Dict:
+    return {k: x[k] for k in SCHEMA}
+
+
+def parse_iso(v: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(v)
+    except (TypeError, ValueError):
+        return None
+
+
+COMPRESS_SUFFIX = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def with_compress_suffix(path: Path, compress: str) -> Path:
+    suffix = COMPRESS_SUFFIX[compress]
+    return path.with_name(path.name + suffix) if suffix else path
+
+
+def open_text(path: Path, mode: str, compress: str = "none") -> IO[str]:
+    """Open a text stream for "w"/"a", optionally gzip/zstd compressed."""
+    if compress == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if compress == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("--compress zstd requires the 'zstandard' package") from e
+        raw = open(path, mode + "b")
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw, closefd=True), encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def read_text_any(path: Path) -> str:
+    if path.name.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+    if path.name.endswith(".zst"):
+        import zstandard
+
+        with zstandard.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+    return path.read_text(encoding="utf-8")
+
+
+@contextmanager
+def atomic_writer(path: Path, compress: str = "none") -> Iterator[IO[str]]:
+    """Write to a temp file next to path and rename over it on success."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        with open_text(tmp, "w", compress) as f:
+            yield f
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    tmp.replace(path)
+
+
+def write_jsonl(f: IO[str], items: Iterable[Dict]) -> int:
+    n = 0
+    for x in items:
+        f.write(json.dumps(output_row(x), ensure_ascii=False))
+        f.write("\n")
+        n += 1
+    return n
+
+
+def write_json(f: IO[str], items: Iterable[Dict], stats: Dict, errors: List[Dict]) -> int:
+    """Stream the JSON payload record by record; count/highConfidenceCount are tallied on the way."""
+    f.write("{\n")
+    f.write(f'  "generatedAt": {json.dumps(now_iso())},\n')
+    f.write(f'  "schema": {json.dumps(SCHEMA)},\n')
+    f.write('  "items": [')
+    count = high = 0
+    for x in items:
+        f.write(",\n    " if count else "\n    ")
+        f.write(json.dumps(output_row(x), ensure_ascii=False))
+        count += 1
+        high += 1 if x.get("confidence", 0) >= 0.9 else 0
+    f.write("\n  ],\n" if count else "],\n")
+    stats = {"count": count, "highConfidenceCount": high, **stats}
+    f.write(f'  "stats": {json.dumps(stats, ensure_ascii=False)},\n')
+    f.write(f'  "errors": {json.dumps(errors, ensure_ascii=False)}\n')
+    f.write("}\n")
+    return count
+
+
+def merge_window(prev_path: Path, fresh: List[Dict], window_hours: float, limit: int) -> List[Dict]:
+    """Merge new rows into the rolling window already stored at prev_path."""
+    try:
+        prev = json.loads(read_text_any(prev_path)).get("items", [])
+    except (OSError, ValueError, AttributeError, ImportError):
+        prev = []
+
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=window_hours)
+    merged: Dict[Tuple[str, str], Dict] = {}
+    for x in prev + fresh:
+        ts = parse_iso(x.get("publishedAt", ""))
+        if ts is None or ts < cutoff:
+            continue
+        merged[(normalize_title(x.get("title", "")), x.get("url", ""))] = output_row(x)
+
+    rows = sorted(merged.values(), key=lambda x: x["publishedAt"], reverse=True)
+    return rows[: max(1, limit)]
+
+
+def run_incremental(args: argparse.Namespace, out_path: Path, items: List[Dict], errors: List[Dict], not_modified: int) -> Dict:
+    index = SeenIndex(Path(args.index))
+    try:
+        fresh = index.take_new(items)
+        index.prune(args.index_retention_days)
+    finally:
+        index.close()
+
+    json_path = with_compress_suffix(out_path, args.compress)
+    window = merge_window(json_path, fresh, args.window_hours, args.limit)
+    if args.format in ("json", "both"):
+        stats = {"newCount": len(fresh), "errorCount": len(errors), "notModifiedCount": not_modified}
+        with atomic_writer(json_path, args.compress) as f:
+            write_json(f, window, stats, errors)
+
+    # 增量模式：只把新条目追加到 JSONL，下游 tail 即可
+    if args.format in ("jsonl", "both"):
+        jsonl_path = with_compress_suffix(out_path.with_suffix(".jsonl"), args.compress)
+        jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+        with open_text(jsonl_path, "a", args.compress) as f:
+            write_jsonl(f, fresh)
+
+    return {"ok": True, "out": str(json_path), "items": len(window), "new": len(fresh), "errors": len(errors)}
+
+
+def write_outputs(args: argparse.Namespace, out_path: Path, items: List[Dict], errors: List[Dict], not_modified: int) -> Dict:
+    """Write the configured outputs for one round; returns the summary line."""
+    items = items[: max(1, args.limit)]
+    if args.incremental:
+        return run_incremental(args, out_path, items, errors, not_modified)
+
+    json_path = with_compress_suffix(out_path, args.compress)
+    if args.format in ("json", "both"):
+        stats = {"errorCount": len(errors), "notModifiedCount": not_modified}
+        with atomic_writer(json_path, args.compress) as f:
+            write_json(f, items, stats, errors)
+
+    # Also emit JSONL for pipeline consumers.
+    if args.format in ("jsonl", "both"):
+        with atomic_writer(with_compress_suffix(out_path.with_suffix(".jsonl"), args.compress), args.compress) as f:
+            write_jsonl(f, items)
+
+    return {"ok": True, "out": str(json_path), "items": len(items), "errors": len(errors)}
+
+
+@dataclass
+class SourceState:
+    interval_s: float
+    next_at: float = 0.0  # epoch 秒；0 = 立即到期
+    cadence_s: Optional[float] = None  # publishedAt 间隔中位数的滑动平均
+    quiet_rate: float = 0.0  # 没拿到新条目（304 / 内容未变）的比例，滑动平均
+    fails: int = 0
+    fetches: int = 0
+    not_modified: int = 0
+    last_error: str = ""
+
+
+def publish_gaps(rows: Sequence[RawItem]) -> List[float]:
+    """Seconds between consecutive distinct publishedAt of a feed's items."""
+    stamps = sorted({t.timestamp() for t in (parse_iso(r.published_at) for r in rows) if t is not None})
+    # 没有日期的条目被记成抓取时刻，彼此只差几微秒，不算
+    return [b - a for a, b in zip(stamps, stamps[1:]) if b - a >= 1.0]
+
+
+class SourceScheduler:
+    """Per-source polling schedule for --daemon, persisted across restarts.
+
+    Each source is polled at about half its learned update cadence (median
+    publishedAt gap, smoothed), stretched by how often a poll brings nothing
+    new (304 or unchanged items) and clamped to [min_interval_s, cap]; the cap
+    is lower for high-weight sources so official releases are picked up fast.
+    Failing sources back off exponentially up to max_backoff_s.
+    """
+
+    EMA = 0.3
+
+    def __init__(
+        self,
+        path: Optional[Path],
+        min_interval_s: float = 60.0,
+        max_interval_s: float = 3600.0,
+        default_interval_s: float = 600.0,
+        priority_weight: float = 0.9,
+        priority_max_interval_s: float = 300.0,
+        max_backoff_s: float = 6 * 3600.0,
+    ):
+        self.path = path
+        self.min_interval_s = max(1.0, min_interval_s)
+        self.max_interval_s = max(self.min_interval_s, max_interval_s)
+        self.default_interval_s = default_interval_s
+        self.priority_weight = priority_weight
+        self.priority_max_interval_s = max(self.min_interval_s, priority_max_interval_s)
+        self.max_backoff_s = max(self.min_interval_s, max_backoff_s)
+        self.sources: Dict[str, SourceState] = {}
+        self.requests = 0
+        self.load()
+
+    def load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.sources = {url: SourceState(**st) for url, st in data.get("sources", {}).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            self.sources = {}
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": 1, "sources": {u: asdict(st) for u, st in self.sources.items()}}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def state(self, job: Dict) -> SourceState:
+        st = self.sources.get(job["url"])
+        if st is None:
+            st = self.sources[job["url"]] = SourceState(interval_s=self.default_interval_s)
+        return st
+
+    def cap(self, job: Dict) -> float:
+        return self.priority_max_interval_s if job["weight"] >= self.priority_weight else self.max_interval_s
+
+    def interval(self, job: Dict, st: SourceState) -> float:
+        base = st.cadence_s / 2 if st.cadence_s else self.default_interval_s
+        stretch = 1.0 / max(0.2, 1.0 - st.quiet_rate)
+        return min(self.cap(job), max(self.min_interval_s, base * stretch))
+
+    def due(self, jobs: Sequence[Dict], now: float, busy: AbstractSet[str] = frozenset()) -> List[Dict]:
+        """Jobs whose time has come, highest weight first."""
+        ready = [j for j in jobs if j["url"] not in busy and self.state(j).next_at <= now]
+        return sorted(ready, key=lambda j: (-j["weight"], self.state(j).next_at))
+
+    def delay(self, jobs: Sequence[Dict], now: float, busy: AbstractSet[str] = frozenset()) -> float:
+        waits = [self.state(j).next_at - now for j in jobs if j["url"] not in busy]
+        return max(0.0, min(waits)) if waits else self.min_interval_s
+
+    def observe(self, job: Dict, status: int, rows: Sequence[RawItem], fresh: bool, now: float) -> None:
+        st = self.state(job)
+        self.requests += 1
+        st.fetches += 1
+        st.not_modified += status == 304
+        st.fails = 0
+        st.last_error = ""
+        gaps = publish_gaps(rows)
+        if gaps:
+            gap = sorted(gaps)[len(gaps) // 2]
+            st.cadence_s = gap if st.cadence_s is None else st.cadence_s + self.EMA * (gap - st.cadence_s)
+        st.quiet_rate += self.EMA * ((0.0 if fresh else 1.0) - st.quiet_rate)
+        st.interval_s = self.interval(job, st)
+        st.next_at = now + st.interval_s * random.uniform(0.9, 1.1)
+
+    def failed(self, job: Dict, err: str, now: float) -> None:
+        st = self.state(job)
+        self.requests += 1
+        st.fetches += 1
+        st.fails += 1
+        st.last_error = err
+        backoff = min(self.max_backoff_s, max(self.min_interval_s, st.interval_s) * 2 ** min(st.fails, 16))
+        st.next_at = now + backoff * random.uniform(0.5, 1.0)
+
+
+def run_daemon(args: argparse.Namespace, config_path: Path, out_path: Path, cache: Optional[FeedCache]) -> int:
+    """Long-running mode: poll each source on its own schedule and rewrite the outputs when anything changed."""
+    sched = SourceScheduler(
+        Path(args.schedule_state) if args.schedule_state else None,
+        min_interval_s=args.min_interval,
+        max_interval_s=args.max_interval,
+        default_interval_s=args.default_interval,
+        priority_weight=args.priority_weight,
+        priority_max_interval_s=args.priority_max_interval,
+        max_backoff_s=args.max_backoff,
+    )
+    config_mtime = 0.0
+    jobs: List[Dict] = []
+    rows: Dict[str, List[RawItem]] = {}
+    errors: Dict[str, Dict] = {}
+    pool = ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="fetch")
+    dispatcher = HostDispatcher(pool, args.per_host)
+    try:
+        while True:
+            try:
+                mtime = config_path.stat().st_mtime
+            except OSError:
+                mtime = config_mtime  # 编辑器替换文件的瞬间：沿用旧的源列表
+            if mtime != config_mtime:
+                # 白名单改了就重新加载，不用重启
+                config_mtime, jobs = mtime, load_jobs(config_path)
+                for j in jobs:
+                    if j["url"] not in rows:
+                        seeded = cache.peek(j["url"], j) if cache else None
+                        if seeded is None:
+                            # 重启后手上没有这个源的条目：先抓一次
+                            sched.state(j).next_at = 0.0
+                        else:
+                            rows[j["url"]] = seeded
+                live = {j["url"] for j in jobs}
+                rows = {u: r for u, r in rows.items() if u in live}
+                errors = {u: e for u, e in errors.items() if u in live}
+
+            now = time.time()
+            for job in sched.due(jobs, now, dispatcher.busy()):
+                dispatcher.submit(job["url"], job, fetch_rows, args.timeout, args.retries, args.retry_sleep, None, cache)
+            timeout = sched.delay(jobs, time.time(), dispatcher.busy())
+            if not dispatcher.active():
+                time.sleep(timeout)
+                continue
+            done = dispatcher.wait(timeout)
+
+            by_url = {j["url"]: j for j in jobs}
+            fetched = not_modified = 0
+            changed: List[str] = []
+            errors_before = set(errors)
+            now = time.time()
+            for url, fut in done:
+                job = by_url.get(url)
+                if job is None:
+                    continue
+                fetched += 1
+                try:
+                    status, got = fut.result()
+                except Exception as e:
+                    sched.failed(job, str(e), now)
+                    st = sched.state(job)
+                    errors[job["url"]] = {
+                        "source": job["name"],
+                        "category": job["category"],
+                        "url": job["url"],
+                        "error": str(e),
+                        "failures": st.fails,
+                        "retryAt": datetime.fromtimestamp(st.next_at, timezone.utc).isoformat(),
+                    }
+                    continue
+                errors.pop(job["url"], None)
+                prev = rows.get(job["url"])
+                fresh = prev is None or bool({r.url for r in got} - {r.url for r in prev})
+                not_modified += status == 304
+                sched.observe(job, status, got, fresh, now)
+                rows[job["url"]] = got
+                if fresh:
+                    changed.append(job["name"])
+            if not fetched:
+                continue
+
+            line = {"ok": True, "fetched": fetched, "notModified": not_modified, "changed": changed, "requests": sched.requests}
+            if changed or set(errors) != errors_before:
+                raw = [r for j in jobs for r in rows.get(j["url"], [])]
+                items = apply_confidence(dedupe(raw), similarity=args.similarity)
+                line["published"] = write_outputs(args, out_path, items, list(errors.values()), not_modified)
+            sched.save()
+            if cache:
+                cache.save()
+            line["nextInS"] = round(sched.delay(jobs, time.time(), dispatcher.busy()), 1)
+            print(json.dumps(line, ensure_ascii=False), flush=True)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        sched.save()
+        if cache:
+            cache.save()
+
+
 def main() -> int:
     ap = argparse.ArgumentParser(description="No-key whitelist intelligence collector")
     ap.add_argument("--config", default="config/sources.whitelist.json")
@@ -256,53 +1132,64 @@ def main() -> int:
     ap.add_argument("--retries", type=int, default=2)
     ap.add_argument("--retry-sleep", type=float, default=1.0)
     ap.add_argument("--limit", type=int, default=200)
+    ap.add_argument("--workers", type=int, default=8, help="concurrent fetch threads")
+    ap.add_argument("--per-host", type=int, default=2, help="max concurrent requests per host")
+    ap.add_argument("--deadline", type=float, default=60.0, help="global deadline for the whole run (seconds, 0=none)")
+    ap.add_argument("--cache", default="data/http_cache.json", help="conditional-GET cache file ('' to disable)")
+    ap.add_argument("--cache-max-entries", type=int, default=256)
+    ap.add_argument("--cache-max-age-days", type=float, default=7.0)
+    ap.add_argument(
+        "--similarity",
+        type=float,
+        default=DEFAULT_SIMILARITY,
+        help="title Jaccard threshold for near-duplicate cross-verification (default 0 = exact topic key only; 0.7 suggested)",
+    )
+    ap.add_argument("--format", choices=["json", "jsonl", "both"], default="both", help="which outputs to write")
+    ap.add_argument("--compress", choices=sorted(COMPRESS_SUFFIX), default="none", help="compress outputs (.gz / .zst)")
+    ap.add_argument("--incremental", action="store_true", help="emit only new items (delta) and keep a rolling window")
+    ap.add_argument("--index", default="data/seen_index.sqlite3", help="seen-item index for --incremental")
+    ap.add_argument("--index-retention-days", type=float, default=30.0)
+    ap.add_argument("--window-hours", type=float, default=24.0, help="rolling window kept in --out for --incremental")
+    ap.add_argument("--daemon", action="store_true", help="keep running and poll each source on its own learned schedule")
+    ap.add_argument("--schedule-state", default="data/source_schedule.json", help="per-source schedule state for --daemon ('' to disable)")
+    ap.add_argument("--min-interval", type=float, default=60.0, help="--daemon: shortest poll interval per source (seconds)")
+    ap.add_argument("--max-interval", type=float, default=3600.0, help="--daemon: longest poll interval per source (seconds)")
+    ap.add_argument("--default-interval", type=float, default=600.0, help="--daemon: interval while a source's cadence is unknown")
+    ap.add_argument("--priority-weight", type=float, default=0.9, help="--daemon: sources with weight >= this are polled first and capped at --priority-max-interval")
+    ap.add_argument("--priority-max-interval", type=float, default=300.0)
+    ap.add_argument("--max-backoff", type=float, default=6 * 3600.0, help="--daemon: longest back-off for a failing source (seconds)")
     args = ap.parse_args()
+    if args.compress == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            ap.error("--compress zstd requires the 'zstandard' package (pip install zstandard)")
 
     config_path = Path(args.config)
     out_path = Path(args.out)
+    cache = (
+        FeedCache(Path(args.cache), max_entries=args.cache_max_entries, max_age_s=args.cache_max_age_days * 86400)
+        if args.cache
+        else None
+    )
 
-    items, errors = collect(config_path, args.timeout, args.retries, args.retry_sleep)
-    items = items[: max(1, args.limit)]
+    if args.daemon:
+        return run_daemon(args, config_path, out_path, cache)
 
-    payload = {
-        "generatedAt": now_iso(),
-        "schema": ["title", "url", "source", "publishedAt", "confidence"],
-        "items": [
-            {
-                "title": x["title"],
-                "url": x["url"],
-                "source": x["source"],
-                "publishedAt": x["publishedAt"],
-                "confidence": x["confidence"],
-            }
-            for x in items
-        ],
-        "stats": {
-            "count": len(items),
-            "highConfidenceCount": sum(1 for x in items if x.get("confidence", 0) >= 0.9),
-            "errorCount": len(errors),
-        },
-        "errors": errors,
-    }
-
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
-
-    # Also emit JSONL for pipeline consumers.
-    jsonl_path = out_path.with_suffix(".jsonl")
-    lines = []
-    for x in items:
-        row = {
-            "title": x["title"],
-            "url": x["url"],
-            "source": x["source"],
-            "publishedAt": x["publishedAt"],
-            "confidence": x["confidence"],
-        }
-        lines.append(json.dumps(row, ensure_ascii=False))
-    jsonl_path.write_text("\\n".join(lines) + ("\\n" if lines else ""), encoding="utf-8")
-
-    print(json.dumps({"ok": True, "out": str(out_path), "items": len(items), "errors": len(errors)}, ensure_ascii=False))
+    items, errors = collect(
+        config_path,
+        args.timeout,
+        args.retries,
+        args.retry_sleep,
+        workers=args.workers,
+        per_host=args.per_host,
+        deadline_s=args.deadline,
+        cache=cache,
+        similarity=args.similarity,
+    )
+    if cache:
+        cache.save()
+    print(json.dumps(write_outputs(args, out_path, items, errors, cache.hits if cache else 0), ensure_ascii=False))
     return 0
 
 
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Incremental order book for one CLOB token.
+
+Levels are kept as price -> size maps plus ascending price lists maintained
+with bisect, so best bid/ask is O(1), depth-at-price is O(1), a level update
+is O(log n) search + one list insert/delete, and VWAP walks only the levels it
+consumes. Safe to share between the websocket thread and the trading loop.
+"""
+
+import threading
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+BUY = "BUY"
+SELL = "SELL"
+
+
+def _field(level: Any, name: str):
+    return level.get(name) if isinstance(level, dict) else getattr(level, name, None)
+
+
+def _parse_level(level: Any) -> Optional[Tuple[float, float]]:
+    try:
+        price = float(_field(level, "price"))
+        size = float(_field(level, "size") or 0)
+    except (TypeError, ValueError):
+        return None
+    if price <= 0:
+        return None
+    return price, size
+
+
+class OrderBook:
+    def __init__(self, token_id: str = ""):
+        self.token_id = token_id
+        self.updated_at = 0.0
+        self._lock = threading.Lock()
+        self._bids: Dict[float, float] = {}
+        self._asks: Dict[float, float] = {}
+        self._bid_px: List[float] = []  # ascending, best bid = last
+        self._ask_px: List[float] = []  # ascending, best ask = first
+
+    # --- updates ---
+
+    def apply_snapshot(self, bids: Iterable[Any], asks: Iterable[Any], ts: float = 0.0) -> None:
+        """Replace both sides. Levels may be dicts or objects with .price/.size (str or float)."""
+        new_bids: Dict[float, float] = {}
+        new_asks: Dict[float, float] = {}
+        for raw, dst in ((bids or [], new_bids), (asks or [], new_asks)):
+            for level in raw:
+                parsed = _parse_level(level)
+                if parsed and parsed[1] > 0:
+                    dst[parsed[0]] = parsed[1]
+        with self._lock:
+            self._bids, self._asks = new_bids, new_asks
+            self._bid_px = sorted(new_bids)
+            self._ask_px = sorted(new_asks)
+            self.updated_at = ts
+
+    def apply_delta(self, side: str, price: float, size: float, ts: float = 0.0) -> None:
+        """Set one level's size; size <= 0 removes it. side is BUY/BID or SELL/ASK."""
+        if price <= 0:
+            return
+        is_bid = side.upper() in (BUY, "BID", "BIDS")
+        with self._lock:
+            levels = self._bids if is_bid else self._asks
+            prices = self._bid_px if is_bid else self._ask_px
+            if size > 0:
+                if price not in levels:
+                    insort(prices, price)
+                levels[price] = size
+            elif levels.pop(price, None) is not None:
+                del prices[bisect_left(prices, price)]
+            self.updated_at = ts
+
+    # --- reads ---
+
+    @property
+    def best_bid(self) -> Optional[float]:
+        with self._lock:
+            return self._bid_px[-1] if self._bid_px else None
+
+    @property
+    def best_ask(self) -> Optional[float]:
+        with self._lock:
+            return self._ask_px[0] if self._ask_px else None
+
+    def top(self) -> Tuple[Optional[float], Optional[float]]:
+        """(best ask, best bid)."""
+        with self._lock:
+            return (self._ask_px[0] if self._ask_px else None, self._bid_px[-1] if self._bid_px else None)
+
+    def empty(self) -> bool:
+        with self._lock:
+            return not self._bid_px and not self._ask_px
+
+    def depth_at(self, side: str, price: float) -> float:
+        with self._lock:
+            levels = self._bids if side.upper() in (BUY, "BID", "BIDS") else self._asks
+            return levels.get(price, 0.0)
+
+    def levels(self, side: str, n: int) -> List[Tuple[float, float]]:
+        """Up to n (price, size) levels, best first. side is BUY/BID or SELL/ASK."""
+        with self._lock:
+            if side.upper() in (BUY, "BID", "BIDS"):
+                return [(p, self._bids[p]) for p in self._bid_px[: -n - 1 : -1]] if n > 0 else []
+            return [(p, self._asks[p]) for p in self._ask_px[:n]]
+
+    def vwap_for_size(self, side: str, qty: float, limit: Optional[float] = None) -> Tuple[Optional[float], float]:
+        """Average price and filled qty for taking `qty` shares.
+
+        side is the taker side: BUY walks asks upward, SELL walks bids downward.
+        Levels beyond `limit` (a limit price) are not used.
+        """
+        taking_asks = side.upper() == BUY
+        filled = 0.0
+        notional = 0.0
+        with self._lock:
+            levels = self._asks if taking_asks else self._bids
+            prices = self._ask_px if taking_asks else reversed(self._bid_px)
+            for p in prices:
+                if limit is not None and (p > limit if taking_asks else p < limit):
+                    break
+                take = min(levels[p], qty - filled)
+                filled += take
+                notional += take * p
+                if filled >= qty:
+                    break
+        if filled <= 0:
+            return None, 0.0
+        return notional / filled, filled
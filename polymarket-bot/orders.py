@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Order management: signing/submit queue, in-flight state, fill reconciliation.
+
+The trading loop only enqueues an order and later drains completed ones with
+poll(); building, signing and posting happen on a worker thread. Fills come
+from the post response (FOK "matched" amounts) and, for orders the response
+leaves open, from user-channel trade events. An order not filled within the
+ack timeout is cancelled but stays matchable until the cancel is confirmed
+and `settle_s` has passed, so trades that race the cancel are still booked
+against it. Each stage is timed into a latency histogram.
+"""
+
+import itertools
+import math
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import LatencyHistogram
+
+# 与 py_clob_client 的常量同值；不在模块级导入它（导入要 1 秒多，拖慢重启）
+BUY, SELL = "BUY", "SELL"
+FOK, FAK = "FOK", "FAK"
+
+STAGES = ("build", "sign", "post", "ack")
+USDC_UNITS = 1_000_000
+SIZE_DECIMALS = 2  # py_clob_client 签名时把数量向下取整到 2 位小数
+FILL_EPS = 1e-6
+
+DONE_STATES = ("filled", "partial", "rejected", "failed")
+
+
+def round_size(size: float) -> float:
+    """Order size as it will be signed (rounded down)."""
+    return math.floor(size * 10**SIZE_DECIMALS + 1e-9) / 10**SIZE_DECIMALS
+
+
+def response_amounts(resp: Dict) -> Tuple[float, float]:
+    """(making, taking) of a post response.
+
+    The unit follows the field type, decided once per response: the CLOB sends
+    decimal strings (floats from a simulated exchange are the same unit);
+    JSON integers are 6-decimal base units, as in signed order amounts.
+    """
+    raw = (resp.get("makingAmount"), resp.get("takingAmount"))
+    present = [v for v in raw if v not in (None, "")]
+    base_units = bool(present) and all(isinstance(v, int) and not isinstance(v, bool) for v in present)
+    scale = USDC_UNITS if base_units else 1
+    return float(raw[0] or 0) / scale, float(raw[1] or 0) / scale
+
+
+@dataclass
+class ManagedOrder:
+    local_id: int
+    side: str
+    token_id: str
+    price: float
+    size: float
+    note: str
+    intent: str  # open / close
+    meta: Dict = field(default_factory=dict)
+
+    state: str = "queued"
+    order_id: str = ""
+    filled_qty: float = 0.0
+    filled_notional: float = 0.0
+    error: str = ""
+    http_status: Optional[int] = None
+    resp: Optional[Dict] = None
+    stamps: Dict[str, float] = field(default_factory=dict)
+    trade_ids: set = field(default_factory=set)
+
+    @property
+    def avg_price(self) -> float:
+        return self.filled_notional / self.filled_qty if self.filled_qty else 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.state in DONE_STATES
+
+    def add_fill(self, qty: float, price: float) -> None:
+        qty = min(qty, max(0.0, self.size - self.filled_qty))
+        if qty <= 0:
+            return
+        self.filled_qty += qty
+        self.filled_notional += qty * price
+
+
+class OrderManager:
+    def __init__(
+        self,
+        client,
+        dry_run: bool,
+        log: Callable[..., None] = lambda event, **kw: None,
+        on_done: Callable[[], None] = lambda: None,
+        order_type: str = FOK,
+        ack_timeout_s: float = 10.0,
+        settle_s: float = 2.0,
+        inline: bool = False,
+        order_args: Optional[Callable[..., object]] = None,
+    ):
+        self.client = client
+        self.dry_run = dry_run
+        self.log = log
+        self.on_done = on_done
+        self.order_type = order_type
+        self.ack_timeout_s = ack_timeout_s
+        # 撤单确认后再等这么久，收齐与撤单赛跑的成交推送
+        self.settle_s = settle_s
+        # inline: 在调用线程里同步下单（回放 / 回测用），不起下单线程
+        self.inline = inline
+        # 构造下单参数；默认用 py_clob_client 的 OrderArgs（首次下单时才导入）
+        self.order_args = order_args
+
+        self.latency: Dict[str, LatencyHistogram] = {s: LatencyHistogram() for s in STAGES}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._submit: "queue.Queue[Tuple[str, ManagedOrder]]" = queue.Queue()
+        self._done: "queue.Queue[ManagedOrder]" = queue.Queue()
+        self._in_flight: Dict[int, ManagedOrder] = {}
+        self._by_order_id: Dict[str, ManagedOrder] = {}
+        # 成交推送可能先于下单回报到达，按订单号暂存
+        self._early: Dict[str, List[Tuple[str, float, float, str]]] = {}
+        self.bad_trades = 0  # 跳过的畸形成交推送条目
+        self._thread: Optional[threading.Thread] = None
+        if not inline:
+            self._thread = threading.Thread(target=self._run, name="order-pipeline", daemon=True)
+            self._thread.start()
+
+    # --- trading-thread API ---
+
+    def submit(self, side: str, token_id: str, price: float, size: float, note: str, intent: str, **meta) -> ManagedOrder:
+        o = ManagedOrder(next(self._ids), side, token_id, price, round_size(size), note, intent, meta)
+        o.stamps["queued"] = time.perf_counter()
+        with self._lock:
+            self._in_flight[o.local_id] = o
+        if self.inline:
+            self._post(o)
+        else:
+            self._submit.put(("post", o))
+        return o
+
+    def poll(self) -> List[ManagedOrder]:
+        """Completed orders since the last call (filled / partial / rejected / failed)."""
+        if self._in_flight:
+            self._expire_unacked()
+        out = []
+        # 只有主循环在取，empty() 之后 get_nowait() 不会落空
+        while not self._done.empty():
+            out.append(self._done.get_nowait())
+        return out
+
+    def in_flight(self) -> List[ManagedOrder]:
+        with self._lock:
+            return list(self._in_flight.values())
+
+    def stats(self) -> Dict:
+        return {stage: h.snapshot() for stage, h in self.latency.items()}
+
+    # --- user trade stream ---
+
+    def on_trade(self, ev: Dict) -> None:
+        """Reconcile a user-channel trade event against in-flight orders."""
+        status = str(ev.get("status", "")).upper()
+        if status not in ("MATCHED", "MINED", "CONFIRMED"):
+            return
+        trade_id = str(ev.get("id", ""))
+        matches = []
+        makers = ev.get("maker_orders") or []
+        for m, id_key, qty_key in [(ev, "taker_order_id", "size")] + [(mo, "order_id", "matched_amount") for mo in (makers if isinstance(makers, list) else [makers])]:
+            # 单条坏数据只跳过这一条：异常抛回用户频道会拆掉会话重连，重连期间的成交就漏了
+            try:
+                qty, price = float(m.get(qty_key) or 0), float(m.get("price") or 0)
+                if not (math.isfinite(qty) and math.isfinite(price)):
+                    raise ValueError(f"non-finite {qty_key}/price")
+                matches.append((str(m.get(id_key, "")), qty, price))
+            except (AttributeError, TypeError, ValueError) as e:
+                self.bad_trades += 1
+                if self.bad_trades & (self.bad_trades - 1) == 0:
+                    # 第 1、2、4、8... 条记日志，避免刷屏
+                    self.log("ORDER_BAD_TRADE", tradeId=trade_id, err=repr(e), entry=str(m)[:200], count=self.bad_trades)
+        with self._lock:
+            for order_id, qty, price in matches:
+                o = self._by_order_id.get(order_id)
+                if o is None:
+                    if order_id and self._in_flight:
+                        if len(self._early) >= 256:
+                            self._early.pop(next(iter(self._early)))
+                        self._early.setdefault(order_id, []).append((trade_id, qty, price, status))
+                    continue
+                self._apply_trade(o, trade_id, qty, price, status)
+
+    def _apply_trade(self, o: ManagedOrder, trade_id: str, qty: float, price: float, status: str) -> None:
+        """Must hold self._lock."""
+        if o.done or trade_id in o.trade_ids:
+            return
+        o.trade_ids.add(trade_id)
+        o.add_fill(qty, price)
+        self.log("ORDER_TRADE", localId=o.local_id, orderId=o.order_id[-10:], qty=round(qty, 6), px=price, status=status)
+        if o.filled_qty >= o.size - FILL_EPS:
+            self._finish(o, "filled")
+
+    # --- worker ---
+
+    def _stage(self, o: ManagedOrder, stage: str, start: float) -> float:
+        now = time.perf_counter()
+        o.stamps[stage] = now
+        self.latency[stage].observe((now - start) * 1000)
+        return now
+
+    def _finish(self, o: ManagedOrder, state: str, error: str = "") -> None:
+        """Must hold self._lock."""
+        if o.done:
+            return
+        if state == "filled" and o.filled_qty <= 0:
+            state = "rejected"
+        elif state == "filled" and o.filled_qty < o.size - FILL_EPS:
+            state = "partial"
+        if state in ("rejected", "failed") and o.filled_qty > 0:
+            state = "partial"
+        o.state = state
+        o.error = error
+        if "posted" in o.stamps:
+            self._stage(o, "ack", o.stamps["posted"])
+        self._in_flight.pop(o.local_id, None)
+        if o.order_id:
+            self._by_order_id.pop(o.order_id, None)
+        self._done.put(o)
+        self.on_done()
+
+    def _expire_unacked(self) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            for o in list(self._in_flight.values()):
+                if o.state == "posted" and now - o.stamps.get("posted", now) > self.ack_timeout_s:
+                    if self.dry_run or self.inline or not o.order_id:
+                        self._finish(o, "failed", error="ack timeout")
+                        continue
+                    # 剩余部分撤掉；撤单确认前后到达的成交仍按订单号入账，收齐后才算完成
+                    o.state = "cancelling"
+                    o.stamps["expired"] = now
+                    self._submit.put(("cancel", o))
+                elif o.state == "cancelling":
+                    confirmed = o.stamps.get("cancelled")
+                    settled = confirmed is not None and now - confirmed > self.settle_s
+                    # 撤单一直没有确认：再等一个 ack 超时就放弃
+                    if settled or now - o.stamps["expired"] > self.ack_timeout_s + self.settle_s:
+                        self._finish(o, "failed", error="ack timeout")
+
+    def _run(self) -> None:
+        while True:
+            kind, o = self._submit.get()
+            if kind == "cancel":
+                try:
+                    self.client.cancel(o.order_id)
+                    with self._lock:
+                        o.stamps["cancelled"] = time.perf_counter()
+                    self.log("ORDER_CANCELLED", localId=o.local_id, orderId=o.order_id[-10:])
+                except Exception as e:
+                    self.log("ERR_CANCEL", localId=o.local_id, orderId=o.order_id[-10:], err=str(e))
+                continue
+            self._post(o)
+
+    def _post(self, o: ManagedOrder) -> None:
+        try:
+            self._execute(o)
+        except Exception as e:
+            o.http_status = getattr(e, "status_code", None)
+            with self._lock:
+                self._finish(o, "failed", error=str(e))
+
+    def _execute(self, o: ManagedOrder) -> None:
+        t = o.stamps["queued"]
+        if self.dry_run:
+            t = self._stage(o, "build", t)
+            t = self._stage(o, "sign", t)
+            o.stamps["posted"] = self._stage(o, "post", t)
+            with self._lock:
+                o.state = "posted"
+                o.add_fill(o.size, o.price)
+                self._finish(o, "filled")
+            return
+
+        make_args = self.order_args
+        if make_args is None:
+            from py_clob_client.clob_types import OrderArgs as make_args
+
+        o.state = "building"
+        # 预取 tick size / neg risk / 费率（客户端有缓存），签名阶段只剩纯计算
+        self.client.get_tick_size(o.token_id)
+        self.client.get_neg_risk(o.token_id)
+        self.client.get_fee_rate_bps(o.token_id)
+        args = make_args(token_id=o.token_id, price=o.price, size=o.size, side=o.side)
+        t = self._stage(o, "build", t)
+
+        o.state = "signing"
+        signed = self.client.create_order(args)
+        t = self._stage(o, "sign", t)
+
+        resp = self.client.post_order(signed, self.order_type)
+        o.stamps["posted"] = self._stage(o, "post", t)
+        o.resp = resp if isinstance(resp, dict) else {"raw": resp}
+        self._reconcile_response(o)
+
+    def _reconcile_response(self, o: ManagedOrder) -> None:
+        resp = o.resp or {}
+        with self._lock:
+            o.order_id = str(resp.get("orderID") or resp.get("orderId") or "")
+            if not resp.get("success", True) or resp.get("errorMsg"):
+                self._finish(o, "rejected", error=str(resp.get("errorMsg") or "rejected"))
+                return
+
+            status = str(resp.get("status", "")).lower()
+            making, taking = response_amounts(resp)
+            qty, usdc = (taking, making) if o.side == BUY else (making, taking)
+
+            if status == "matched" and qty > 0:
+                o.add_fill(qty, usdc / qty)
+                self._finish(o, "filled")
+            elif status == "matched":
+                # 成交但未带金额：按下单价视为全部成交（FOK 语义）
+                o.add_fill(o.size, o.price)
+                self._finish(o, "filled")
+            elif status in ("live", "delayed") and o.order_id:
+                o.state = "posted"
+                self._by_order_id[o.order_id] = o
+                for trade in self._early.pop(o.order_id, []):
+                    self._apply_trade(o, *trade)
+            else:
+                self._finish(o, "rejected", error=f"status={status or 'unknown'}")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Fixed-cadence timers on the monotonic clock.
+
+`tick(); sleep(poll)` runs every poll + tick duration, so ticks drift across
+the hour and never line up with the entry-window edge or the market rollover.
+A Timer fires on a grid instead: start, start + p, start + 2p, ... however
+long the work after each firing takes. Firings missed because the loop was
+busy (slow REST call, backoff, suspended host) are skipped, not queued: the
+timer jumps to the next grid point after now and counts what it dropped.
+
+`limit` clamps the next firing to a boundary (entry-window edge, end of the
+market) so a phase change is seen on time; the grid restarts from there.
+The period may change at every firing (fast burst after the open, slow
+while flat outside the entry window, exit-check rate while holding).
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class Timer:
+    period_s: float = 0.0
+    next_at: float = 0.0  # monotonic；0 = 立即触发
+    last_at: float = 0.0
+    fired: int = 0
+    skipped: int = 0
+
+    def due(self, now: float) -> bool:
+        return now >= self.next_at
+
+    def advance(self, now: float, period_s: float, limit: Optional[float] = None) -> int:
+        """Record a firing at `now` and schedule the next one; returns how many grid points were skipped."""
+        self.period_s = period_s
+        base = self.next_at if 0 < self.next_at <= now else now
+        missed = int((now - base) // period_s)
+        nxt = base + (missed + 1) * period_s
+        if limit is not None and limit < nxt:
+            nxt = max(limit, now)
+        self.next_at = nxt
+        self.last_at = now
+        self.fired += 1
+        self.skipped += missed
+        return missed
+
+    def retime(self, period_s: float) -> None:
+        """Switch to a new period without waiting out the old one."""
+        self.period_s = period_s
+        if self.last_at:
+            self.next_at = min(self.next_at, self.last_at + period_s)
+
+    def delay(self, now: float) -> float:
+        return max(0.0, self.next_at - now)
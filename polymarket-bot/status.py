@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Status surface for auto_bot: in-memory state, throttled status file, local endpoint.
+
+The trading loop only marks the status dirty. A writer thread renders the
+snapshot and rewrites the status file at most once per `min_interval_s`, or
+immediately when the health value changes. The same snapshot can be served
+over a tiny HTTP endpoint on TCP ("127.0.0.1:8787") or a Unix socket
+("unix:/run/bot.sock"):
+
+    GET /status   -> status JSON
+    GET /healthz  -> 200 when healthy, 503 otherwise
+"""
+
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+Route = Callable[[], Tuple[int, str, bytes]]
+
+HEALTHY = ("started", "healthy")
+
+
+class RateMeter:
+    """Events per second over a sliding window."""
+
+    def __init__(self, window_s: float = 60.0):
+        self.window_s = window_s
+        self.total = 0
+        self._stamps: Deque[float] = deque()
+
+    def mark(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self.total += 1
+        self._stamps.append(now)
+        cutoff = now - self.window_s
+        while self._stamps and self._stamps[0] < cutoff:
+            self._stamps.popleft()
+
+    def rate(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        stamps = list(self._stamps)
+        recent = [t for t in stamps if t >= now - self.window_s]
+        if len(recent) < 2:
+            return 0.0
+        return (len(recent) - 1) / max(1e-9, recent[-1] - recent[0])
+
+
+class StatusWriter:
+    """Coalesces status updates; writes the file on a background thread."""
+
+    def __init__(
+        self,
+        path: Optional[Path],
+        snapshot: Callable[[], Dict],
+        min_interval_s: float = 10.0,
+        log: Callable[..., None] = lambda event, **kw: None,
+    ):
+        self.path = path
+        self.snapshot = snapshot
+        self.min_interval_s = min_interval_s
+        self.log = log
+        self.writes = 0
+
+        self._dirty = False
+        self._health: Optional[str] = None
+        self._written_health: Optional[str] = None
+        self._urgent = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        if path is not None:
+            self._thread = threading.Thread(target=self._run, name="status-writer", daemon=True)
+            self._thread.start()
+
+    def touch(self, health: str) -> None:
+        """State changed; health changes are written right away, the rest at the bounded rate."""
+        self._dirty = True
+        self._health = health
+        if health != self._written_health:
+            self._urgent.set()
+
+    def flush(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            self._dirty = False
+            health = self._health
+            try:
+                payload = self.snapshot()
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+                tmp.replace(self.path)
+                self._written_health = health
+                self.writes += 1
+            except (OSError, TypeError, ValueError) as e:
+                self.log("ERR_STATUS_WRITE", err=str(e))
+
+    def close(self) -> None:
+        """Stop the writer thread and write the final state synchronously."""
+        self._stop.set()
+        self._urgent.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._dirty:
+            self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._urgent.wait(self.min_interval_s)
+            self._urgent.clear()
+            if self._stop.is_set():
+                break
+            if self._dirty:
+                self.flush()
+
+
+# --- local endpoint ---
+
+
+def _handler(routes: Dict[str, Route]):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            route = routes.get(self.path.split("?", 1)[0])
+            if route is None:
+                code, ctype, body = 404, "text/plain; charset=utf-8", b"not found\n"
+            else:
+                try:
+                    code, ctype, body = route()
+                except Exception as e:
+                    code, ctype, body = 500, "text/plain; charset=utf-8", f"{e}\n".encode()
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass  # 不刷 stdout，访问日志没有意义
+
+    return Handler
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class StatusServer:
+    """Serves `routes` (path -> () -> (code, content type, body)) on TCP or a Unix socket."""
+
+    def __init__(self, addr: str, routes: Dict[str, Route]):
+        self.addr = addr
+        self.routes = routes
+        handler = _handler(routes)
+        if addr.startswith("unix:"):
+            path = addr[len("unix:") :]
+            if os.path.exists(path):
+                os.unlink(path)  # 上次没清理掉的 socket 文件
+            self.server = _UnixHTTPServer(path, handler)
+        else:
+            host, _, port = addr.rpartition(":")
+            self.server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
+            self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="status-server", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.addr.startswith("unix:"):
+            try:
+                os.unlink(self.addr[len("unix:") :])
+            except OSError:
+                pass
+
+
+def json_route(snapshot: Callable[[], Dict]) -> Route:
+    def route():
+        return 200, "application/json", json.dumps(snapshot(), ensure_ascii=False).encode("utf-8")
+
+    return route
+
+
+def health_route(health: Callable[[], Optional[str]]) -> Route:
+    def route():
+        h = health() or "unknown"
+        return (200 if h in HEALTHY else 503), "text/plain; charset=utf-8", f"{h}\n".encode()
+
+    return route
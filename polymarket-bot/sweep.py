@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Parallel parameter sweep for the auto_bot strategy.
+
+Loads the replay data once, places the precomputed columns in one shared
+memory block, and fans the threshold x take-profit x window x order-size grid
+out over a process pool. Workers attach to the block zero-copy, so memory use
+does not grow with the worker count.
+
+    python3 sweep.py logs/ --threshold 0.20:0.45:0.05 --take-profit 0.05,0.1,0.2 \
+        --window 10,20,30 --order-size 25,50 --out data/sweep.csv
+
+Ranges are start:stop:step (inclusive) or comma lists. Ranking: --rank pnl
+(default), drawdown (lowest first), hit_rate, or calmar (pnl / drawdown).
+--engine event replays through the full Bot (needed for depth snapshots);
+its data is shared with fork-started workers copy-on-write.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import backtest
+from backtest import Params, Result
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+RANKS = {
+    "pnl": lambda r: (-r.pnl, r.max_drawdown),
+    "drawdown": lambda r: (r.max_drawdown, -r.pnl),
+    "hit_rate": lambda r: (-(r.hit_rate or 0.0), -r.pnl),
+    "calmar": lambda r: (-(r.pnl / r.max_drawdown if r.max_drawdown > 0 else r.pnl * 1e9), -r.pnl),
+}
+
+TABLE_FIELDS = ("rank", "threshold", "take_profit", "window", "order_size", "trades", "hit_rate", "pnl", "max_drawdown", "final_capital", "open_at_end")
+
+
+def parse_grid(spec: str, cast=float) -> List:
+    """'0.2:0.4:0.05' (inclusive range) or '0.2,0.3'."""
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        if step <= 0:
+            raise ValueError(f"bad step in {spec!r}")
+        n = int(round((stop - start) / step)) + 1
+        return [cast(round(start + i * step, 10)) for i in range(max(0, n))]
+    return [cast(x) for x in spec.split(",") if x.strip()]
+
+
+def build_grid(thresholds, take_profits, windows, sizes, capital: float, settle: str, max_markets: int = 1) -> List[Params]:
+    return [
+        Params(threshold=t, take_profit=tp, window=w, order_size=sz, capital=capital, settle=settle, max_markets=max_markets)
+        for t, tp, w, sz in itertools.product(thresholds, take_profits, windows, sizes)
+    ]
+
+
+# --- shared memory layout ---
+
+
+def share_columns(cols: Dict[str, "np.ndarray"]) -> Tuple[shared_memory.SharedMemory, List[Tuple[str, str, int, int]]]:
+    """Copy the columns into one shared block. Returns (block, [(name, dtype, offset, length)])."""
+    layout = []
+    offset = 0
+    for name, arr in cols.items():
+        offset = (offset + 63) // 64 * 64  # 对齐到 cache line
+        layout.append((name, arr.dtype.str, offset, len(arr)))
+        offset += arr.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(1, offset))
+    for (name, dtype, off, n), arr in zip(layout, cols.values()):
+        np.ndarray((n,), dtype=dtype, buffer=shm.buf, offset=off)[:] = arr
+    return shm, layout
+
+
+def attach_columns(shm: shared_memory.SharedMemory, layout) -> Dict[str, "np.ndarray"]:
+    cols = {}
+    for name, dtype, off, n in layout:
+        a = np.ndarray((n,), dtype=dtype, buffer=shm.buf, offset=off)
+        a.flags.writeable = False
+        cols[name] = a
+    return cols
+
+
+# --- workers ---
+
+_DATA: Optional["backtest.VectorData"] = None
+_SHM: Optional[shared_memory.SharedMemory] = None
+_TICKS: Optional["backtest.Ticks"] = None
+
+
+def _init_vector(name: str, layout) -> None:
+    global _DATA, _SHM
+    _SHM = shared_memory.SharedMemory(name=name)
+    _DATA = backtest.VectorData(attach_columns(_SHM, layout))
+
+
+def _run_vector(params: Params) -> Result:
+    return backtest.simulate_vector(_DATA, params)
+
+
+def _run_event(params: Params) -> Result:
+    return backtest.replay(_TICKS, params)
+
+
+def run_sweep(ticks: "backtest.Ticks", grid: Sequence[Params], engine: str = "vector", workers: int = 0) -> List[Result]:
+    global _TICKS
+    workers = workers or os.cpu_count() or 1
+    chunk = max(1, len(grid) // (workers * 8))
+
+    if engine == "event":
+        # fork 启动的子进程直接继承 _TICKS（写时复制，不序列化）
+        _TICKS = ticks
+        if workers == 1 or len(grid) == 1:
+            return [_run_event(p) for p in grid]
+        ctx = mp.get_context("fork")
+        with ctx.Pool(workers) as pool:
+            return list(pool.imap_unordered(_run_event, grid, chunksize=chunk))
+
+    data = backtest.VectorData.from_ticks(ticks)
+    if workers == 1 or len(grid) == 1:
+        return [backtest.simulate_vector(data, p) for p in grid]
+    shm, layout = share_columns(data.columns())
+    del data
+    try:
+        with mp.get_context().Pool(workers, initializer=_init_vector, initargs=(shm.name, layout)) as pool:
+            return list(pool.imap_unordered(_run_vector, grid, chunksize=chunk))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def rank(results: List[Result], by: str) -> List[Result]:
+    return sorted(results, key=RANKS[by])
+
+
+def table_rows(results: Sequence[Result]) -> List[Dict]:
+    rows = []
+    for i, r in enumerate(results, 1):
+        p = r.params
+        rows.append(
+            {
+                "rank": i,
+                "threshold": p.threshold,
+                "take_profit": p.take_profit,
+                "window": p.window,
+                "order_size": p.order_size,
+                "trades": r.trades,
+                "hit_rate": round(r.hit_rate, 4) if r.hit_rate is not None else "",
+                "pnl": round(r.pnl, 4),
+                "max_drawdown": round(r.max_drawdown, 4),
+                "final_capital": round(r.final_capital, 4),
+                "open_at_end": r.open_at_end,
+            }
+        )
+    return rows
+
+
+def write_csv(path: str, rows: List[Dict]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=TABLE_FIELDS)
+        w.writeheader()
+        w.writerows(rows)
+    os.replace(tmp, path)
+
+
+def format_table(rows: List[Dict]) -> str:
+    if not rows:
+        return "(no results)"
+    widths = {k: max(len(k), *(len(str(r[k])) for r in rows)) for k in TABLE_FIELDS}
+    lines = ["  ".join(k.rjust(widths[k]) for k in TABLE_FIELDS)]
+    for r in rows:
+        lines.append("  ".join(str(r[k]).rjust(widths[k]) for k in TABLE_FIELDS))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Grid-search auto_bot strategy parameters over replay data")
+    ap.add_argument("logs", nargs="?", help="auto_bot.log file or log directory (rotations included)")
+    ap.add_argument("--log-name", default="auto_bot.log")
+    ap.add_argument("--snapshots", help="order-book snapshot JSONL (requires --engine event)")
+    ap.add_argument("--recording", help="tick_recorder segment directory (TICK_RECORD_DIR)")
+    ap.add_argument("--engine", choices=["vector", "event"], default="vector")
+    ap.add_argument("--threshold", default="0.20:0.45:0.05")
+    ap.add_argument("--take-profit", default="0.05,0.10,0.15,0.20,0.30")
+    ap.add_argument("--window", default="10,20,30,40")
+    ap.add_argument("--order-size", default="50")
+    ap.add_argument("--capital", type=float, default=500.0)
+    ap.add_argument("--settle", choices=["bid", "resolve"], default="bid")
+    ap.add_argument("--max-markets", type=int, default=1, help="positions held at once across markets (MAX_MARKETS)")
+    ap.add_argument("--workers", type=int, default=0, help="processes (0 = all cores)")
+    ap.add_argument("--rank", choices=sorted(RANKS), default="pnl")
+    ap.add_argument("--top", type=int, default=20, help="rows to print")
+    ap.add_argument("--out", help="write the full ranked table as CSV")
+    args = ap.parse_args(argv)
+
+    if args.engine == "vector" and np is None:
+        ap.error("--engine vector needs numpy (pip install numpy)")
+    if args.engine == "vector" and args.snapshots:
+        ap.error("depth snapshots need --engine event")
+
+    try:
+        grid = build_grid(
+            parse_grid(args.threshold),
+            parse_grid(args.take_profit),
+            parse_grid(args.window, cast=lambda x: int(float(x))),
+            parse_grid(args.order_size),
+            args.capital,
+            args.settle,
+            args.max_markets,
+        )
+    except ValueError as e:
+        ap.error(str(e))
+
+    t0 = time.perf_counter()
+    ticks = backtest.load_ticks(args)
+    load_s = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    results = rank(run_sweep(ticks, grid, engine=args.engine, workers=args.workers), args.rank)
+    sweep_s = time.perf_counter() - t1
+
+    rows = table_rows(results)
+    if args.out:
+        write_csv(args.out, rows)
+    print(format_table(rows[: args.top]))
+    print(
+        json.dumps(
+            {
+                "ok": True,
+                "engine": args.engine,
+                "ticks": len(ticks),
+                "configs": len(grid),
+                "loadS": round(load_s, 3),
+                "sweepS": round(sweep_s, 3),
+                "rankedBy": args.rank,
+                "out": args.out,
+            }
+        ),
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
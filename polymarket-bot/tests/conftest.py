@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# 脚本都在仓库根目录，按脚本方式 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_clob import FakeExchange, serve  # noqa: E402
+
+
+@pytest.fixture
+def fake_clob():
+    """Start fake_clob in-process on a free port: start(**FakeExchange kw) -> (http url, exchange)."""
+    servers = []
+
+    def start(step_ms: int = 3_600_000, ws_drop_s: float = 0.0, **kw):
+        ex = FakeExchange(**kw)
+        srv = serve(0, ex, step_ms, ws_drop_s)
+        servers.append(srv)
+        return f"http://127.0.0.1:{srv.server_address[1]}", ex
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
@@ -0,0 +1,93 @@
+import math
+
+import pytest
+
+from backtest import Params, Ticks, VectorData, replay, simulate_vector
+
+T0 = 1782864000.0  # 整点
+
+
+def dip(k: int) -> float:
+    """Ask path: dips under 0.35 a couple of minutes in, then recovers past take-profit."""
+    return round(0.45 - 0.15 * math.exp(-(((k - 20) / 6) ** 2)) + 0.05 * k / 119, 2)
+
+
+def make_ticks(questions, rows: int = 120) -> Ticks:
+    ticks = Ticks()
+    qidx = {}
+    for k in range(rows):
+        for q in questions:
+            a = dip(k)
+            b = round(a - 0.02, 2)
+            ticks.append(T0 + k * 5, q, (a, b), (round(1.02 - b, 2), round(1 - a, 2)), qidx)
+    return ticks
+
+
+def params(**kw) -> Params:
+    base = dict(threshold=0.35, take_profit=0.3, window=30, order_size=10.0)
+    base.update(kw)
+    return Params(**base)
+
+
+def key(r):
+    return (r.trades, r.wins, round(r.pnl, 6), round(r.final_capital, 6), r.open_at_end)
+
+
+@pytest.fixture
+def single():
+    return make_ticks(["Bitcoin Up or Down 1h"])
+
+
+@pytest.fixture
+def interleaved():
+    # MAX_MARKETS=2 的日志：每个 tick 两个盘各一条 TICK
+    return make_ticks(["Bitcoin Up or Down 1h", "Ethereum Up or Down 1h"])
+
+
+def test_interleaved_markets_trade_independently(single, interleaved):
+    one = replay(single, params())
+    assert (one.trades, one.wins) == (1, 1)
+    assert one.pnl > 0
+
+    two = replay(interleaved, params(max_markets=2))
+    assert (two.trades, two.wins) == (2, 2)
+    assert two.pnl == pytest.approx(2 * one.pnl)
+    assert not two.open_at_end
+
+
+def test_interleaved_position_cap(single, interleaved):
+    # 持仓数上限 1：第二个盘在第一个持仓期间不开仓
+    capped = replay(interleaved, params(max_markets=1))
+    assert key(capped) == key(replay(single, params()))
+
+
+@pytest.mark.parametrize("max_markets", [1, 2])
+def test_vector_engine_matches_event_engine(interleaved, max_markets):
+    p = params(max_markets=max_markets)
+    assert key(simulate_vector(VectorData.from_ticks(interleaved), p)) == key(replay(interleaved, p))
+
+
+def test_market_settles_at_its_last_tick_once_a_later_market_started():
+    # 第一个盘开仓后没到止盈就结束，下一个盘开始：按该盘最后买一价结算
+    ticks = Ticks()
+    qidx = {}
+    for k in range(10):
+        ticks.append(T0 + k * 5, "Bitcoin Up or Down 1h - 1", (0.30, 0.28), (0.72, 0.70), qidx)
+    for k in range(10, 20):
+        ticks.append(T0 + k * 5, "Bitcoin Up or Down 1h - 2", (0.60, 0.58), (0.42, 0.40), qidx)
+    p = params(max_markets=2)
+    r = replay(ticks, p)
+    assert r.trades == 1
+    assert not r.open_at_end
+    qty = 33.33  # 10 USDC / 0.30，按下单精度向下取整
+    assert r.realized == pytest.approx(qty * 0.28 - qty * 0.30)
+    assert key(simulate_vector(VectorData.from_ticks(ticks), p)) == key(r)
+
+
+def test_markets_live_at_end_keep_positions(interleaved):
+    # 数据结束时两个盘都还在交易：不结算，记未实现盈亏
+    p = params(take_profit=5.0, max_markets=2)
+    r = replay(interleaved, p)
+    assert r.trades == 0
+    assert r.open_at_end
+    assert key(simulate_vector(VectorData.from_ticks(interleaved), p)) == key(r)
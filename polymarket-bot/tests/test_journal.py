@@ -0,0 +1,30 @@
+import pytest
+
+from journal import Journal
+
+DRY = {"dryRun": True, "funder": ""}
+LIVE = {"dryRun": False, "funder": ""}
+MARKET = {"condition_id": "c1", "question": "q", "up_token": "u", "down_token": "d", "end_ts": 0.0}
+POSITION = {"side": "UP", "token_id": "u", "entry_price": 0.3, "size_usdc": 9.0, "qty": 30.0, "opened_at": ""}
+
+
+def test_restores_its_own_journal(tmp_path):
+    j = Journal(tmp_path / "journal.jsonl", fsync=False, meta=LIVE)
+    j.append("open", market=MARKET, position=POSITION, capital=491.0, realizedPnl=0.0)
+    j.close()
+    state = Journal(tmp_path / "journal.jsonl", fsync=False, meta=LIVE).load()
+    assert state.capital == 491.0
+    assert list(state.positions) == ["c1"]
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_refuses_journal_written_in_another_mode(tmp_path, snapshot):
+    j = Journal(tmp_path / "journal.jsonl", fsync=False, meta=DRY)
+    j.append("open", market=MARKET, position=POSITION, capital=491.0, realizedPnl=0.0)
+    if snapshot:
+        j.snapshot(491.0, 0.0, {"c1": {"market": MARKET, "position": POSITION}})
+    j.close()
+    with pytest.raises(RuntimeError, match="written with"):
+        Journal(tmp_path / "journal.jsonl", fsync=False, meta=LIVE).load()
+    with pytest.raises(RuntimeError, match="written with"):
+        Journal(tmp_path / "journal.jsonl", fsync=False, meta={"dryRun": True, "funder": "0xabc"}).load()
@@ -0,0 +1,124 @@
+import time
+
+import pytest
+
+from market_feed import MarketFeed
+
+pytest.importorskip("websocket")
+
+
+def wait_until(cond, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        got = cond()
+        if got:
+            return got
+        time.sleep(0.02)
+    raise AssertionError("timed out")
+
+
+def levels(book: dict, key: str):
+    rows = sorted(((float(r["price"]), float(r["size"])) for r in book[key]), reverse=(key == "bids"))
+    return rows
+
+
+def same_book(feed: MarketFeed, ex, token: str) -> bool:
+    want = ex.book(token)
+    got = feed.book(token)
+    return got is not None and got.levels("BUY", 50) == levels(want, "bids") and got.levels("SELL", 50) == levels(want, "asks")
+
+
+@pytest.fixture
+def market_feed(fake_clob):
+    feeds = []
+
+    def start(**kw):
+        url, ex = fake_clob(**kw)
+        logs = []
+        feed = MarketFeed(url.replace("http", "ws") + "/ws/market", log=lambda event, **k: logs.append(event))
+        feed.subscribe([ex.up, ex.down])
+        feed.start()
+        feeds.append(feed)
+        wait_until(lambda: feed.tops([ex.up, ex.down]))
+        return feed, ex, logs
+
+    yield start
+    for feed in feeds:
+        feed.stop()
+
+
+def test_snapshot_then_price_changes(market_feed):
+    feed, ex, _ = market_feed()
+    assert same_book(feed, ex, ex.up) and same_book(feed, ex, ex.down)
+
+    feed.drain()
+    for _ in range(5):
+        ex.step()
+    wait_until(lambda: same_book(feed, ex, ex.up) and same_book(feed, ex, ex.down))
+    assert feed.drain() == {ex.up, ex.down}
+    ask, bid = feed.tops([ex.up])[ex.up]
+    assert ask == min(float(p) for p in ex.books[ex.up]["asks"])
+    assert bid == max(float(p) for p in ex.books[ex.up]["bids"])
+
+
+def test_malformed_change_is_skipped_without_reconnecting(market_feed):
+    feed, ex, logs = market_feed()
+    price = min(ex.books[ex.up]["asks"], key=float)
+    ex.publish(
+        {
+            "event_type": "price_change",
+            "market": ex.condition_id,
+            "price_changes": [
+                {"asset_id": ex.up, "price": "n/a", "size": "10", "side": "SELL"},
+                {"asset_id": ex.up, "price": price, "side": "SELL"},
+                {"asset_id": ex.up, "price": price, "size": "777", "side": "SELL"},
+            ],
+        }
+    )
+    wait_until(lambda: feed.book(ex.up).depth_at("SELL", float(price)) == 777)
+    assert feed.bad_changes == 2
+    assert logs.count("WS_BAD_CHANGE") == 2
+    assert logs.count("WS_UP") == 1
+    assert feed.live()
+
+
+def test_bot_falls_back_to_rest_while_the_stream_is_down(fake_clob, tmp_path, monkeypatch):
+    pytest.importorskip("py_clob_client")
+    import auto_bot
+
+    url, ex = fake_clob(step_ms=200, ws_drop_s=1.5)
+    env = {
+        "CLOB_BASE_URL": url,
+        "POLY_PRIVATE_KEY": "0x" + "11" * 32,
+        "DRY_RUN": "true",
+        "MARKET_DATA_MODE": "ws",
+        "MARKET_WS_URL": url.replace("http", "ws") + "/ws/market",
+        "LOG_DIR": str(tmp_path / "logs"),
+        "MARKET_INDEX_FILE": str(tmp_path / "market_index.json"),
+        "JOURNAL_FILE": "",
+        "API_CREDS_CACHE": "",
+        "STATUS_HTTP": "",
+        "TICK_RECORD_DIR": "",
+    }
+    for k, v in env.items():
+        monkeypatch.setenv(k, v)
+    bot = auto_bot.Bot()
+    try:
+        wait_until(lambda: bot.discovery.selection and bot.client.ready)
+        bot.tick()
+        slot = wait_until(lambda: next(iter(bot.slots.values()), None))
+        wait_until(lambda: bot.feed.tops(list(slot.tokens)))
+        srcs = []
+        deadline = time.time() + 8
+        # 会话每 1.5 秒被服务端断开一次：重连前的间隙走 REST，重连后回到推送
+        while time.time() < deadline and srcs[-3:] != ["ws", "rest", "ws"]:
+            up, down, src = bot.current_prices([slot])[slot.key]
+            assert up and down
+            if not srcs or srcs[-1] != src:
+                srcs.append(src)
+            time.sleep(0.05)
+        assert srcs[-3:] == ["ws", "rest", "ws"]
+    finally:
+        bot.feed.stop()
+        bot.discovery.stop()
+        bot.shutdown()
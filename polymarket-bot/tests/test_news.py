@@ -0,0 +1,43 @@
+from news_whitelist_fetcher import RawItem, apply_confidence
+
+SOURCES = {"Reuters": "https://reuters.com/a", "Bloomberg": "https://bloomberg.com/a", "FT": "https://ft.com/a"}
+
+
+def item(title, source):
+    return RawItem(title, f"{SOURCES[source]}/{len(title)}", source, "macro", "2026-10-17T00:00:00+00:00", 0.6)
+
+
+def verified(items, similarity):
+    return {x["title"]: x["meta"]["crossVerified"] for x in apply_confidence(items, similarity=similarity)}
+
+
+def test_titles_with_different_numbers_never_match():
+    items = [
+        item("Fed raises rates by 25bp in surprise move 1", "Reuters"),
+        item("Fed raises rates by 25bp in surprise move 8", "Bloomberg"),
+        item("Fed raises rates by 50bp in surprise move 1", "FT"),
+    ]
+    for similarity in (0, 0.7):
+        assert not any(verified(items, similarity).values())
+
+
+def test_exact_key_only_by_default():
+    items = [
+        item("Treasury yields jump as payrolls beat forecasts sharply", "Reuters"),
+        item("Treasury yields jump as payrolls beat forecasts strongly", "Bloomberg"),
+    ]
+    assert not any(verified(items, 0).values())
+    assert all(verified(items, 0.7).values())
+
+
+def test_cross_verified_per_item_not_per_cluster():
+    a = "alpha bravo charlie delta echo foxtrot golf hotel"
+    b = "alpha bravo charlie delta echo foxtrot golf india"  # ~a，不像 c
+    c = "bravo charlie delta echo foxtrot golf hotel juliet"  # ~a，不像 b
+    items = [item(a, "Reuters"), item(b, "Bloomberg"), item(c, "Reuters")]
+    out = {x["title"]: x for x in apply_confidence(items, similarity=0.7)}
+    assert out[a]["meta"]["crossVerified"] and out[b]["meta"]["crossVerified"]
+    # c 只和同源的 a 相似：b 是 a 的近似，不是 c 的
+    assert not out[c]["meta"]["crossVerified"]
+    assert out[c]["meta"]["topicPeerCount"] == 2
+    assert out[c]["meta"]["distinctSources"] == 1
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+from orders import BUY, FAK, FOK, STAGES, OrderManager, response_amounts
+
+pytest.importorskip("py_clob_client")
+
+KEY = "0x" + "11" * 32
+
+
+def clob_client(url: str):
+    from py_clob_client.client import ClobClient
+
+    client = ClobClient(url, chain_id=137, key=KEY, signature_type=0)
+    client.set_api_creds(client.create_or_derive_api_creds())
+    return client
+
+
+def wait_until(cond, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        got = cond()
+        if got:
+            return got
+        time.sleep(0.02)
+    raise AssertionError("timed out")
+
+
+def run_order(om: OrderManager, token: str, price: float, size: float):
+    o = om.submit(BUY, token, price, size, "test", "open")
+    done = wait_until(om.poll)
+    assert done == [o]
+    return o
+
+
+def test_fok_full_fill_from_post_response(fake_clob):
+    url, ex = fake_clob()
+    om = OrderManager(clob_client(url), dry_run=False, order_type=FOK)
+    o = run_order(om, ex.up, 0.51, 10)
+    assert o.state == "filled"
+    assert o.order_id
+    assert o.filled_qty == pytest.approx(10)
+    assert o.avg_price == pytest.approx(0.51)
+    assert o.resp["status"] == "matched"
+
+
+def test_fak_partial_fill(fake_clob):
+    url, ex = fake_clob(max_fill=4)
+    om = OrderManager(clob_client(url), dry_run=False, order_type=FAK)
+    o = run_order(om, ex.up, 0.51, 10)
+    assert o.state == "partial"
+    assert o.filled_qty == pytest.approx(4)
+    assert o.filled_notional == pytest.approx(4 * 0.51)
+
+
+def test_fok_rejected_when_not_fully_fillable(fake_clob):
+    url, ex = fake_clob(max_fill=4)
+    om = OrderManager(clob_client(url), dry_run=False, order_type=FOK)
+    o = run_order(om, ex.up, 0.51, 10)
+    assert o.state == "rejected"
+    assert o.filled_qty == 0
+    assert "fully filled" in o.error
+
+
+def test_delayed_fill_reconciled_from_user_stream(fake_clob):
+    from market_feed import UserFeed
+
+    url, ex = fake_clob(fill_delay_ms=200)
+    client = clob_client(url)
+    logs = []
+    om = OrderManager(client, dry_run=False, order_type=FOK, log=lambda event, **kw: logs.append(event))
+    feed = UserFeed(url.replace("http", "ws") + "/ws/user", client.creds, om.on_trade)
+    feed.subscribe([ex.condition_id])
+    feed.start()
+    try:
+        wait_until(lambda: ex.user_subscribers)
+        # 畸形的成交推送只跳过，不断开用户频道
+        ex.publish_user({"event_type": "trade", "id": "bad", "status": "MATCHED", "taker_order_id": "0x1", "size": "n/a", "maker_orders": [None]})
+        wait_until(lambda: om.bad_trades == 2)
+
+        o = run_order(om, ex.up, 0.51, 10)
+        assert o.resp["status"] == "delayed"
+        assert o.state == "filled"
+        assert o.filled_qty == pytest.approx(10)
+        assert "ORDER_TRADE" in logs
+        assert feed.connected
+    finally:
+        feed.stop()
+
+
+def test_stage_latency_histograms(fake_clob):
+    url, ex = fake_clob()
+    om = OrderManager(clob_client(url), dry_run=False, order_type=FOK)
+    for _ in range(3):
+        o = run_order(om, ex.up, 0.51, 5)
+        assert set(STAGES) <= set(o.stamps)
+    stats = om.stats()
+    for stage in STAGES:
+        assert stats[stage]["count"] == 3
+        assert stats[stage]["maxMs"] >= 0
+    # 各阶段按时间先后打点
+    assert o.stamps["queued"] <= o.stamps["build"] <= o.stamps["sign"] <= o.stamps["post"] <= o.stamps["ack"]
+
+
+def test_response_amount_units():
+    # 十进制字符串按原值；JSON 整数是 6 位小数的最小单位，不论大小
+    assert response_amounts({"makingAmount": "0.5", "takingAmount": "1"}) == (0.5, 1.0)
+    assert response_amounts({"makingAmount": 500000, "takingAmount": 1000000}) == (0.5, 1.0)
+    assert response_amounts({"makingAmount": "", "takingAmount": ""}) == (0.0, 0.0)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Compact binary tick recorder (fixed-width records, one segment per UTC hour).
+
+Each tick is one record holding the top `levels` of both Up and Down books:
+
+    ts f8 | market u2 | flags u2 | pad u4
+    per token (up, down): bid_px u2[L] | ask_px u2[L] | bid_sz f4[L] | ask_sz f4[L]
+
+Prices are stored in 1e-4 units (0 = empty level), levels best first. A
+segment is a 64-byte header followed by records, so it can be memory-mapped
+directly (np.memmap with record_dtype(L), offset=HEADER_SIZE). Market names
+and token ids live in a `<segment>.markets.json` sidecar indexed by `market`.
+
+    python3 tick_recorder.py info data/ticks
+    python3 tick_recorder.py dump data/ticks --start 2026-07-01T10:00 --limit 5
+"""
+
+import argparse
+import json
+import mmap
+import struct
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+MAGIC = b"PMTK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+HEADER_SIZE = 64
+PRICE_SCALE = 10_000
+FLAG_WS = 1
+
+Levels = Sequence[Tuple[float, float]]
+
+
+def record_struct(levels: int) -> struct.Struct:
+    side = f"{levels}H{levels}H{levels}f{levels}f"
+    return struct.Struct("<dHHI" + side + side)
+
+
+def record_dtype(levels: int):
+    """NumPy dtype of one record (for np.memmap / np.frombuffer)."""
+    side = [("bid_px", "<u2", (levels,)), ("ask_px", "<u2", (levels,)), ("bid_sz", "<f4", (levels,)), ("ask_sz", "<f4", (levels,))]
+    return np.dtype(
+        [("ts", "<f8"), ("market", "<u2"), ("flags", "<u2"), ("pad", "<u4")]
+        + [("up_" + n, t, s) for n, t, s in side]
+        + [("down_" + n, t, s) for n, t, s in side]
+    )
+
+
+def segment_name(ts: float, levels: int) -> str:
+    return f"ticks-{datetime.fromtimestamp(ts, timezone.utc):%Y%m%d-%H}.L{levels}.bin"
+
+
+def _pack_side(levels: Levels, n: int) -> Tuple[List[int], List[float]]:
+    px = [0] * n
+    sz = [0.0] * n
+    for i, (p, s) in enumerate(levels[:n]):
+        px[i] = int(round(p * PRICE_SCALE))
+        sz[i] = s
+    return px, sz
+
+
+class TickRecorder:
+    """Appends fixed-width book records; buffered, rotated at the top of each UTC hour."""
+
+    def __init__(self, directory: Path, levels: int = 10, flush_s: float = 1.0, max_buffer: int = 256):
+        self.directory = Path(directory)
+        self.levels = max(1, min(levels, 64))
+        self.flush_s = flush_s
+        self.max_buffer = max_buffer
+        self.rec = record_struct(self.levels)
+
+        self._hour: Optional[int] = None
+        self._f = None
+        self._path: Optional[Path] = None
+        self._markets: List[Dict] = []
+        self._market_idx: Dict[str, int] = {}
+        self._buf = bytearray()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    # --- segment management ---
+
+    def _open(self, ts: float) -> None:
+        self.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._hour = int(ts // 3600)
+        self._path = self.directory / segment_name(ts, self.levels)
+        exists = self._path.exists() and self._path.stat().st_size >= HEADER_SIZE
+        self._f = open(self._path, "r+b" if exists else "wb")
+        if exists:
+            # 重启续写：丢掉崩溃时写了一半的尾记录
+            size = self._path.stat().st_size
+            whole = HEADER_SIZE + (size - HEADER_SIZE) // self.rec.size * self.rec.size
+            if whole != size:
+                self._f.truncate(whole)
+            self._f.seek(whole)
+        else:
+            self._f.write(HEADER.pack(MAGIC, VERSION, self.levels, self.rec.size).ljust(HEADER_SIZE, b"\0"))
+        self._markets, self._market_idx = [], {}
+        side = self._sidecar()
+        if exists and side.exists():
+            try:
+                self._markets = json.loads(side.read_text(encoding="utf-8"))
+                self._market_idx = {m["question"]: i for i, m in enumerate(self._markets)}
+            except (OSError, ValueError, KeyError, TypeError):
+                self._markets, self._market_idx = [], {}
+
+    def _sidecar(self) -> Path:
+        return self._path.with_name(self._path.name + ".markets.json")
+
+    def _market(self, question: str, up_token: str, down_token: str) -> int:
+        idx = self._market_idx.get(question)
+        if idx is None:
+            idx = self._market_idx[question] = len(self._markets)
+            self._markets.append({"question": question, "up": up_token, "down": down_token})
+            side = self._sidecar()
+            tmp = side.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._markets, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(side)
+        return idx
+
+    # --- writing ---
+
+    def record(self, ts: float, question: str, up_token: str, down_token: str, up, down, ws: bool = False) -> None:
+        """Append one tick. `up` / `down` are OrderBooks (or None for an empty book)."""
+        if self._f is None or int(ts // 3600) != self._hour:
+            self._open(ts)
+        n = self.levels
+        fields = [ts, self._market(question, up_token, down_token), FLAG_WS if ws else 0, 0]
+        for book in (up, down):
+            bpx, bsz = _pack_side(book.levels("BUY", n) if book is not None else (), n)
+            apx, asz = _pack_side(book.levels("SELL", n) if book is not None else (), n)
+            fields += bpx + apx + bsz + asz
+        self._buf += self.rec.pack(*fields)
+        self._pending += 1
+        if self._pending >= self.max_buffer or time.monotonic() - self._last_flush >= self.flush_s:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._f is not None and self._buf:
+            self._f.write(self._buf)
+            self._f.flush()
+        self._buf = bytearray()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if self._f is not None:
+            self.flush()
+            self._f.close()
+            self._f = None
+
+
+# --- reading ---
+
+
+class Segment:
+    """One recorded hour. `records` is a read-only np.memmap when NumPy is available."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            magic, version, levels, rec_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path}: not a tick segment")
+        self.levels = levels
+        self.rec = record_struct(levels)
+        if rec_size != self.rec.size:
+            raise ValueError(f"{self.path}: record size {rec_size} != {self.rec.size}")
+        size = self.path.stat().st_size
+        self.count = max(0, (size - HEADER_SIZE) // self.rec.size)
+        side = self.path.with_name(self.path.name + ".markets.json")
+        try:
+            self.markets: List[Dict] = json.loads(side.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.markets = []
+        self._mm: Optional[mmap.mmap] = None
+        self.records = None
+        if np is not None and self.count:
+            self.records = np.memmap(self.path, dtype=record_dtype(levels), mode="r", offset=HEADER_SIZE, shape=(self.count,))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def question(self, market: int) -> str:
+        return self.markets[market]["question"] if market < len(self.markets) else f"market-{market}"
+
+    def _map(self) -> mmap.mmap:
+        if self._mm is None:
+            with open(self.path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), HEADER_SIZE + self.count * self.rec.size, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def raw(self, i: int) -> tuple:
+        """Record i as a flat tuple in record_struct order (stdlib only)."""
+        return self.rec.unpack_from(self._map(), HEADER_SIZE + i * self.rec.size)
+
+    def iter_raw(self, start: int = 0, stop: Optional[int] = None) -> Iterator[tuple]:
+        stop = self.count if stop is None else min(stop, self.count)
+        for i in range(start, stop):
+            yield self.raw(i)
+
+    def index_at(self, ts: float) -> int:
+        """First record with timestamp >= ts (records are appended in time order)."""
+        if self.records is not None:
+            return int(np.searchsorted(self.records["ts"], ts))
+        lo, hi = 0, self.count
+        if not hi:
+            return 0
+        mm = self._map()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from("<d", mm, HEADER_SIZE + mid * self.rec.size)[0] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def books(self, raw: tuple) -> Tuple[Tuple[list, list], Tuple[list, list]]:
+        """((up_bids, up_asks), (down_bids, down_asks)) as (price, size) lists, best first."""
+        n = self.levels
+        out = []
+        pos = 4
+        for _ in range(2):
+            bpx, apx = raw[pos : pos + n], raw[pos + n : pos + 2 * n]
+            bsz, asz = raw[pos + 2 * n : pos + 3 * n], raw[pos + 3 * n : pos + 4 * n]
+            pos += 4 * n
+            out.append(
+                (
+                    [(p / PRICE_SCALE, s) for p, s in zip(bpx, bsz) if p],
+                    [(p / PRICE_SCALE, s) for p, s in zip(apx, asz) if p],
+                )
+            )
+        return out[0], out[1]
+
+    def snapshot(self, raw: tuple) -> Dict:
+        """A raw record as the backtest snapshot dict."""
+        out = {"ts": raw[0], "question": self.question(raw[1]), "src": "ws" if raw[2] & FLAG_WS else "rest"}
+        for key, (bids, asks) in zip(("up", "down"), self.books(raw)):
+            out[key] = {"bids": [[p, round(s, 6)] for p, s in bids], "asks": [[p, round(s, 6)] for p, s in asks]}
+        return out
+
+
+def segments(directory: Path, start: Optional[float] = None, end: Optional[float] = None) -> List[Segment]:
+    """Segments under `directory` overlapping [start, end], oldest first."""
+    out = []
+    for p in sorted(Path(directory).glob("ticks-*.bin")):
+        try:
+            hour = datetime.strptime(p.name[6:17], "%Y%m%d-%H").replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            continue
+        if (end is not None and hour > end) or (start is not None and hour + 3600 <= start):
+            continue
+        try:
+            out.append(Segment(p))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def _parse_when(v: Optional[str]) -> Optional[float]:
+    if not v:
+        return None
+    try:
+        return float(v)
+    except ValueError:
+        dt = datetime.fromisoformat(v.replace("Z", "+00:00"))
+        return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Inspect recorded tick segments")
+    ap.add_argument("cmd", choices=["info", "dump"])
+    ap.add_argument("dir")
+    ap.add_argument("--start", help="ISO time or epoch seconds (UTC)")
+    ap.add_argument("--end", help="ISO time or epoch seconds (UTC)")
+    ap.add_argument("--limit", type=int, default=0, help="dump: max records (0 = all)")
+    args = ap.parse_args(argv)
+
+    start, end = _parse_when(args.start), _parse_when(args.end)
+    segs = segments(Path(args.dir), start, end)
+    if args.cmd == "info":
+        for s in segs:
+            print(
+                json.dumps(
+                    {
+                        "segment": s.path.name,
+                        "records": len(s),
+                        "levels": s.levels,
+                        "recordBytes": s.rec.size,
+                        "markets": [m.get("question") for m in s.markets],
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        return 0
+
+    # dump: 输出 backtest.py --snapshots 可直接读的 JSONL
+    left = args.limit or None
+    for s in segs:
+        i = s.index_at(start) if start is not None else 0
+        for raw in s.iter_raw(i):
+            if end is not None and raw[0] > end:
+                return 0
+            sys.stdout.write(json.dumps(s.snapshot(raw), ensure_ascii=False) + "\n")
+            if left is not None:
+                left -= 1
+                if left <= 0:
+                    return 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
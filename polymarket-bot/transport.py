@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+HTTP transport for CLOB REST calls: pooled keep-alive connections, per-endpoint
+timeouts, token-bucket rate limiting, 429 cooldown and a circuit breaker.
+
+py_clob_client sends every request through one module-level httpx client;
+install() swaps in a client built on ClobTransport, so calls from any thread
+(trading loop, discovery, order pipeline) share the pool, the bucket and the
+breaker without changing ClobClient itself.
+
+Breaker states: closed -> open after `fail_threshold` consecutive failures
+(transport errors, 429, 5xx) -> half_open after `cooldown_s` (one probe
+request) -> closed on success / open again on failure. While open, requests
+fail fast with CircuitOpen (an httpx.TransportError, so py_clob_client reports
+it like any other request error). Order placement / cancellation has its own
+breaker: failing book or market reads must not block the orders that close
+open positions.
+"""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+import httpx
+
+DEFAULT_TIMEOUTS = {
+    "book": 2.0,
+    "books": 3.0,
+    "markets": 10.0,
+    "order": 5.0,
+}
+
+# 下单 / 撤单：不排队等令牌（限速只约束看价 / 发现这类可延后的请求），走单独的熔断器
+ORDER_ENDPOINTS = ("order", "orders", "cancel-all", "cancel-market-orders")
+
+
+class CircuitOpen(httpx.TransportError):
+    pass
+
+
+def parse_timeouts(spec: str) -> Dict[str, float]:
+    """'book=2,markets=10' -> {'book': 2.0, 'markets': 10.0}."""
+    out = {}
+    for part in spec.split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip().strip("/")] = float(v)
+    return out
+
+
+def endpoint_of(path: str) -> str:
+    return path.strip("/").split("/", 1)[0] or "/"
+
+
+def retry_after_s(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """`rate` tokens/s, up to `burst`. reserve() takes a token and returns how long to wait for it."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        """Hold all throttled requests for `seconds` (429 Retry-After)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    def __init__(self, fail_threshold: int = 5, cooldown_s: float = 30.0, on_change: Callable[[str, str], None] = lambda old, new: None):
+        self.fail_threshold = max(1, fail_threshold)
+        self.cooldown_s = cooldown_s
+        self.on_change = on_change
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe = False
+        self._lock = threading.Lock()
+
+    def _set(self, state: str) -> None:
+        old, self.state = self.state, state
+        if old != state:
+            self.on_change(old, state)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_s:
+                self._set("half_open")
+                self._probe = False
+            if self.state == "half_open" and not self._probe:
+                self._probe = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probe = False
+            self._set("closed")
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe = False
+            if self.state == "half_open" or self.failures >= self.fail_threshold:
+                self.opened_at = time.monotonic()
+                self._set("open")
+
+    def remaining_s(self) -> float:
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.cooldown_s - (time.monotonic() - self.opened_at))
+
+
+class ClobTransport(httpx.BaseTransport):
+    def __init__(
+        self,
+        inner: httpx.BaseTransport,
+        bucket: TokenBucket,
+        breaker: CircuitBreaker,
+        timeouts: Dict[str, float],
+        default_timeout: float = 5.0,
+        on_response: Callable[[str, int], None] = lambda endpoint, status: None,
+        order_breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.inner = inner
+        self.bucket = bucket
+        self.breaker = breaker
+        # 没给就不对下单熔断
+        self.order_breaker = order_breaker
+        self.timeouts = timeouts
+        self.default_timeout = default_timeout
+        self.on_response = on_response
+        self.throttled_s = 0.0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = endpoint_of(request.url.path)
+        order = endpoint in ORDER_ENDPOINTS
+        breaker = self.order_breaker if order else self.breaker
+        if breaker is not None and not breaker.allow():
+            self.on_response(endpoint, 0)
+            raise CircuitOpen(f"circuit open ({breaker.remaining_s():.1f}s left)", request=request)
+        if not order:
+            wait = self.bucket.reserve()
+            if wait > 0:
+                self.throttled_s += wait
+                time.sleep(wait)
+        t = self.timeouts.get(endpoint, self.default_timeout)
+        request.extensions["timeout"] = {"connect": min(t, 3.0), "read": t, "write": t, "pool": t}
+        try:
+            resp = self.inner.handle_request(request)
+        except httpx.TransportError:
+            if breaker is not None:
+                breaker.failure()
+            self.on_response(endpoint, 0)
+            raise
+        status = resp.status_code
+        self.on_response(endpoint, status)
+        if status == 429:
+            self.bucket.pause(retry_after_s(resp.headers.get("Retry-After")) or 1.0)
+        if breaker is not None:
+            if status == 429 or status >= 500:
+                breaker.failure()
+            else:
+                breaker.success()
+        return resp
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+def pooled(pool_size: int = 10, http2: bool = True) -> httpx.HTTPTransport:
+    """Keep-alive connection pool (HTTP/2 when the h2 package is installed)."""
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=60)
+    try:
+        return httpx.HTTPTransport(http2=http2, limits=limits, retries=0)
+    except ImportError:
+        # 没装 h2 就退回 HTTP/1.1 keep-alive
+        return httpx.HTTPTransport(limits=limits, retries=0)
+
+
+def install(transport: ClobTransport) -> bool:
+    """Point py_clob_client's shared HTTP client at `transport`. False if the
+    installed py_clob_client has no httpx client to replace."""
+    try:
+        from py_clob_client.http_helpers import helpers
+    except ImportError:
+        return False
+    old = getattr(helpers, "_http_client", None)
+    if not isinstance(old, httpx.Client):
+        return False
+    helpers._http_client = httpx.Client(transport=transport)
+    old.close()
+    return True